@@ -0,0 +1,96 @@
+"""Benchmark Epochs construction on multi-million-row epochs tables.
+
+Run from the repository root::
+
+    python benchmarks/bench_epochs.py
+
+Compares the vectorized snapshot consistency check with the pairwise
+snapshot comparison it replaced, and times full ``Epochs`` construction.
+Both should grow linearly in the number of rows.
+"""
+
+import sys
+import time as timer
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import fitgrid  # noqa: E402
+from fitgrid.epochs import _check_snapshots  # noqa: E402
+
+TIME = fitgrid.defaults.TIME
+EPOCH_ID = fitgrid.defaults.EPOCH_ID
+N_CHANNELS = 8
+
+
+def make_table(n_epochs, n_samples, n_channels=N_CHANNELS, seed=0):
+    rng = np.random.RandomState(seed)
+    n_rows = n_epochs * n_samples
+    index = pd.MultiIndex.from_arrays(
+        [
+            np.repeat(np.arange(n_epochs), n_samples),
+            np.tile(np.arange(n_samples), n_epochs),
+        ],
+        names=[EPOCH_ID, TIME],
+    )
+    channels = [f'channel{i}' for i in range(n_channels)]
+    table = pd.DataFrame(
+        rng.normal(size=(n_rows, n_channels)), index=index, columns=channels
+    )
+    table['categorical'] = np.repeat(
+        np.where(np.arange(n_epochs) % 2, 'cat0', 'cat1'), n_samples
+    )
+    return table, channels
+
+
+def legacy_check(table):
+    prev_group = None
+    for _, cur_group in table.groupby(TIME):
+        if prev_group is not None:
+            assert prev_group.index.equals(cur_group.index)
+        prev_group = cur_group
+    assert prev_group.index.is_unique
+
+
+def best_of(func, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = timer.perf_counter()
+        func()
+        times.append(timer.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    n_samples = 1000
+    print(
+        f'{"rows":>10} {"legacy check":>14} {"vector check":>14} '
+        f'{"Epochs()":>10} {"ns/row":>8}'
+    )
+    for n_epochs in [1000, 2000, 4000]:
+        table, channels = make_table(n_epochs, n_samples)
+        n_rows = len(table)
+        flat = table.reset_index().set_index(EPOCH_ID).sort_index()
+
+        legacy = best_of(lambda: legacy_check(flat), repeat=1)
+        vector = best_of(
+            lambda: _check_snapshots(
+                flat, flat.index, flat[TIME], EPOCH_ID, TIME
+            )
+        )
+        build = best_of(
+            lambda: fitgrid.epochs_from_dataframe(
+                table, time=TIME, epoch_id=EPOCH_ID, channels=channels
+            )
+        )
+        print(
+            f'{n_rows:>10} {legacy:>13.3f}s {vector:>13.3f}s '
+            f'{build:>9.3f}s {1e9 * build / n_rows:>8.0f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
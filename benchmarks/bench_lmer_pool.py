@@ -0,0 +1,56 @@
+"""Benchmark the startup share of parallel lmer wall time.
+
+Run from the repository root, pymer4 and R must be installed::
+
+    python benchmarks/bench_lmer_pool.py [n_workers] [n_calls]
+
+Fits the same lmer grid ``n_calls`` times, as when comparing models, in two
+ways: with ``parallel=True``, which starts a pool and loads R in each
+worker for every call, and with one ``fitgrid.lmer_pool`` whose workers
+load R once and serve all calls. Startup is the pool creation time of the
+warm pool, loading R in its workers, and for the cold pools the wall time
+beyond that of the same call on the warm pool.
+"""
+
+import sys
+import time as timer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import fitgrid  # noqa: E402
+
+RHS = 'continuous + (continuous | categorical)'
+
+
+def main():
+    n_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    n_calls = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    epochs = fitgrid.generate(n_samples=10, n_channels=8, seed=0)
+    print(f'{n_workers} workers, {n_calls} lmer calls')
+
+    start = timer.perf_counter()
+    for _ in range(n_calls):
+        fitgrid.lmer(
+            epochs, RHS=RHS, parallel=True, n_cores=n_workers, quiet=True
+        )
+    cold = timer.perf_counter() - start
+
+    start = timer.perf_counter()
+    with fitgrid.lmer_pool(n_workers) as pool:
+        startup = timer.perf_counter() - start
+        for _ in range(n_calls):
+            fitgrid.lmer(epochs, RHS=RHS, executor=pool, quiet=True)
+    warm = timer.perf_counter() - start
+
+    fitting = warm - startup
+    print(f'{"pool":>14} {"wall":>9} {"startup":>9} {"share":>6}')
+    for name, wall, started in [
+        ('per call', cold, cold - fitting),
+        ('lmer_pool', warm, startup),
+    ]:
+        print(f'{name:>14} {wall:8.2f}s {started:8.2f}s {started / wall:6.0%}')
+
+
+if __name__ == '__main__':
+    main()
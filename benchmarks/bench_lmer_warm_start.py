@@ -0,0 +1,55 @@
+"""Benchmark warm-started lmer fits across adjacent time points.
+
+Run from the repository root, pymer4 and R must be installed::
+
+    python benchmarks/bench_lmer_warm_start.py [n_samples] [n_channels]
+
+Fits the same grid with the default lmer, with ``warm_start=True``, which
+starts each fit from the theta of the previous time point of its channel,
+and with ``refit=True``. Reports the wall time, the total fitting time and
+optimizer iterations recorded per cell as ``fit_time`` and
+``n_iterations``, and the number of cells with convergence warnings.
+"""
+
+import sys
+import time as timer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import fitgrid  # noqa: E402
+
+RHS = 'continuous + (continuous | categorical)'
+
+
+def main():
+    n_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    n_channels = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    epochs = fitgrid.generate(
+        n_samples=n_samples, n_channels=n_channels, seed=0
+    )
+    print(f'{n_samples} times x {n_channels} channels, {RHS}')
+    print(
+        f'{"fit":>12} {"wall":>9} {"fitting":>9} {"iterations":>10} '
+        f'{"warnings":>8}'
+    )
+
+    for name, options in [
+        ('default', {}),
+        ('warm_start', {'warm_start': True}),
+        ('refit', {'refit': True}),
+    ]:
+        start = timer.perf_counter()
+        grid = fitgrid.lmer(epochs, RHS=RHS, quiet=True, **options)
+        wall = timer.perf_counter() - start
+        fitting = grid.fit_time.to_numpy().sum()
+        iterations = grid.n_iterations.to_numpy().sum()
+        warnings = grid.has_warning.to_numpy().sum()
+        print(
+            f'{name:>12} {wall:8.2f}s {fitting:8.2f}s {iterations:10d} '
+            f'{warnings:8d}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Benchmark pool scheduling of grid fits on skewed workloads.
+
+Run from the repository root::
+
+    python benchmarks/bench_scheduling.py [n_workers]
+
+Compares the static scheduling ``run_model`` used before, one chunk of
+consecutive time points per worker, with the current scheduling over
+(time, channel block) tasks sent in small chunks. Each cell occupies its
+worker for a set duration, cells near stimulus onset are much slower, as
+lmer fits that struggle to converge there. The cells sleep rather than
+compute so the figures measure scheduling, not the cores of the machine.
+Utilization is the total cell time divided by wall time times the number
+of workers.
+
+With ``--lmer`` the cells are lme4 fits through pymer4 on data with a
+noisier onset, pymer4 and R must be installed.
+"""
+
+import sys
+import time as timer
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from math import ceil
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import fitgrid  # noqa: E402
+from fitgrid import models  # noqa: E402
+
+FAST = 0.002  # seconds per cell
+SLOW = 0.1  # seconds per cell near onset
+ONSET = (0, 5)  # slow time positions
+
+
+def skewed_cell(data, channel):
+    # time positions are recovered from the time column of the snapshot
+    position = data[fitgrid.defaults.TIME].iloc[0]
+    duration = SLOW if ONSET[0] <= position < ONSET[1] else FAST
+    timer.sleep(duration)
+    return duration
+
+
+def lmer_cell(data, channel):
+    # the defaults of fitgrid.lmer
+    return models.lmer_single(
+        data,
+        channel,
+        RHS='continuous + (1|categorical)',
+        family='gaussian',
+        conf_int='Wald',
+        factors=None,
+        permute=None,
+        ordered=False,
+        REML=True,
+    )
+
+
+def static_schedule(epochs, function, n_workers):
+    # run_model before: consecutive time points in one chunk per worker
+    processor = partial(
+        models.process_key_and_group,
+        function=function,
+        channels=epochs.channels,
+    )
+    with ProcessPoolExecutor(n_workers) as pool:
+        chunksize = ceil(len(epochs.time_index) / n_workers)
+        results = pool.map(
+            processor, epochs._iter_snapshots(), chunksize=chunksize
+        )
+        return pd.concat(results, axis=1).T
+
+
+def block_schedule(epochs, function, n_workers):
+    with ProcessPoolExecutor(n_workers) as pool:
+        grid = fitgrid.run_model(epochs, function, executor=pool, quiet=True)
+        return grid._grid
+
+
+def run(label, epochs, function, n_workers):
+    for name, schedule in [
+        ('static', static_schedule),
+        ('blocks', block_schedule),
+    ]:
+        start = timer.perf_counter()
+        grid = schedule(epochs, function, n_workers)
+        wall = timer.perf_counter() - start
+        line = f'{label:>28} {name:>8} {wall:8.2f}s'
+        if function is skewed_cell:
+            busy = grid.to_numpy(dtype=float).sum()
+            line += f' {busy / (wall * n_workers):8.0%}'
+        print(line)
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    n_workers = int(args[0]) if args else 8
+    print(f'{n_workers} workers')
+    print(f'{"workload":>28} {"schedule":>8} {"wall":>9} {"utilized":>8}')
+
+    if '--lmer' in sys.argv:
+        epochs = fitgrid.generate(n_samples=40, n_channels=16, seed=0)
+        epochs._data[:, ONSET[0] : ONSET[1]] *= 50
+        run('lmer 40 times x 16 channels', epochs, lmer_cell, n_workers)
+        return
+
+    epochs = fitgrid.generate(n_samples=40, n_channels=16, seed=0)
+    run('40 times x 16 channels', epochs, skewed_cell, n_workers)
+
+    epochs = fitgrid.generate(n_samples=4, n_channels=64, seed=0)
+    run('4 times x 64 channels', epochs, skewed_cell, n_workers)
+
+
+if __name__ == '__main__':
+    main()
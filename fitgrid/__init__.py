@@ -6,9 +6,15 @@ from .io import (
     epochs_from_dataframe,
     load_grid,
     epochs_from_feather,
+    epochs_from_store,
+    windows_from_hdf,
+    windows_from_feather,
+    windows_from_store,
 )
-from .models import run_model, lm, lmer
-from . import utils, defaults
+from .epochs import concat_epochs
+from .models import run_model, lm, lmer, lmer_pool
+from .results import ResultStore, load_results
+from . import executors, ols, utils, defaults
 
 __version__ = "0.5.0.dev1"
 
@@ -1,9 +1,229 @@
+import copy
+import json
+import pickle
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
 
 from .errors import FitGridError
 from . import tools
 
+# on-disk epochs store layout, see Epochs.to_store
+STORE_FORMAT = 'fitgrid-epochs'
+STORE_VERSION = 1
+_STORE_METADATA = 'metadata.json'
+_STORE_CHANNELS = 'channels.npy'
+_STORE_EPOCHS = 'epochs.feather'
+_STORE_TIMES = 'times.feather'
+_STORE_SAMPLES = 'samples.feather'
+
+# working memory for computations over blocks of epochs
+_BLOCK_BYTES = 64 * 1024 * 1024
+
+# memory-backed file system for channel data shared with worker processes,
+# the default temporary directory is used where it does not exist or is too
+# small, as the 64 MB /dev/shm of docker containers
+_SHARED_DIR = '/dev/shm'
+_SHARED_EPOCHS = 'epochs.pickle'
+
+# shared epochs unpickled in this process, by location, a worker loads the
+# predictors once per fit rather than once per chunk of tasks
+_shared_epochs = {}
+
+
+def _shared_dir(nbytes):
+    """Directory for nbytes of shared channel data, None for the default."""
+
+    try:
+        free = shutil.disk_usage(_SHARED_DIR).free
+    except OSError:
+        return None
+    # leave room for the other users of shared memory
+    return _SHARED_DIR if nbytes < free // 2 else None
+
+
+def _check_snapshots(table, epoch_ids, times, epoch_id, time):
+    """Check that all snapshots share one epoch index, return integer codes.
+
+    Rather than comparing the snapshots pairwise, each row is assigned
+    (epoch, time) codes and the rows are counted in the epochs x times grid.
+    The table is consistent when each grid cell holds exactly one row.
+
+    Parameters
+    ----------
+    table : pandas DataFrame
+        epochs table, used to report duplicate locations
+    epoch_ids, times : array-like
+        epoch identifier and time values for each row of ``table``
+    epoch_id, time : str
+        epoch identifier and time column names
+
+    Returns
+    -------
+    epoch_codes, time_codes : numpy.ndarray
+        integer positions of each row in ``epoch_index`` and ``time_index``
+    epoch_index, time_index : pandas Index
+        sorted unique epoch identifiers and times
+    """
+
+    epoch_codes, epoch_index = pd.factorize(epoch_ids, sort=True)
+    time_codes, time_index = pd.factorize(times, sort=True)
+    if (epoch_codes < 0).any() or (time_codes < 0).any():
+        raise FitGridError(
+            f'{epoch_id} and {time} must not contain missing values.'
+        )
+
+    epoch_index = pd.Index(epoch_index, name=epoch_id)
+    time_index = pd.Index(time_index, name=time)
+    n_epochs, n_times = len(epoch_index), len(time_index)
+
+    counts = np.bincount(
+        epoch_codes * n_times + time_codes, minlength=n_epochs * n_times
+    )
+
+    # complete rectangular grid, the common case
+    if len(epoch_codes) == counts.size and (counts == 1).all():
+        return epoch_codes, time_codes, epoch_index, time_index
+
+    # report the first snapshot that differs from its predecessor
+    counts = counts.reshape(n_epochs, n_times)
+    differs = (counts[:, 1:] != counts[:, :-1]).any(axis=0)
+    if differs.any():
+        position = np.flatnonzero(differs)[0] + 1
+        current = epoch_index.repeat(counts[:, position])
+        previous = epoch_index.repeat(counts[:, position - 1])
+        raise FitGridError(
+            f'Snapshot {time_index[position]} differs from '
+            f'previous snapshot in {epoch_id} index:\n'
+            f'Current snapshot\'s indices:\n'
+            f'{current}\n'
+            f'Previous snapshot\'s indices:\n'
+            f'{previous}'
+        )
+
+    # locations are reported in the epoch_id sorted table
+    table = table.reset_index().set_index(epoch_id).sort_index()
+    dupes = tools.get_index_duplicates_table(table, epoch_id)
+    raise FitGridError(
+        f'Duplicate values in {epoch_id} index not allowed:\n{dupes}'
+    )
+
+
+def _channel_array(table, channels, positions, shape, copy, dtype=None):
+    """Return channel columns of table as an epochs x times x channels array.
+
+    Parameters
+    ----------
+    table : pandas DataFrame
+        epochs table
+    channels : list of str
+        channel column names
+    positions : numpy.ndarray or None
+        flat (epoch, time) grid position of each row, None if the rows are
+        already in epoch-major, time-minor order
+    shape : tuple of int
+        (n_epochs, n_times, n_channels)
+    copy : bool
+        if False, return a view on the table data when the layout permits
+    dtype : numpy dtype, optional
+        dtype of the returned array, defaults to the channel columns dtype
+
+    Returns
+    -------
+    data : numpy.ndarray
+        channel data array with the requested shape
+    """
+
+    if not copy and positions is None:
+        values = tools.columns_view(table, channels)
+        if values is not None and dtype in (None, values.dtype):
+            # splitting the row axis into epochs x times is always a view
+            return values.reshape(shape)
+
+    # fill one column at a time, never holding a second full copy
+    if dtype is None:
+        dtype = np.result_type(*table.dtypes[channels])
+    data = np.empty(shape, dtype=dtype)
+    rows = data.reshape(-1, shape[-1])
+    if positions is None:
+        positions = slice(None)
+    for i, channel in enumerate(channels):
+        rows[positions, i] = table[channel].to_numpy()
+    return data
+
+
+def _selector_positions(index, selector, name):
+    """Return positions in index as a slice when possible, else an array."""
+
+    if selector is None:
+        return slice(None)
+
+    if isinstance(selector, slice):
+        positions = index.slice_indexer(
+            selector.start, selector.stop, selector.step
+        )
+        positions = np.arange(len(index))[positions]
+    else:
+        if isinstance(selector, pd.Series) and selector.dtype == bool:
+            selector = selector.reindex(index, fill_value=False)
+        # a single label selects like a list of one
+        selector = np.atleast_1d(selector)
+        if selector.dtype == bool:
+            if len(selector) != len(index):
+                raise FitGridError(
+                    f'{name} mask has length {len(selector)}, '
+                    f'expected {len(index)}.'
+                )
+            positions = np.flatnonzero(selector)
+        else:
+            positions = index.get_indexer(selector)
+            if (positions < 0).any():
+                missing = list(selector[positions < 0])
+                raise FitGridError(f'{name} not found: {missing}')
+            if len(np.unique(positions)) != len(positions):
+                raise FitGridError(f'{name} selection has duplicates.')
+
+    if len(positions) == 0:
+        raise FitGridError(f'{name} selection is empty.')
+
+    # evenly spaced positions slice as views
+    steps = np.diff(positions)
+    if len(positions) == 1 or (steps[0] > 0 and (steps == steps[0]).all()):
+        step = steps[0] if len(positions) > 1 else 1
+        return slice(positions[0], positions[-1] + 1, step)
+    return positions
+
+
+def _merge_moments(count, mean, m2, block):
+    """Merge a block of epochs into running count, mean and M2, in place.
+
+    Block statistics are combined with the running ones as in the parallel
+    form of Welford's algorithm (Chan, Golub and LeVeque), missing values
+    are skipped.
+    """
+
+    present = ~np.isnan(block)
+    block_count = present.sum(axis=0)
+    block = np.where(present, block, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        block_mean = block.sum(axis=0) / block_count
+    block_mean[block_count == 0] = 0.0
+    block -= block_mean
+    block *= present
+    block_m2 = np.einsum('e...,e...->...', block, block)
+
+    total = count + block_count
+    delta = block_mean - mean
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = np.where(total > 0, block_count / total, 0.0)
+    mean += delta * weight
+    m2 += block_m2 + delta * delta * count * weight
+    count += block_count
+
 
 class Epochs:
     """Container class used for storing epochs tables and exposing statsmodels.
@@ -18,15 +238,52 @@ class Epochs:
         epoch identifier column name
     channels : list of str
         list of channel names to serve as dependent variables
+    copy : bool, defaults to True
+        set to False to allow the channel data to share memory with
+        ``epochs_table``, see Notes
+    dtype : numpy floating point dtype, optional
+        dtype for storing channel data, defaults to the dtype of the channel
+        columns. Use ``numpy.float32`` to halve channel data memory, see Notes
 
     Returns
     -------
     epochs : Epochs
         epochs object
 
+    Notes
+    -----
+    Channel data are stored as a single epochs x times x channels NumPy
+    array, the remaining columns are kept separately as predictors.
+    Predictors that do not change within an epoch are stored once per epoch
+    rather than once per sample. The
+    snapshots passed to model fitting functions are built on the fly with
+    read-only views of the channel data, and the long form ``table`` is
+    reassembled from the stored data when accessed.
+
+    Epochs never copies, reindexes or sorts the whole input table. With the
+    default ``copy=True`` the channel data are copied once, column by column,
+    into the array store so peak memory during construction is the input
+    table plus the channel data plus the predictor columns. With
+    ``copy=False`` and an input table whose rows are already sorted by
+    ``epoch_id`` then ``time``, and whose channel columns are adjacent and
+    share one dtype (for example a table built from a single 2-D array), the
+    array store is a view on the input and the channel data are not copied
+    at all, so peak memory drops by the size of the channel data. The Epochs
+    object then reflects any later modification of the input table. Inputs
+    that do not meet these conditions are copied as with ``copy=True``.
+
+    Channel data stored as ``numpy.float32`` take half the memory of
+    float64 and halve the volume of snapshots sent to worker processes.
+    Model fitting is still done in float64: patsy and statsmodels build
+    float64 design matrices and responses, lme4 fits in double precision,
+    and the epoch distances and averages are accumulated in float64. Results
+    agree with float64 storage to within float32 rounding of the data.
+
     """
 
-    def __init__(self, epochs_table, time, epoch_id, channels):
+    def __init__(
+        self, epochs_table, time, epoch_id, channels, copy=True, dtype=None
+    ):
 
         # channels must be a list of strings
         if not isinstance(channels, list) or not all(
@@ -58,81 +315,610 @@ class Epochs:
         if deduped_names != names:
             raise FitGridError('Duplicate column names not allowed.')
 
-        # make our own copy so we are immune to modification to original table
-        table = (
-            epochs_table.copy().reset_index().set_index(epoch_id).sort_index()
-        )
-        assert table.index.names == [epoch_id]
-
-        snapshots = table.groupby(time)
-
-        # check that snapshots across epochs have equal index by transitivity
-        prev_group = None
-        for idx, cur_group in snapshots:
-            if prev_group is not None:
-                if not prev_group.index.equals(cur_group.index):
-                    raise FitGridError(
-                        f'Snapshot {idx} differs from '
-                        f'previous snapshot in {epoch_id} index:\n'
-                        f'Current snapshot\'s indices:\n'
-                        f'{cur_group.index}\n'
-                        f'Previous snapshot\'s indices:\n'
-                        f'{prev_group.index}'
-                    )
-            prev_group = cur_group
-
-        if not prev_group.index.is_unique:
-            dupes = tools.get_index_duplicates_table(table, epoch_id)
-            raise FitGridError(
-                f'Duplicate values in {epoch_id} index not allowed:\n{dupes}'
-            )
+        if dtype is not None:
+            dtype = np.dtype(dtype)
+            if dtype.kind != 'f':
+                raise FitGridError(
+                    f'dtype must be a floating point dtype, got {dtype}.'
+                )
+
+        index_names = list(epochs_table.index.names)
+        epoch_codes, time_codes, epoch_index, time_index = _check_snapshots(
+            epochs_table,
+            epochs_table.index.get_level_values(epoch_id),
+            epochs_table.index.get_level_values(time),
+            epoch_id,
+            time,
+        )
 
         # checks passed, set instance variables
         self.time = time
         self.epoch_id = epoch_id
         self.channels = channels
-        self.table = table
-        self._snapshots = snapshots
-        self.epoch_index = tools.get_first_group(snapshots).index.copy()
-        self.time_index = pd.Index([time for time, _ in snapshots], name=time)
+        self.epoch_index = epoch_index
+        self.time_index = time_index
+
+        # long form table columns: the non epoch_id index levels go first
+        index_columns = [
+            name if name is not None else f'level_{i}'
+            for i, name in enumerate(index_names)
+            if name != epoch_id
+        ]
+        self._columns = index_columns + list(epochs_table.columns)
+
+        # epochs x times x channels array backing store
+        n_epochs, n_times = len(epoch_index), len(time_index)
+        positions = epoch_codes * n_times + time_codes
+        in_order = (positions[1:] > positions[:-1]).all()
+        self._data = _channel_array(
+            epochs_table,
+            channels,
+            None if in_order else positions,
+            (n_epochs, n_times, len(channels)),
+            copy=copy,
+            dtype=dtype,
+        )
+
+        # predictors constant within epochs are stored once per epoch, the
+        # rest in time-major long form so that snapshots are slices, the
+        # time column is rebuilt from time_index
+        order = np.empty(len(positions), dtype=np.intp)
+        order[time_codes * n_epochs + epoch_codes] = np.arange(len(order))
+        levels = [i for i, name in enumerate(index_names) if name != epoch_id]
+        predictors = [
+            (name, epochs_table.index.get_level_values(level))
+            for level, name in zip(levels, index_columns)
+        ] + [
+            (name, epochs_table[name].array)
+            for name in epochs_table.columns
+            if name not in channels
+        ]
+
+        epoch_predictors, time_predictors = {}, {}
+        for name, values in predictors:
+            if name == time:
+                continue
+            values = values.take(order)
+            if tools.is_epoch_constant(values, n_epochs, n_times):
+                epoch_predictors[name] = values[:n_epochs]
+            else:
+                time_predictors[name] = values
+
+        self._epoch_predictors = pd.DataFrame(
+            epoch_predictors, index=epoch_index
+        )
+        self._time_predictors = pd.DataFrame(
+            time_predictors,
+            index=epoch_index[np.tile(np.arange(n_epochs), n_times)],
+            copy=False,
+        )
+        self._store = None
+        self._moments_cache = {}
+
+    @classmethod
+    def _from_arrays(
+        cls,
+        data,
+        time,
+        epoch_id,
+        channels,
+        epoch_index,
+        time_index,
+        epoch_predictors,
+        time_predictors,
+        columns,
+        store=None,
+    ):
+        """Build Epochs from already consistent parts, skipping all checks."""
+
+        epochs = cls.__new__(cls)
+        epochs.time = time
+        epochs.epoch_id = epoch_id
+        epochs.channels = channels
+        epochs.epoch_index = epoch_index
+        epochs.time_index = time_index
+        epochs._columns = columns
+        epochs._data = data
+        epochs._epoch_predictors = epoch_predictors
+        epochs._time_predictors = time_predictors
+        epochs._store = store
+        epochs._moments_cache = {}
+        return epochs
+
+    def __getstate__(self):
+        if getattr(self, '_shared_path', None) is not None:
+            # workers load the rest from the shared directory, once
+            return {'_shared_path': self._shared_path}
+        state = self.__dict__.copy()
+        state['_moments_cache'] = {}
+        if self._store is not None:
+            # reopened from the store, memory-mapped, when unpickled; the
+            # data may be a view on part of the stored array
+            root = self._data
+            while isinstance(root.base, np.ndarray):
+                root = root.base
+            offset = (
+                self._data.__array_interface__['data'][0]
+                - root.__array_interface__['data'][0]
+            )
+            state['_data'] = offset, self._data.shape, self._data.strides
+        return state
+
+    def __setstate__(self, state):
+        if list(state) == ['_shared_path']:
+            path = state['_shared_path']
+            if path not in _shared_epochs:
+                # only the epochs of the current fit are kept, the files of
+                # earlier fits are removed and their pages can be released
+                _shared_epochs.clear()
+                with open(Path(path) / _SHARED_EPOCHS, 'rb') as file:
+                    _shared_epochs[path] = pickle.load(file)
+            self.__dict__.update(_shared_epochs[path].__dict__)
+            return
+
+        self.__dict__.update(state)
+        if self._store is not None:
+            offset, shape, strides = self._data
+            root = np.load(Path(self._store) / _STORE_CHANNELS, mmap_mode='r')
+            if (offset, shape, strides) == (0, root.shape, root.strides):
+                self._data = root
+            else:
+                self._data = np.ndarray(
+                    shape,
+                    root.dtype,
+                    buffer=root,
+                    offset=offset,
+                    strides=strides,
+                )
+
+    def to_store(self, path):
+        """Write epochs to an on-disk store, reopen with ``epochs_from_store``.
+
+        Parameters
+        ----------
+        path : str or pathlib.Path
+            store directory, created if needed, existing store files are
+            overwritten
+
+        Notes
+        -----
+        The store is a directory holding the channel data as a single
+        epochs x times x channels ``.npy`` array that is memory-mapped when
+        the store is opened, the per-epoch predictors with the epoch index
+        and the time-varying predictors as Feather files, the time index as
+        a Feather file, and the remaining metadata in ``metadata.json``.
+        """
+
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        np.save(path / _STORE_CHANNELS, self._data)
+        self._epoch_predictors.reset_index().to_feather(path / _STORE_EPOCHS)
+        self.time_index.to_frame(index=False).to_feather(path / _STORE_TIMES)
+        self._time_predictors.reset_index(drop=True).to_feather(
+            path / _STORE_SAMPLES
+        )
+
+        metadata = {
+            'format': STORE_FORMAT,
+            'version': STORE_VERSION,
+            'time': self.time,
+            'epoch_id': self.epoch_id,
+            'channels': self.channels,
+            'columns': self._columns,
+            'shape': list(self._data.shape),
+            'dtype': self._data.dtype.str,
+        }
+        with open(path / _STORE_METADATA, 'w') as stream:
+            json.dump(metadata, stream, indent=2)
+
+    @classmethod
+    def _from_store(cls, path, mmap_mode='r'):
+        """Open an on-disk store written by ``Epochs.to_store``."""
+
+        path = Path(path)
+        try:
+            with open(path / _STORE_METADATA) as stream:
+                metadata = json.load(stream)
+        except FileNotFoundError:
+            raise FitGridError(f'{path} is not a fitgrid epochs store.')
+
+        if metadata.get('format') != STORE_FORMAT:
+            raise FitGridError(f'{path} is not a fitgrid epochs store.')
+        if metadata['version'] > STORE_VERSION:
+            raise FitGridError(
+                f'{path} has store version {metadata["version"]}, this '
+                f'fitgrid reads up to version {STORE_VERSION}.'
+            )
+
+        time, epoch_id = metadata['time'], metadata['epoch_id']
+        data = np.load(path / _STORE_CHANNELS, mmap_mode=mmap_mode)
+        if list(data.shape) != metadata['shape']:
+            raise FitGridError(
+                f'{path / _STORE_CHANNELS} has shape {data.shape}, '
+                f'metadata says {tuple(metadata["shape"])}.'
+            )
+        n_epochs, n_times, _ = data.shape
+
+        epoch_predictors = pd.read_feather(path / _STORE_EPOCHS).set_index(
+            epoch_id
+        )
+        epoch_index = epoch_predictors.index
+        time_index = pd.Index(
+            pd.read_feather(path / _STORE_TIMES)[time], name=time
+        )
+        samples_index = epoch_index[np.tile(np.arange(n_epochs), n_times)]
+        time_predictors = pd.read_feather(path / _STORE_SAMPLES)
+        if time_predictors.columns.empty:
+            time_predictors = pd.DataFrame(index=samples_index)
+        else:
+            time_predictors.index = samples_index
+
+        return cls._from_arrays(
+            data,
+            time=time,
+            epoch_id=epoch_id,
+            channels=metadata['channels'],
+            epoch_index=epoch_index,
+            time_index=time_index,
+            epoch_predictors=epoch_predictors,
+            time_predictors=time_predictors,
+            columns=metadata['columns'],
+            store=str(path) if mmap_mode is not None else None,
+        )
+
+    @contextmanager
+    def _shared(self):
+        """Context providing epochs cheap to send to worker processes.
+
+        The channel data are written once to a memory-mapped file, in
+        shared memory where it has room, and the predictors and indexes to
+        a pickle beside it. Pickling the epochs provided sends only the
+        location of these files: each worker loads the predictors once,
+        maps the same pages of channel data and builds snapshots as
+        zero-copy views. The channel data of epochs already backed by a
+        store are not copied. The files are removed on exit.
+        """
+
+        nbytes = 0 if self._store is not None else self._data.nbytes
+        with tempfile.TemporaryDirectory(
+            prefix='fitgrid-', dir=_shared_dir(nbytes)
+        ) as path:
+            shared = copy.copy(self)
+            shared._moments_cache = {}
+            if self._store is None:
+                np.save(Path(path) / _STORE_CHANNELS, self._data)
+                shared._data = np.load(
+                    Path(path) / _STORE_CHANNELS, mmap_mode='r'
+                )
+                shared._store = path
+            with open(Path(path) / _SHARED_EPOCHS, 'wb') as file:
+                pickle.dump(shared, file, protocol=pickle.HIGHEST_PROTOCOL)
+            shared._shared_path = path
+            yield shared
 
-    def distances(self):
-        """Return scaled Euclidean distances of epochs from the "mean" epoch.
+    def sel(self, time=None, channels=None, epochs=None):
+        """Select a subset of time points, channels and epochs.
+
+        The subset shares data with this Epochs object where possible and is
+        not revalidated, so selecting is cheap even for large data.
+
+        Parameters
+        ----------
+        time : label, slice, list or boolean array, optional
+            time label, time label slice (both endpoints included, as in
+            pandas ``.loc``), list of time labels, or boolean mask over
+            ``time_index``, defaults to all time points
+        channels : str or list of str, optional
+            channel names, defaults to all channels
+        epochs : label, slice, list or boolean array, optional
+            epoch identifier, epoch identifier slice, list of epoch
+            identifiers, or boolean mask over ``epoch_index`` (a boolean
+            Series is aligned on its index), defaults to all epochs
+
+        Returns
+        -------
+        epochs : Epochs
+            Epochs object with the selected data
+
+        Notes
+        -----
+        Time slices and channels or epochs that are evenly spaced, for
+        instance a contiguous run, select a view on the channel data. Other
+        selections copy only the selected channel data.
+        """
+
+        if isinstance(channels, str):
+            channels = [channels]
+        channels_index = pd.Index(self.channels)
+
+        epoch_positions = _selector_positions(
+            self.epoch_index, epochs, 'epochs'
+        )
+        time_positions = _selector_positions(self.time_index, time, 'time')
+        channel_positions = _selector_positions(
+            channels_index, channels, 'channels'
+        )
+
+        # index one axis at a time, arrays on several axes would broadcast
+        data = self._data[epoch_positions]
+        data = data[:, time_positions]
+        data = data[:, :, channel_positions]
+
+        # the selection is still backed by the store if the data is a view
+        store = self._store
+        if store is not None and not np.may_share_memory(data, self._data):
+            store = None
+
+        n_epochs = len(self.epoch_index)
+        epoch_rows = np.arange(n_epochs)[epoch_positions]
+        time_rows = np.arange(len(self.time_index))[time_positions]
+        samples_rows = (
+            time_rows[:, np.newaxis] * n_epochs + epoch_rows[np.newaxis, :]
+        ).ravel()
+
+        selected_channels = list(channels_index[channel_positions])
+        dropped = set(self.channels) - set(selected_channels)
+
+        return self._from_arrays(
+            data,
+            time=self.time,
+            epoch_id=self.epoch_id,
+            channels=selected_channels,
+            epoch_index=self.epoch_index[epoch_positions],
+            time_index=self.time_index[time_positions],
+            epoch_predictors=self._epoch_predictors.iloc[epoch_positions],
+            time_predictors=self._time_predictors.iloc[samples_rows],
+            columns=[c for c in self._columns if c not in dropped],
+            store=store,
+        )
+
+    def _predictor_values(self, column, epoch_rows, time_rows):
+        """Return values of a non-channel column at (epoch, time) positions."""
+
+        if column == self.time:
+            return self.time_index.take(time_rows)
+        if column in self._epoch_predictors:
+            return self._epoch_predictors[column].array.take(epoch_rows)
+        n_epochs = len(self.epoch_index)
+        return self._time_predictors[column].array.take(
+            time_rows * n_epochs + epoch_rows
+        )
+
+    @property
+    def table(self):
+        """Long form epochs table indexed by epoch_id, built on access."""
+
+        n_epochs, n_times, n_channels = self._data.shape
+        epoch_rows = np.repeat(np.arange(n_epochs), n_times)
+        time_rows = np.tile(np.arange(n_times), n_epochs)
+
+        values = self._data.reshape(n_epochs * n_times, n_channels)
+        channels = {channel: i for i, channel in enumerate(self.channels)}
+        columns = {}
+        for column in self._columns:
+            if column in channels:
+                columns[column] = values[:, channels[column]]
+            else:
+                columns[column] = self._predictor_values(
+                    column, epoch_rows, time_rows
+                )
+        return pd.DataFrame(columns, index=self.epoch_index.take(epoch_rows))
+
+    @property
+    def _snapshots(self):
+        return self.table.groupby(self.time)
+
+    def _snapshot(self, position):
+        """Return snapshot DataFrame at time position, channels are views."""
+
+        values = self._data[:, position, :].view()
+        values.flags.writeable = False
+        snapshot = pd.DataFrame(
+            values, index=self.epoch_index, columns=self.channels, copy=False
+        )
+
+        # insert rather than concat, which consolidates and copies blocks,
+        # per-epoch predictors are used as is
+        n_epochs = len(self.epoch_index)
+        start = position * n_epochs
+        channels = set(self.channels)
+        predictors = (c for c in self._columns if c not in channels)
+        for loc, column in enumerate(predictors):
+            if column == self.time:
+                column_values = self.time_index[[position]].repeat(n_epochs)
+            elif column in self._epoch_predictors:
+                column_values = self._epoch_predictors[column].values
+            else:
+                column_values = self._time_predictors[column].values[
+                    start : start + n_epochs
+                ]
+            snapshot.insert(loc, column, column_values)
+
+        return snapshot
+
+    def _iter_snapshots(self):
+        """Yield (time, snapshot) pairs in time order, like a groupby."""
+
+        for position, time in enumerate(self.time_index):
+            yield time, self._snapshot(position)
+
+    def _epoch_blocks(self, block_size):
+        """Yield float64 copies of the channel data in blocks of epochs."""
+
+        n_epochs, n_times, n_channels = self._data.shape
+        if block_size is None:
+            block_size = _BLOCK_BYTES // (8 * n_times * n_channels)
+        block_size = max(int(block_size), 1)
+        for start in range(0, n_epochs, block_size):
+            stop = min(start + block_size, n_epochs)
+            yield start, stop, self._data[start:stop].astype(np.float64)
+
+    def distances(self, metric='euclidean', block_size=None):
+        """Return scaled distances of epochs from the "mean" epoch.
+
+        Parameters
+        ----------
+        metric : {'euclidean', 'mahalanobis'}, defaults to 'euclidean'
+            'euclidean' sums squared deviations from the mean epoch over
+            times and channels, 'mahalanobis' weights the deviations at each
+            time by the inverse of the channel covariance, estimated from the
+            deviations pooled over epochs and times
+        block_size : int, optional
+            number of epochs processed at a time, defaults to blocks of about
+            64 MB of float64 data
 
         Returns
         -------
-        distances : pandas Series or DataFrame
-            Series or DataFrame with epoch distances
+        distances : pandas Series
+            Series with epoch distances indexed by epoch_id
 
         Notes
         -----
         Distances are scaled by dividing by the max.
+
+        The mean epoch, the channel covariance and the distances are
+        accumulated in float64 over blocks of epochs, so memory use beyond
+        the stored data is bounded by the block size.
         """
 
-        table = self.table.reset_index().set_index([self.epoch_id, self.time])[
-            self.channels
-        ]
+        if metric not in ('euclidean', 'mahalanobis'):
+            raise FitGridError(
+                "metric must be 'euclidean' or 'mahalanobis', "
+                f'got {metric!r}.'
+            )
 
-        n_channels = len(table.columns)
-        n_epochs = len(table.index.unique(level=self.epoch_id))
-        n_samples = len(table.index.unique(level=self.time))
+        n_epochs, n_times, n_channels = self._data.shape
 
-        assert table.values.size == n_channels * n_epochs * n_samples
-        values = table.values.reshape(n_epochs, n_samples, n_channels)
+        mean = np.zeros((n_times, n_channels))
+        for _, _, block in self._epoch_blocks(block_size):
+            mean += block.sum(axis=0)
+        mean /= n_epochs
 
-        mean = values.mean(axis=0)
-        diff = values - mean
+        if metric == 'mahalanobis':
+            covariance = np.zeros((n_channels, n_channels))
+            for _, _, block in self._epoch_blocks(block_size):
+                block -= mean
+                deviations = block.reshape(-1, n_channels)
+                covariance += deviations.T @ deviations
+            covariance /= max(n_epochs * n_times - 1, 1)
+            # pseudo-inverse, re-referenced channels are rank deficient
+            weights = np.linalg.pinv(covariance)
 
-        def l2_norm(data, axis=1):
-            return np.sqrt((data * data).sum(axis=axis))
+        distances_arr = np.empty(n_epochs)
+        for start, stop, block in self._epoch_blocks(block_size):
+            block -= mean
+            if metric == 'mahalanobis':
+                squared = np.einsum('etc,cd,etd->e', block, weights, block)
+            else:
+                squared = np.einsum('etc,etc->e', block, block)
+            distances_arr[start:stop] = np.sqrt(squared)
 
-        # first n_samples is axis 1, then n_channels, leaving epochs
-        distances_arr = l2_norm(l2_norm(diff))
         distances_arr_scaled = distances_arr / distances_arr.max()
         distances = pd.Series(distances_arr_scaled, index=self.epoch_index)
 
         return distances
 
+    def _moments(self, by=None):
+        """Return cached per-time, per-channel count, mean and M2 arrays.
+
+        Parameters
+        ----------
+        by : str, optional
+            name of a column constant within epochs to group epochs by
+
+        Returns
+        -------
+        groups : pandas Index or None
+            sorted group labels, None when not grouped
+        count, mean, m2 : numpy.ndarray
+            groups x times x channels arrays (times x channels when not
+            grouped) of non-missing counts, means and sums of squared
+            deviations from the mean
+        """
+
+        if by in self._moments_cache:
+            return self._moments_cache[by]
+
+        n_epochs, n_times, n_channels = self._data.shape
+        if by is None:
+            groups, codes, n_groups = None, np.zeros(n_epochs, np.intp), 1
+        else:
+            if by not in self._epoch_predictors:
+                raise FitGridError(
+                    f'{by} must be a column that is constant within epochs.'
+                )
+            codes, groups = pd.factorize(self._epoch_predictors[by], sort=True)
+            if (codes < 0).any():
+                raise FitGridError(f'{by} must not contain missing values.')
+            groups = pd.Index(groups, name=by)
+            n_groups = len(groups)
+
+        shape = (n_groups, n_times, n_channels)
+        count, mean, m2 = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        for start, stop, block in self._epoch_blocks(None):
+            block_codes = codes[start:stop]
+            for group in np.unique(block_codes):
+                _merge_moments(
+                    count[group],
+                    mean[group],
+                    m2[group],
+                    block[block_codes == group],
+                )
+
+        mean[count == 0] = np.nan
+        if by is None:
+            count, mean, m2 = count[0], mean[0], m2[0]
+        self._moments_cache[by] = groups, count, mean, m2
+        return self._moments_cache[by]
+
+    def describe(self, by=None):
+        """Return per-time channel counts, means, standard deviations and SEs.
+
+        Parameters
+        ----------
+        by : str, optional
+            name of a column constant within epochs, for example a condition
+            label, to summarize each group of epochs separately
+
+        Returns
+        -------
+        summary : pandas DataFrame
+            indexed by time, or by ``by`` then time when grouped, with
+            columns ``count``, ``mean``, ``std`` and ``sem`` for each channel
+            as a (statistic, channel) MultiIndex, so ``summary['mean']`` is
+            the times x channels average
+
+        Notes
+        -----
+        The statistics are computed in one float64 pass over blocks of
+        epochs and cached, later calls and ``plot_averages`` reuse them.
+        Missing values are skipped. Standard deviations use ``ddof=1``.
+        """
+
+        groups, count, mean, m2 = self._moments(by)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(m2 / (count - 1))
+            sem = std / np.sqrt(count)
+        std[count < 2] = np.nan
+        sem[count < 2] = np.nan
+
+        n_channels = len(self.channels)
+        if groups is None:
+            index = self.time_index
+        else:
+            index = pd.MultiIndex.from_product([groups, self.time_index])
+        statistics = ['count', 'mean', 'std', 'sem']
+        columns = pd.MultiIndex.from_product([statistics, self.channels])
+        values = np.concatenate(
+            [stat.reshape(-1, n_channels) for stat in (count, mean, std, sem)],
+            axis=1,
+        )
+        summary = pd.DataFrame(values, index=index, columns=columns)
+        summary['count'] = summary['count'].astype(np.int64)
+        return summary
+
     def plot_averages(self, channels=None, negative_up=True):
         """Plot grand mean averages for each channel, negative up by default.
 
@@ -156,6 +942,155 @@ class Epochs:
 
         from . import plots
 
-        data = self._snapshots.mean()
+        _, _, mean, _ = self._moments()
+        data = pd.DataFrame(mean, index=self.time_index, columns=self.channels)
         fig, axes = plots.stripchart(data[channels], negative_up=negative_up)
         return fig, axes
+
+
+def concat_epochs(epochs_list, renumber=None, dtype=None):
+    """Concatenate Epochs objects with the same times and channels.
+
+    The parts are already validated, so they are not re-sorted or checked
+    again, the channel data are copied once into the combined array.
+
+    Parameters
+    ----------
+    epochs_list : list of Epochs
+        Epochs objects to concatenate, in order, all with the same time and
+        epoch_id column names, time index, channels and columns
+    renumber : bool, optional
+        replace epoch identifiers with consecutive integers starting at 0 in
+        concatenation order. Defaults to renumbering only when identifiers
+        are repeated across parts, set to False to raise an error instead
+    dtype : numpy floating point dtype, optional
+        dtype for storing channel data, defaults to the common dtype of the
+        parts
+
+    Returns
+    -------
+    epochs : Epochs
+        Epochs object with the epochs of all parts
+
+    Notes
+    -----
+    Peak memory is the parts plus the combined channel data and predictors,
+    there are no intermediate long form tables. Parts opened from on-disk
+    stores with ``epochs_from_store`` are read from the memory-mapped files
+    as they are copied, so peak memory stays near the size of the result.
+
+    Predictors stored once per epoch in every part are stored once per epoch
+    in the result, predictors that vary within epochs in any part are stored
+    per sample.
+    """
+
+    epochs_list = list(epochs_list)
+    if not epochs_list or not all(
+        isinstance(part, Epochs) for part in epochs_list
+    ):
+        raise FitGridError('epochs_list must be a non-empty list of Epochs.')
+
+    first = epochs_list[0]
+    for i, part in enumerate(epochs_list[1:], start=1):
+        for attribute in ('time', 'epoch_id', 'channels', '_columns'):
+            if getattr(part, attribute) != getattr(first, attribute):
+                name = attribute.lstrip('_')
+                raise FitGridError(
+                    f'Epochs {i} {name} {getattr(part, attribute)} differ '
+                    f'from epochs 0 {name} {getattr(first, attribute)}.'
+                )
+        if not part.time_index.equals(first.time_index):
+            raise FitGridError(
+                f'Epochs {i} time index differs from epochs 0 time index.'
+            )
+
+    if dtype is None:
+        dtype = np.result_type(*(part._data.dtype for part in epochs_list))
+    else:
+        dtype = np.dtype(dtype)
+        if dtype.kind != 'f':
+            raise FitGridError(
+                f'dtype must be a floating point dtype, got {dtype}.'
+            )
+
+    epoch_index = first.epoch_index.append(
+        [part.epoch_index for part in epochs_list[1:]]
+    )
+    if renumber is None:
+        renumber = epoch_index.has_duplicates
+    elif not renumber and epoch_index.has_duplicates:
+        duplicates = epoch_index[epoch_index.duplicated()].unique()
+        raise FitGridError(
+            f'{first.epoch_id} values repeated across epochs: '
+            f'{list(duplicates)}, pass renumber=True to replace them.'
+        )
+    if renumber:
+        epoch_index = pd.Index(
+            np.arange(len(epoch_index)), name=first.epoch_id
+        )
+
+    # channel data, each part is copied into its block of epochs
+    n_epochs, n_times = len(epoch_index), len(first.time_index)
+    data = np.empty((n_epochs, n_times, len(first.channels)), dtype=dtype)
+    offsets = np.cumsum([0] + [len(part.epoch_index) for part in epochs_list])
+    for part, start, stop in zip(epochs_list, offsets[:-1], offsets[1:]):
+        data[start:stop] = part._data
+
+    # per-sample predictors are time-major, so part blocks interleave:
+    # sources[t * n_epochs + e] is the position of that sample in the parts'
+    # stacked predictor values
+    sources = np.empty((n_times, n_epochs), dtype=np.intp)
+    for part, start, stop in zip(epochs_list, offsets[:-1], offsets[1:]):
+        sources[:, start:stop] = (
+            start * n_times + np.arange(n_times * (stop - start))
+        ).reshape(n_times, stop - start)
+    sources = sources.ravel()
+    sample_epochs = np.tile(np.arange(n_epochs), n_times)
+
+    def stacked(name):
+        values = []
+        for part in epochs_list:
+            if name in part._time_predictors:
+                part_values = part._time_predictors[name].array
+            else:
+                part_rows = np.tile(np.arange(len(part.epoch_index)), n_times)
+                part_values = part._epoch_predictors[name].array.take(
+                    part_rows
+                )
+            values.append(pd.Series(part_values))
+        return pd.concat(values, ignore_index=True).array
+
+    epoch_columns = [
+        name
+        for name in first._epoch_predictors.columns
+        if all(name in part._epoch_predictors for part in epochs_list)
+    ]
+    time_columns = [
+        name
+        for name in first._columns
+        if name not in epoch_columns
+        and name not in first.channels
+        and name != first.time
+    ]
+
+    epoch_predictors = pd.concat(
+        [part._epoch_predictors[epoch_columns] for part in epochs_list]
+    )
+    epoch_predictors.index = epoch_index
+    time_predictors = pd.DataFrame(
+        {name: stacked(name).take(sources) for name in time_columns},
+        index=epoch_index[sample_epochs],
+        copy=False,
+    )
+
+    return Epochs._from_arrays(
+        data,
+        time=first.time,
+        epoch_id=first.epoch_id,
+        channels=list(first.channels),
+        epoch_index=epoch_index,
+        time_index=first.time_index,
+        epoch_predictors=epoch_predictors,
+        time_predictors=time_predictors,
+        columns=list(first._columns),
+    )
@@ -0,0 +1,101 @@
+import sys
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from contextlib import contextmanager
+
+from .errors import FitGridError
+
+EXECUTORS = ('serial', 'process', 'thread')
+
+
+class SerialExecutor(Executor):
+    """Executor running tasks one at a time in the calling thread.
+
+    ``map`` is lazy, as the builtin ``map``, so tasks run as their results
+    are consumed.
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+        return future
+
+    def map(self, fn, *iterables, timeout=None, chunksize=1):
+        return map(fn, *iterables)
+
+
+def n_workers(executor, default=1):
+    """Return the number of workers of an executor, or default if unknown."""
+
+    if isinstance(executor, SerialExecutor):
+        return 1
+    return getattr(executor, '_max_workers', default)
+
+
+def process_pool(n_workers, initializer=None):
+    """Start a pool of worker processes, initialized when supported.
+
+    Process pools take an initializer from Python 3.7, on Python 3.6 it is
+    not run and workers initialize on their first task instead.
+    """
+
+    if initializer is None or sys.version_info < (3, 7):
+        return ProcessPoolExecutor(n_workers)
+    return ProcessPoolExecutor(n_workers, initializer=initializer)
+
+
+@contextmanager
+def get_executor(executor=None, parallel=False, n_cores=4, initializer=None):
+    """Context manager providing the executor used to fit a grid.
+
+    Parameters
+    ----------
+    executor : {'serial', 'process', 'thread'} or Executor, optional
+        'serial' runs in the calling process, 'process' and 'thread' start a
+        pool of ``n_cores`` worker processes or threads that is shut down on
+        exit. A ``concurrent.futures.Executor`` is used as is and left
+        running, so that one pool can serve many fits. Defaults to 'process'
+        if ``parallel`` is True, 'serial' otherwise.
+    parallel : bool, defaults to False
+        default executor choice, see above
+    n_cores : int, defaults to 4
+        number of workers of pools started here
+    initializer : callable, optional
+        called in each worker process of a 'process' pool started here
+        before its first task, for instance to load R, see ``process_pool``
+
+    Yields
+    ------
+    executor : concurrent.futures.Executor
+        executor to submit tasks to
+    """
+
+    if executor is None:
+        executor = 'process' if parallel else 'serial'
+
+    if isinstance(executor, Executor):
+        yield executor
+        return
+
+    if executor == 'serial':
+        pool = SerialExecutor()
+    elif executor == 'process':
+        pool = process_pool(n_cores, initializer)
+    elif executor == 'thread':
+        pool = ThreadPoolExecutor(n_cores)
+    else:
+        raise FitGridError(
+            f'executor must be one of {EXECUTORS} or a '
+            f'concurrent.futures.Executor, got {executor!r}.'
+        )
+    with pool:
+        yield pool
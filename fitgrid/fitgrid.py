@@ -3,9 +3,10 @@ import pandas as pd
 import pickle
 from functools import lru_cache
 import warnings
+from scipy import stats
 
 from .errors import FitGridError
-from . import tools
+from . import tools, ols
 
 
 class FitGrid:
@@ -81,6 +82,14 @@ class FitGrid:
             `grid[25:-25, 'channel2']
         """
 
+        time, channels = self._parse_slicer(slicer)
+        subgrid = self._grid.loc[time, channels].copy()
+        return self.__class__(subgrid, self.epoch_index, self.time)
+
+    @staticmethod
+    def _parse_slicer(slicer):
+        """Return the time and channels slicer components for .loc."""
+
         if (
             not isinstance(slicer, tuple)
             or not hasattr(slicer, '__len__')
@@ -108,10 +117,7 @@ class FitGrid:
                 # which can't be used to create a FitGrid object
                 return [component]
 
-        time = check_slicer_component(time)
-        channels = check_slicer_component(channels)
-        subgrid = self._grid.loc[time, channels].copy()
-        return self.__class__(subgrid, self.epoch_index, self.time)
+        return check_slicer_component(time), check_slicer_component(channels)
 
     @lru_cache()
     def __getattr__(self, name):
@@ -122,6 +128,11 @@ class FitGrid:
         broadcast if it does.
         """
 
+        # special names are looked up on the class by pickle and others,
+        # before the grid is set when unpickling
+        if name.startswith('__'):
+            raise AttributeError(f'No such attribute: {name}.')
+
         if not hasattr(self.tester, name):
             raise AttributeError(f'No such attribute: {name}.')
 
@@ -174,8 +185,10 @@ class FitGrid:
 
         """
 
+        # the grid class is saved too, cells such as kept results do not
+        # tell which model they come from
         with open(filename, 'wb') as file:
-            kernel = self._grid, self.epoch_index, self.time
+            kernel = self._grid, self.epoch_index, self.time, self.__class__
             pickle.dump(kernel, file, protocol=pickle.HIGHEST_PROTOCOL)
 
     def expand_series_or_df(self, temp):
@@ -398,7 +411,7 @@ class LMFitGrid(FitGrid):
             gs = plt.GridSpec(2, 2, width_ratios=[13, 3], height_ratios=[7, 2])
 
             bar = plt.subplot(gs[1])
-            bar.barh(self._grid.columns, rsq_adj.mean(axis=0))
+            bar.barh(self.channels, rsq_adj.mean(axis=0))
 
             heatmap = plt.subplot(gs[0], sharey=bar)
             heatmap_image = heatmap.imshow(rsq_adj.T, aspect='auto')
@@ -446,18 +459,357 @@ class LMFitGrid(FitGrid):
         )
 
 
+def _positions(index, labels):
+    """Return the positions of labels, as selected by ``.loc``, in index."""
+
+    return pd.Series(np.arange(len(index)), index=index).loc[labels].to_numpy()
+
+
+class CellResults:
+    """Results of one cell held as attributes under their names.
+
+    Cells of array-backed grids, of lmer fits with ``refit`` or
+    ``warm_start`` and of fits with ``keep`` or ``extract`` hold their
+    results as CellResults, under the names of the statsmodels or pymer4
+    attributes they stand for, so that grids broadcast them like the full
+    model results.
+    """
+
+    def __init__(self, **results):
+        self.__dict__.update(results)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} of {", ".join(self.__dict__)}>'
+
+
+class _ArrayFitGrid:
+    """Grid methods shared by grids holding their results as arrays.
+
+    Subclasses hold times x ... x channels arrays in ``_results`` and
+    define ``_cell``, which returns the CellResults of a cell, and
+    ``_replace``, which returns a grid of the same model with other arrays.
+    """
+
+    @property
+    def tester(self):
+        return self._cell(0, 0)
+
+    def _slice_results(self, time_positions, channel_positions):
+        return {
+            name: values[time_positions][..., channel_positions]
+            for name, values in self._results.items()
+        }
+
+    def __getitem__(self, slicer):
+        """Slice grid on time and channels, as FitGrid."""
+
+        time, channels = self._parse_slicer(slicer)
+        time_positions = _positions(self.time_index, time)
+        channel_positions = _positions(self.channels, channels)
+        return self._replace(
+            self._slice_results(time_positions, channel_positions),
+            self.time_index[time_positions],
+            [self.channels[position] for position in channel_positions],
+        )
+
+    def __call__(self, *args, **kwargs):
+        raise FitGridError(
+            'This grid is not callable, current type is CellResults.'
+        )
+
+    def __repr__(self):
+
+        samples, chans = len(self.time_index), len(self.channels)
+        classname = self.__class__.__name__
+        return f'{samples} by {chans} {classname} of type {CellResults}.'
+
+    def save(self, filename):
+        """Save the grid to file (reload with ``fitgrid.load_grid``).
+
+        Parameters
+        ----------
+        filename : str
+            file name to use
+
+        """
+
+        with open(filename, 'wb') as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class OLSFitGrid(_ArrayFitGrid, LMFitGrid):
+    """Hold the OLS results of a whole grid as arrays.
+
+    OLSFitGrid is built by ``fitgrid.lm(..., engine='numpy')``. Attribute
+    access broadcasts as in LMFitGrid, ``grid.params``, ``grid.bse``,
+    ``grid.rsquared_adj``, ``grid.resid`` and the other attributes listed in
+    ``fitgrid.ols.fit`` return the same DataFrames as for a grid of
+    statsmodels results, assembled from the arrays.
+
+    Parameters
+    ----------
+    results : dict of numpy.ndarray
+        OLS results keyed by statsmodels attribute name, times x channels,
+        times x params x channels for ``fitgrid.ols.PARAM_RESULTS``, times x
+        epochs x channels for ``fitgrid.ols.EPOCH_RESULTS`` and times x
+        epochs, or 1 x epochs for a design constant over time, for
+        ``fitgrid.ols.DESIGN_RESULTS``
+    param_names : pandas Index
+        model parameter names
+    RHS : str
+        right hand side of the model formula
+    time_index : pandas Index
+        time points, named by the time column
+    channels : list of str
+        channel names
+    epoch_index : pandas Index
+        index containing epoch ids
+    refit : callable, optional
+        ``refit(time, channel)`` returns statsmodels results for one cell,
+        see ``cell_results``
+
+    Notes
+    -----
+    There are no per-cell objects, the grid holds the result arrays only,
+    so it is about the size of the residuals and pickles quickly. Design
+    matrices and responses are not kept. A statsmodels results object for a
+    cell, with methods such as ``get_influence``, is only built on request
+    by ``cell_results``. ``influential_epochs`` computes Cook's distance
+    from the residuals and the leverages kept as ``hat_diag``.
+    """
+
+    def __init__(
+        self,
+        results,
+        param_names,
+        RHS,
+        time_index,
+        channels,
+        epoch_index,
+        refit=None,
+    ):
+        self._results = results
+        self.param_names = param_names
+        self.RHS = RHS
+        self.time_index = time_index
+        self.channels = list(channels)
+        self.epoch_index = epoch_index
+        self.time = time_index.name
+        self._refit = refit
+
+    def __getstate__(self):
+        # the refit closure holds the epochs, it is not saved
+        state = self.__dict__.copy()
+        state['_refit'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def _cell(self, time_position, channel_position):
+        """Return CellResults of the cell at time and channel positions."""
+
+        cell = {}
+        for name, values in self._results.items():
+            if name in ols.DESIGN_RESULTS:
+                values = values[time_position if len(values) > 1 else 0]
+            else:
+                values = values[time_position, ..., channel_position]
+            if name in ols.PARAM_RESULTS:
+                cell[name] = pd.Series(values, index=self.param_names)
+            elif name in ols.EPOCH_RESULTS + ols.DESIGN_RESULTS:
+                cell[name] = pd.Series(values, index=self.epoch_index)
+            else:
+                cell[name] = values.item()
+        return CellResults(**cell)
+
+    def _slice_results(self, time_positions, channel_positions):
+        # the design results of a constant design have a single row
+        return {
+            name: (
+                (values[time_positions] if len(values) > 1 else values)
+                if name in ols.DESIGN_RESULTS
+                else values[time_positions][..., channel_positions]
+            )
+            for name, values in self._results.items()
+        }
+
+    def _replace(self, results, time_index, channels):
+        """Return a grid of the same model with other result arrays."""
+
+        return self.__class__(
+            results,
+            self.param_names,
+            self.RHS,
+            time_index,
+            channels,
+            self.epoch_index,
+            refit=self._refit,
+        )
+
+    def __getattr__(self, name):
+        """Return a result as a DataFrame shaped like the FitGrid broadcast."""
+
+        # private names are looked up before the results are set, when
+        # unpickling for instance
+        if name.startswith('_') or name not in self._results:
+            raise AttributeError(
+                f'No such attribute: {name}, or it was not kept. Statsmodels '
+                'results of single cells are available with '
+                'cell_results(time, channel).'
+            )
+
+        values = self._results[name]
+        if name in ols.PARAM_RESULTS:
+            index = pd.MultiIndex.from_product(
+                [self.time_index, self.param_names],
+                names=[self.time, None],
+            )
+        elif name in ols.EPOCH_RESULTS + ols.DESIGN_RESULTS:
+            index = pd.MultiIndex.from_product(
+                [self.time_index, self.epoch_index]
+            )
+        else:
+            index = self.time_index
+        if name in ols.DESIGN_RESULTS:
+            # the same for all channels, and times if the design is constant
+            shape = (len(self.time_index),) + values.shape[1:]
+            values = np.broadcast_to(values, shape)
+            values = np.repeat(values[..., np.newaxis], len(self.channels), -1)
+        values = values.reshape(-1, len(self.channels))
+        return pd.DataFrame(values, index=index, columns=self.channels)
+
+    def _require(self, names, purpose):
+        missing = [name for name in names if name not in self._results]
+        if missing:
+            raise FitGridError(
+                f'{purpose} needs results {missing}, which were not kept, '
+                'fit with these in keep.'
+            )
+
+    def __dir__(self):
+
+        grid_attrs = [
+            self.save.__name__,
+            self.conf_int.__name__,
+            self.cell_results.__name__,
+            self.plot_betas.__name__,
+            self.plot_adj_rsquared.__name__,
+            self.influential_epochs.__name__,
+        ]
+        return list(self._results) + grid_attrs
+
+    def conf_int(self, alpha=0.05):
+        """Return confidence intervals of the parameters, as statsmodels.
+
+        Parameters
+        ----------
+        alpha : float, defaults to 0.05
+            the intervals have ``1 - alpha`` coverage
+
+        Returns
+        -------
+        conf_int : pandas DataFrame
+            lower (0) and upper (1) bounds indexed by time, parameter and
+            bound, with channels as columns
+        """
+
+        self._require(['params', 'bse', 'df_resid'], 'conf_int')
+        params, bse = self._results['params'], self._results['bse']
+        df_resid = self._results['df_resid'][:, np.newaxis]
+        half_width = stats.t.ppf(1 - alpha / 2, df_resid) * bse
+        bounds = np.stack([params - half_width, params + half_width], axis=2)
+        index = pd.MultiIndex.from_product(
+            [self.time_index, self.param_names, [0, 1]],
+            names=[self.time, None, None],
+        )
+        values = bounds.reshape(-1, len(self.channels))
+        return pd.DataFrame(values, index=index, columns=self.channels)
+
+    def influential_epochs(self, top=None):
+        """Return dataframe with top influential epochs ranked by Cook's-D.
+
+        Parameters
+        ----------
+        top : int, optional, default None
+            how many top epochs to return, all epochs by default
+
+        Returns
+        -------
+        top_epochs : pandas DataFrame
+            dataframe with epoch_id as index and aggregated Cook's-D as values
+
+        Notes
+        -----
+        Cook's distance is computed as statsmodels ``OLSInfluence`` does,
+        from the residuals and leverages, and aggregated by simple averaging
+        across time and channels.
+        """
+
+        self._require(['resid', 'hat_diag', 'mse_resid'], 'influential_epochs')
+        resid = self._results['resid']
+        hat_diag = self._results['hat_diag'][..., np.newaxis]
+        scale = self._results['mse_resid'][:, np.newaxis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            studentized = resid / np.sqrt(scale * (1 - hat_diag))
+            cooks_distance = (
+                np.square(studentized)
+                / len(self.param_names)
+                * hat_diag
+                / (1 - hat_diag)
+            )
+        average = pd.Series(
+            cooks_distance.mean(axis=(0, 2)), index=self.epoch_index
+        )
+        return (
+            average.sort_values(ascending=False)
+            .to_frame(name='average_Cooks_D')
+            .iloc[:top]
+        )
+
+    def cell_results(self, time, channel):
+        """Refit one cell with statsmodels and return its results.
+
+        Parameters
+        ----------
+        time : time label
+            time point of the cell
+        channel : str
+            channel of the cell
+
+        Returns
+        -------
+        results : statsmodels.regression.linear_model.RegressionResultsWrapper
+            statsmodels OLS results of the cell
+        """
+
+        if self._refit is None:
+            raise FitGridError(
+                'Statsmodels results are not available for loaded grids, '
+                'refit the cell with fitgrid.lm.'
+            )
+        if time not in self.time_index or channel not in self.channels:
+            raise FitGridError(f'No cell at time {time}, channel {channel}.')
+        return self._refit(time, channel)
+
+
 class LMERFitGrid(FitGrid):
+    def _fit_info(self):
+        """Return the fixed effects names and whether REML was used."""
+
+        return self.tester.fixef.columns, self.tester._REML
+
     def __or__(self, other):
 
-        if not isinstance(other, self.__class__):
+        if not isinstance(other, LMERFitGrid):
             raise FitGridError(
                 'Can only compare LMERFitGrid to other LMERFitGrid.'
             )
         # figure out the situation
-        this_fixef = self.tester.fixef.columns
-        other_fixef = other.tester.fixef.columns
+        this_fixef, this_REML = self._fit_info()
+        other_fixef, other_REML = other._fit_info()
         same_fixef = this_fixef.equals(other_fixef)
-        at_least_one_fit_with_REML = self.tester._REML or other.tester._REML
+        at_least_one_fit_with_REML = this_REML or other_REML
 
         if (not same_fixef) and at_least_one_fit_with_REML:
             raise FitGridError(
@@ -480,3 +832,157 @@ class LMERFitGrid(FitGrid):
             plt.colorbar(mappable=heatmap_image, cax=colorbar)
 
         return fig, gs, heatmap, colorbar
+
+
+class CompactLMERFitGrid(_ArrayFitGrid, LMERFitGrid):
+    """Hold the lmer results of a whole grid as arrays.
+
+    CompactLMERFitGrid is built by ``fitgrid.lmer(..., compact=True)``.
+    Attribute access broadcasts as in LMERFitGrid: ``grid.coefs``,
+    ``grid.AIC``, ``grid.logLike``, ``grid.has_warning``, ``grid.warnings``,
+    ``grid.ranef_var``, ``grid.fit_time``, ``grid.n_iterations`` and, when
+    kept, ``grid.residuals`` return DataFrames with times and channels as
+    for a grid of pymer4 results, assembled from the arrays. ``SSresid``,
+    the sum of squared residuals, is kept even without the residuals.
+
+    Parameters
+    ----------
+    results : dict of numpy.ndarray
+        lmer results keyed by pymer4 attribute name, times x channels,
+        times x params x coefs columns x channels for ``coefs``, times x
+        random effects x (Var, Std) x channels for ``ranef_var`` and times
+        x epochs x channels for ``residuals``
+    param_names : list of str
+        fixed effects names, the rows of ``coefs``
+    coef_names : list of str
+        columns of ``coefs``
+    ranef_names : list of tuple
+        (group, name) of each random effect, the rows of ``ranef_var``
+    RHS : str
+        right hand side of the lmer formula
+    REML : bool
+        whether the models were fit with REML
+    time_index : pandas Index
+        time points, named by the time column
+    channels : list of str
+        channel names
+    epoch_index : pandas Index
+        index containing epoch ids
+
+    Notes
+    -----
+    There are no per-cell objects, workers return the result arrays of
+    each cell and the grid holds them stacked, so it is a small fraction
+    of the size of a grid of pymer4 ``Lmer`` objects. The significance
+    stars of ``coefs`` are not kept, ``ranef_var`` is indexed by time,
+    group, name and Var or Std.
+    """
+
+    def __init__(
+        self,
+        results,
+        param_names,
+        coef_names,
+        ranef_names,
+        RHS,
+        REML,
+        time_index,
+        channels,
+        epoch_index,
+    ):
+        self._results = results
+        self.param_names = list(param_names)
+        self.coef_names = list(coef_names)
+        self.ranef_names = [tuple(name) for name in ranef_names]
+        self.RHS = RHS
+        self.REML = REML
+        self.time_index = time_index
+        self.channels = list(channels)
+        self.epoch_index = epoch_index
+        self.time = time_index.name
+
+    def _fit_info(self):
+        return pd.Index(self.param_names), self.REML
+
+    def _cell(self, time_position, channel_position):
+        """Return CellResults of the cell at time and channel positions."""
+
+        cell = {
+            name: values[time_position, ..., channel_position]
+            for name, values in self._results.items()
+        }
+        for name, values in cell.items():
+            if values.ndim == 0:
+                cell[name] = values.item()
+        cell['coefs'] = pd.DataFrame(
+            cell['coefs'], index=self.param_names, columns=self.coef_names
+        )
+        cell['ranef_var'] = pd.DataFrame(
+            cell['ranef_var'],
+            index=pd.MultiIndex.from_tuples(self.ranef_names),
+            columns=['Var', 'Std'],
+        )
+        if 'residuals' in cell:
+            cell['residuals'] = pd.Series(
+                cell['residuals'], index=self.epoch_index
+            )
+        channel = self.channels[channel_position]
+        return CellResults(
+            formula=f'{channel} ~ {self.RHS}', _REML=self.REML, **cell
+        )
+
+    def _replace(self, results, time_index, channels):
+        """Return a grid of the same model with other result arrays."""
+
+        return self.__class__(
+            results,
+            self.param_names,
+            self.coef_names,
+            self.ranef_names,
+            self.RHS,
+            self.REML,
+            time_index,
+            channels,
+            self.epoch_index,
+        )
+
+    def __getattr__(self, name):
+        """Return a result as a DataFrame shaped like the FitGrid broadcast."""
+
+        # private names are looked up before the results are set, when
+        # unpickling for instance
+        if name.startswith('_') or name not in self._results:
+            hint = (
+                ', fit with residuals=True to keep them'
+                if name == 'residuals'
+                else ''
+            )
+            raise AttributeError(f'No such attribute: {name}{hint}.')
+
+        values = self._results[name]
+        if name == 'coefs':
+            index = pd.MultiIndex.from_product(
+                [self.time_index, self.param_names, self.coef_names],
+                names=[self.time, None, None],
+            )
+        elif name == 'ranef_var':
+            index = pd.MultiIndex.from_tuples(
+                [
+                    (time, group, ranef, key)
+                    for time in self.time_index
+                    for group, ranef in self.ranef_names
+                    for key in ['Var', 'Std']
+                ],
+                names=[self.time, None, None, None],
+            )
+        elif name == 'residuals':
+            index = pd.MultiIndex.from_product(
+                [self.time_index, self.epoch_index]
+            )
+        else:
+            index = self.time_index
+        values = values.reshape(-1, len(self.channels))
+        return pd.DataFrame(values, index=index, columns=self.channels)
+
+    def __dir__(self):
+        return list(self._results) + [self.save.__name__]
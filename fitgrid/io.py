@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import pickle
 import statsmodels
@@ -6,12 +7,12 @@ from statsmodels.regression.linear_model import (
     RegressionResultsWrapper,
 )
 from .epochs import Epochs
-from .fitgrid import FitGrid, LMFitGrid, LMERFitGrid
+from .fitgrid import FitGrid, LMFitGrid, LMERFitGrid, CellResults
 from .errors import FitGridError
 from . import defaults
 
 
-def epochs_from_hdf(filename, key, time, epoch_id, channels):
+def epochs_from_hdf(filename, key, time, epoch_id, channels, dtype=None):
     """Construct Epochs object from an HDF5 file containing an epochs table.
 
     The HDF5 file should contain columns with names defined by `epoch_id` and
@@ -31,6 +32,8 @@ def epochs_from_hdf(filename, key, time, epoch_id, channels):
         epoch identifier column name
     channels : list of str
         list of string channel names
+    dtype : numpy floating point dtype, optional
+        dtype for storing channel data, e.g., ``numpy.float32``
 
     Returns
     -------
@@ -39,22 +42,43 @@ def epochs_from_hdf(filename, key, time, epoch_id, channels):
     """
 
     df = pd.read_hdf(filename, key=key)
+    return _epochs_from_table(df, time, epoch_id, channels, dtype)
+
+
+def _epochs_from_table(df, time, epoch_id, channels, dtype=None):
+    """Construct Epochs from a table read from file, sharing its memory."""
 
     # time and epoch id already present in index
     if epoch_id in df.index.names and time in df.index.names:
-        return Epochs(df, time=time, epoch_id=epoch_id, channels=channels)
+        return Epochs(
+            df,
+            time=time,
+            epoch_id=epoch_id,
+            channels=channels,
+            copy=False,
+            dtype=dtype,
+        )
 
     # time and epoch id present in columns, set index
     if epoch_id in df.columns and time in df.columns:
         df.set_index([epoch_id, time], inplace=True)
-        return Epochs(df, time=time, epoch_id=epoch_id, channels=channels)
+        return Epochs(
+            df,
+            time=time,
+            epoch_id=epoch_id,
+            channels=channels,
+            copy=False,
+            dtype=dtype,
+        )
 
     raise FitGridError(
         f'Dataset has to contain {epoch_id} and {time} as columns or indices.'
     )
 
 
-def epochs_from_dataframe(dataframe, time, epoch_id, channels):
+def epochs_from_dataframe(
+    dataframe, time, epoch_id, channels, copy=True, dtype=None
+):
     """Construct Epochs object from a Pandas DataFrame epochs table.
 
     The DataFrame should contain columns with names defined by epoch_id and
@@ -70,16 +94,28 @@ def epochs_from_dataframe(dataframe, time, epoch_id, channels):
         epoch identifier column name
     channels : list of str
         list of string channel names
+    copy : bool, defaults to True
+        set to False to let the Epochs share channel data memory with the
+        DataFrame when possible, see ``fitgrid.epochs.Epochs``
+    dtype : numpy floating point dtype, optional
+        dtype for storing channel data, e.g., ``numpy.float32``
 
     Returns
     -------
     epochs : Epochs
         an Epochs object with the data
     """
-    return Epochs(dataframe, time=time, epoch_id=epoch_id, channels=channels)
+    return Epochs(
+        dataframe,
+        time=time,
+        epoch_id=epoch_id,
+        channels=channels,
+        copy=copy,
+        dtype=dtype,
+    )
 
 
-def epochs_from_feather(filename, time, epoch_id, channels):
+def epochs_from_feather(filename, time, epoch_id, channels, dtype=None):
     """Construct Epochs object from a Feather file containing an epochs table.
 
     The file should contain columns with names defined by epoch_id and time.
@@ -94,6 +130,8 @@ def epochs_from_feather(filename, time, epoch_id, channels):
         epoch identifier column name
     channels : list of str
         list of string channel names
+    dtype : numpy floating point dtype, optional
+        dtype for storing channel data, e.g., ``numpy.float32``
 
     Returns
     -------
@@ -102,15 +140,206 @@ def epochs_from_feather(filename, time, epoch_id, channels):
     """
 
     df = pd.read_feather(filename)
+    return _epochs_from_table(df, time, epoch_id, channels, dtype)
 
-    # time and epoch id present in columns, set index
-    if epoch_id in df.columns and time in df.columns:
-        df.set_index([epoch_id, time], inplace=True)
-        return Epochs(df, time=time, epoch_id=epoch_id, channels=channels)
 
-    raise FitGridError(
-        f'Dataset has to contain {epoch_id} and {time} as columns or indices.'
-    )
+def epochs_from_store(path, mmap_mode='r'):
+    """Open an on-disk epochs store written by ``Epochs.to_store``.
+
+    The channel data are memory-mapped rather than read, so opening a store
+    takes about the same time regardless of its size. When fitting in
+    parallel, worker processes memory-map the same file instead of
+    receiving copies of the data.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        store directory
+    mmap_mode : {'r', 'r+', 'c', None}, defaults to 'r'
+        ``numpy.load`` memory-map mode for the channel data, None reads the
+        channel data into memory
+
+    Returns
+    -------
+    epochs : Epochs
+        an Epochs object backed by the store
+    """
+
+    return Epochs._from_store(path, mmap_mode=mmap_mode)
+
+
+def _time_windows(times, window):
+    """Return first and last time of consecutive windows of time points."""
+
+    if not (isinstance(window, (int, np.integer)) and window > 0):
+        raise FitGridError(
+            f'window must be a positive number of time points, got {window}.'
+        )
+    times = np.unique(times)
+    return [
+        (times[start], times[min(start + window, len(times)) - 1])
+        for start in range(0, len(times), window)
+    ]
+
+
+def windows_from_hdf(
+    filename, key, time, epoch_id, channels, window, dtype=None
+):
+    """Read an HDF5 epochs table as Epochs over consecutive time windows.
+
+    Only the rows of one window are in memory at a time. Pass the windows
+    to ``fitgrid.lm`` or ``fitgrid.lmer`` to fit tables that do not fit in
+    memory as a single Epochs object.
+
+    Parameters
+    ----------
+    filename : str
+        HDF5 file name
+    key : str
+        group identifier for the dataset when HDF5 file contains more than one
+    time : str
+        time column name
+    epoch_id : str
+        epoch identifier column name
+    channels : list of str
+        list of string channel names
+    window : int
+        number of time points in each window, the last window may be shorter
+    dtype : numpy floating point dtype, optional
+        dtype for storing channel data, e.g., ``numpy.float32``
+
+    Returns
+    -------
+    windows : generator of Epochs
+        Epochs objects of the windows, in time order, read on iteration
+
+    Notes
+    -----
+    The windows are selected with PyTables queries on time, so the table
+    must be stored in table format with time queryable, as an index level
+    or a data column, for instance written with
+    ``table.to_hdf(filename, key, format='table', data_columns=[time])``.
+    """
+
+    with pd.HDFStore(filename, mode='r') as store:
+        if key is None:
+            keys = store.keys()
+            if len(keys) != 1:
+                raise FitGridError(
+                    f'{filename} holds {len(keys)} datasets, pass a key.'
+                )
+            key = keys[0]
+        try:
+            times = store.select_column(key, time)
+        except (KeyError, TypeError, ValueError):
+            raise FitGridError(
+                f'{time} of {key} in {filename} can not be queried, store '
+                'the table in table format with data_columns=[time].'
+            )
+    bounds = _time_windows(times, window)
+
+    def windows():
+        for first, last in bounds:
+            # the bounds are query variables, their reprs may not parse
+            df = pd.read_hdf(
+                filename,
+                key=key,
+                where=[f'{time} >= first', f'{time} <= last'],
+            )
+            yield _epochs_from_table(df, time, epoch_id, channels, dtype)
+
+    return windows()
+
+
+def windows_from_feather(
+    filename, time, epoch_id, channels, window, dtype=None
+):
+    """Read a Feather epochs table as Epochs over consecutive time windows.
+
+    Only the rows of one window are converted to a DataFrame at a time.
+    Pass the windows to ``fitgrid.lm`` or ``fitgrid.lmer`` to fit tables
+    that do not fit in memory as a single Epochs object.
+
+    Parameters
+    ----------
+    filename : str
+        Feather file name
+    time : str
+        time column name
+    epoch_id : str
+        epoch identifier column name
+    channels : list of str
+        list of string channel names
+    window : int
+        number of time points in each window, the last window may be shorter
+    dtype : numpy floating point dtype, optional
+        dtype for storing channel data, e.g., ``numpy.float32``
+
+    Returns
+    -------
+    windows : generator of Epochs
+        Epochs objects of the windows, in time order, read on iteration
+
+    Notes
+    -----
+    Feather version 2 files are scanned one record batch at a time for the
+    rows of each window. Version 1 files are not compressed and are
+    memory-mapped instead.
+    """
+
+    import pyarrow
+    from pyarrow import dataset, feather
+
+    try:
+        source = dataset.dataset(filename, format='feather')
+    except pyarrow.ArrowInvalid:
+        table = feather.read_table(filename, memory_map=True)
+        source = dataset.dataset(table)
+
+    if time not in source.schema.names:
+        raise FitGridError(f'Dataset has to contain {time} as a column.')
+    times = source.to_table(columns=[time]).column(time).to_numpy()
+    bounds = _time_windows(times, window)
+
+    def windows():
+        for first, last in bounds:
+            selection = (dataset.field(time) >= first) & (
+                dataset.field(time) <= last
+            )
+            df = source.to_table(filter=selection).to_pandas()
+            yield _epochs_from_table(df, time, epoch_id, channels, dtype)
+
+    return windows()
+
+
+def windows_from_store(path, window, mmap_mode='r'):
+    """Open an on-disk epochs store as Epochs over consecutive time windows.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        store directory
+    window : int
+        number of time points in each window, the last window may be shorter
+    mmap_mode : {'r', 'r+', 'c'}, defaults to 'r'
+        ``numpy.load`` memory-map mode for the channel data
+
+    Returns
+    -------
+    windows : generator of Epochs
+        Epochs objects of the windows, in time order, views on the
+        memory-mapped store
+    """
+
+    epochs = epochs_from_store(path, mmap_mode=mmap_mode)
+    positions = np.arange(len(epochs.time_index))
+    bounds = _time_windows(positions, window)
+
+    def windows():
+        for first, last in bounds:
+            yield epochs.sel(time=(positions >= first) & (positions <= last))
+
+    return windows()
 
 
 def load_grid(filename):
@@ -127,16 +356,37 @@ def load_grid(filename):
         loaded FitGrid object
     """
 
-    from pymer4 import Lmer
-
     with open(filename, 'rb') as file:
-        _grid, epoch_index, time = pickle.load(file)
+        kernel = pickle.load(file)
+
+    # array-backed grids are saved whole
+    if isinstance(kernel, FitGrid):
+        return kernel
+
+    # grids saved with their class
+    if len(kernel) == 4:
+        _grid, epoch_index, time, grid_class = kernel
+        return grid_class(_grid, epoch_index, time)
+
+    # otherwise the grid class is told from the cells
+    _grid, epoch_index, time = kernel
 
     tester = _grid.iloc[0, 0]
 
     if isinstance(tester, (RegressionResults, RegressionResultsWrapper)):
         return LMFitGrid(_grid, epoch_index, time)
-    elif isinstance(tester, Lmer):
+    # lmer fits with refit or warm_start, their cells record REML
+    if isinstance(tester, CellResults) and hasattr(tester, '_REML'):
+        return LMERFitGrid(_grid, epoch_index, time)
+
+    # pymer4 is needed only to recognize its results, which could not have
+    # been unpickled without it
+    try:
+        from pymer4 import Lmer
+    except ImportError:
+        return FitGrid(_grid, epoch_index, time)
+
+    if isinstance(tester, Lmer):
         return LMERFitGrid(_grid, epoch_index, time)
     else:
         return FitGrid(_grid, epoch_index, time)
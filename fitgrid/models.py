@@ -1,18 +1,38 @@
 from os import environ
+import re
+import threading
 from math import ceil
 from functools import partial
-from multiprocessing import Pool
-from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stdout, ExitStack
 from io import StringIO
+from time import perf_counter
 
 import numpy as np
 import pandas as pd
+import patsy
+from patsy.eval import ast_names
 from statsmodels.formula.api import ols
+from statsmodels.formula.formulatools import NAAction
+from statsmodels.regression.linear_model import OLS
 from tqdm import tqdm
 
 from .errors import FitGridError
-from . import tools
-from .fitgrid import FitGrid, LMFitGrid, LMERFitGrid
+from . import tools, executors, ols as ols_engine
+from .epochs import Epochs
+from .fitgrid import (
+    FitGrid,
+    LMFitGrid,
+    LMERFitGrid,
+    OLSFitGrid,
+    CompactLMERFitGrid,
+    CellResults,
+)
+from .results import ResultStore
+
+# pool scheduling: tasks are cut and sent in chunks so that each worker
+# gets about this many chunks, for load balancing
+_CHUNKS_PER_WORKER = 8
 
 
 def validate_LHS(epochs, LHS):
@@ -24,7 +44,7 @@ def validate_LHS(epochs, LHS):
         raise FitGridError('LHS must be a list of strings.')
 
     # all LHS items must be present in the epochs_table
-    missing = set(LHS) - set(epochs.table.columns)
+    missing = set(LHS) - set(epochs._columns)
     if missing:
         raise FitGridError(
             'Items in LHS should all be present in the epochs table, '
@@ -41,14 +61,105 @@ def validate_RHS(RHS):
         raise FitGridError('RHS has to be a string.')
 
 
-def process_key_and_group(key_and_group, function, channels):
+def _keep_attributes(result, names):
+    try:
+        return {name: getattr(result, name) for name in names}
+    except AttributeError as error:
+        raise FitGridError(f'Can not keep results: {error}') from None
+
+
+def _project(result, extract):
+    kept = extract(result)
+    if not isinstance(kept, dict):
+        raise FitGridError(
+            f'extract must return a dict of results, got {type(kept)}.'
+        )
+    return CellResults(**kept)
+
+
+def _projection(keep, extract):
+    """Return the function projecting cell results, None to keep them."""
+
+    if keep is not None and extract is not None:
+        raise FitGridError('Pass either keep or extract, not both.')
+    if keep is not None:
+        if isinstance(keep, str):
+            keep = [keep]
+        extract = partial(_keep_attributes, names=tuple(keep))
+    if extract is None:
+        return None
+    return partial(_project, extract=extract)
+
+
+def process_key_and_group(key_and_group, function, channels, project=None):
     key, group = key_and_group
-    results = {channel: function(group, channel) for channel in channels}
+    fit_channels = getattr(function, 'fit_channels', None)
+    if fit_channels is not None:
+        results = fit_channels(group, channels)
+    else:
+        results = {channel: function(group, channel) for channel in channels}
+    if project is not None:
+        results = {
+            channel: project(result) for channel, result in results.items()
+        }
     return pd.Series(results, name=key)
 
 
+def process_block(
+    task, epochs, function, n_threads=None, project=None, subset=None
+):
+    # with subset, tasks are (key, position, channels) and the cells are fit
+    # on the rows subset(snapshot, key) of the snapshot
+    if subset is None:
+        position, channels = task
+    else:
+        key, position, channels = task
+    with tools.blas_threads(n_threads):
+        snapshot = epochs._snapshot(position)
+        if subset is not None:
+            snapshot = subset(snapshot, key)
+        fit_channels = getattr(function, 'fit_channels', None)
+        if fit_channels is not None:
+            fitted = fit_channels(snapshot, channels)
+            results = [fitted[channel] for channel in channels]
+        else:
+            results = [function(snapshot, channel) for channel in channels]
+    if project is not None:
+        results = [project(result) for result in results]
+    return results
+
+
+def _block_tasks(n_times, channels, n_workers):
+    """Split the grid into (time position, channels) tasks for a pool.
+
+    Time points are split into blocks of channels when there are too few of
+    them to give each worker ``_CHUNKS_PER_WORKER`` tasks.
+    """
+
+    n_blocks = min(
+        len(channels), ceil(n_workers * _CHUNKS_PER_WORKER / n_times)
+    )
+    bounds = np.linspace(0, len(channels), n_blocks + 1).astype(int)
+    blocks = [
+        list(channels[start:stop])
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    ]
+    return [
+        (position, block) for position in range(n_times) for block in blocks
+    ]
+
+
 def run_model(
-    epochs, function, channels=None, parallel=False, n_cores=4, quiet=False
+    epochs,
+    function,
+    channels=None,
+    parallel=False,
+    n_cores=4,
+    quiet=False,
+    executor=None,
+    threads_per_worker=None,
+    keep=None,
+    extract=None,
 ):
     """Run an arbitrary model on the epochs.
 
@@ -66,6 +177,21 @@ def run_model(
         number of processes to run in parallel
     quiet : bool, defaults to False
         set to True to disable progress bar display
+    executor : {'serial', 'process', 'thread'} or Executor, optional
+        how to run the fits, defaults to 'process' if ``parallel`` is True,
+        'serial' otherwise. 'process' and 'thread' start a pool of
+        ``n_cores`` workers for this call, a ``concurrent.futures.Executor``
+        is used as is and left running, see Notes
+    threads_per_worker : int, optional
+        number of BLAS threads of each worker, defaults to the CPUs shared
+        out among the workers of a pool so that they do not oversubscribe
+        the machine, serial fits leave BLAS as it is
+    keep : list of str, optional
+        names of the cell results to keep, for instance
+        ``['params', 'bse', 'pvalues', 'aic']``, see Notes
+    extract : callable, optional
+        ``extract(result)`` returns a dict of the results to keep for a
+        cell, for instance to keep method results, see Notes
 
     Returns
     -------
@@ -81,6 +207,34 @@ def run_model(
     target variable that the function runs the model against (uses it as
     the dependent variable).
 
+    A function that can fit several channels of a snapshot together, for
+    instance sharing one design, may also have a ``fit_channels(data,
+    channels)`` method returning a dict of results by channel. It is then
+    called once per snapshot, or per block of channels, instead of calling
+    the function once per channel.
+
+    Starting worker processes, importing modules in them and loading R for
+    ``lmer`` takes time. To pay for it once in a session, create an executor
+    and pass it to each call, for instance::
+
+        with concurrent.futures.ProcessPoolExecutor(8) as executor:
+            grid_a = fitgrid.lm(epochs, RHS='a', executor=executor)
+            grid_b = fitgrid.lm(epochs, RHS='a + b', executor=executor)
+
+    Pools fit (time point, block of channels) tasks, channels are split in
+    blocks only when there are few time points, and the tasks are sent in
+    small chunks so that slow cells do not leave other workers idle. Worker
+    processes do not receive the snapshots. The channel data are written
+    once to a memory-mapped file in shared memory, workers build the
+    snapshots as views on it.
+
+    With ``keep`` or ``extract`` the workers return only the requested
+    results of each cell instead of whole model objects, which can be far
+    larger. The cells of the grid are then ``CellResults`` holding these
+    results as attributes, grid attributes are broadcast as usual for the
+    kept names. Like ``function``, ``extract`` must be picklable, defined
+    at module level, to run on a process pool.
+
     Examples
     --------
     Here's an example of a function that can be passed to ``run_model``::
@@ -98,12 +252,26 @@ def run_model(
         parallel=parallel,
         n_cores=n_cores,
         quiet=quiet,
+        executor=executor,
+        threads_per_worker=threads_per_worker,
+        keep=keep,
+        extract=extract,
     )
     return FitGrid(_grid, epochs.epoch_index, epochs.time)
 
 
 def _run_model(
-    epochs, function, channels=None, parallel=False, n_cores=4, quiet=False
+    epochs,
+    function,
+    channels=None,
+    parallel=False,
+    n_cores=4,
+    quiet=False,
+    executor=None,
+    threads_per_worker=None,
+    keep=None,
+    extract=None,
+    initializer=None,
 ):
 
     if channels is None:
@@ -111,31 +279,344 @@ def _run_model(
 
     validate_LHS(epochs, channels)
 
-    groups = tqdm(epochs._snapshots, disable=quiet)
-    processor = partial(
-        process_key_and_group, function=function, channels=channels
-    )
+    project = _projection(keep, extract)
 
-    if parallel:
-        chunksize = ceil(len(groups) / n_cores)
-        with tools.single_threaded(np):
-            with Pool(n_cores) as pool:
-                results = pool.map(processor, groups, chunksize=chunksize)
+    if threads_per_worker is not None and not (
+        isinstance(threads_per_worker, int) and threads_per_worker > 0
+    ):
+        raise FitGridError(
+            'threads_per_worker must be a positive integer, '
+            f'got {threads_per_worker!r}.'
+        )
 
-    else:
-        results = map(processor, groups)
+    n_times = len(epochs.time_index)
+    with ExitStack() as stack:
+        pool = stack.enter_context(
+            executors.get_executor(executor, parallel, n_cores, initializer)
+        )
+        if isinstance(pool, executors.SerialExecutor):
+            stack.enter_context(tools.blas_threads(threads_per_worker))
+            snapshots = tqdm(
+                epochs._iter_snapshots(), total=n_times, disable=quiet
+            )
+            processor = partial(
+                process_key_and_group,
+                function=function,
+                channels=channels,
+                project=project,
+            )
+            grid = pd.concat(map(processor, snapshots), axis=1).T
+        else:
+            n_workers = executors.n_workers(pool, n_cores)
+            if threads_per_worker is None:
+                threads_per_worker = max(1, tools.cpu_count() // n_workers)
+            if isinstance(pool, ProcessPoolExecutor):
+                # workers memory-map the channel data, only task descriptors
+                # are sent, snapshots are built in the workers, which set
+                # their own BLAS threads
+                epochs = stack.enter_context(epochs._shared())
+                n_threads = threads_per_worker
+            else:
+                # threads share the BLAS libraries of this process
+                stack.enter_context(tools.blas_threads(threads_per_worker))
+                n_threads = None
+            processor = partial(
+                process_block,
+                epochs=epochs,
+                function=function,
+                n_threads=n_threads,
+                project=project,
+            )
+            grid = _run_blocks(
+                pool, n_workers, processor, epochs, channels, quiet
+            )
 
-    grid = pd.concat(results, axis=1).T
     grid.index.name = epochs.time
 
     return grid  # dataframe, not FitGrid
 
 
+def _run_blocks(pool, n_workers, processor, epochs, channels, quiet):
+    """Fit the grid on a pool of workers, return a times x channels frame.
+
+    The tasks are sent in small chunks, so that workers done early take
+    more work while slow cells are fit, instead of one large static chunk
+    of time points per worker.
+    """
+
+    tasks = _block_tasks(len(epochs.time_index), channels, n_workers)
+    chunksize = max(1, len(tasks) // (n_workers * _CHUNKS_PER_WORKER))
+    results = pool.map(processor, tasks, chunksize=chunksize)
+
+    cells = np.empty((len(epochs.time_index), len(channels)), dtype=object)
+    columns = {channel: i for i, channel in enumerate(channels)}
+    results = tqdm(results, total=len(tasks), disable=quiet)
+    for (position, block), block_results in zip(tasks, results):
+        for channel, result in zip(block, block_results):
+            cells[position, columns[channel]] = result
+
+    grid = pd.DataFrame(cells, index=epochs.time_index, columns=channels)
+    return grid.infer_objects()
+
+
+def _lm_design(epochs, RHS, eval_env):
+    """Return the design of the first snapshot and whether it is constant.
+
+    The design is the same at every time point when all epochs table
+    columns the formula refers to are constant within epochs.
+    """
+
+    design = patsy.dmatrix(
+        RHS,
+        epochs._snapshot(0),
+        eval_env=eval_env,
+        NA_action='raise',
+        return_type='dataframe',
+    )
+    names = {
+        name
+        for factor in design.design_info.factor_infos
+        for name in ast_names(factor.code)
+    }
+    columns = names & set(epochs._columns)
+    is_constant = all(name in epochs._epoch_predictors for name in columns)
+    return design, is_constant
+
+
+def _lm_numpy(epochs, LHS, RHS, eval_env):
+    """Fit lm with NumPy, return None when statsmodels must be used."""
+
+    if not set(LHS) <= set(epochs.channels):
+        return None
+
+    positions = [epochs.channels.index(channel) for channel in LHS]
+    responses = epochs._data[:, :, positions].astype(np.float64)
+    if np.isnan(responses).any():
+        return None
+
+    try:
+        design, is_constant = _lm_design(epochs, RHS, eval_env)
+        if is_constant:
+            designs = [design]
+        else:
+            # the design info is reused when valid for all time points,
+            # otherwise designs are built afresh, as statsmodels does
+            reusable = _design_info_is_reusable(
+                design.design_info,
+                set(epochs._columns),
+                set(epochs._epoch_predictors.columns),
+            )
+            designs = [design]
+            for position in range(1, len(epochs.time_index)):
+                snapshot = epochs._snapshot(position)
+                if reusable:
+                    (item,) = patsy.build_design_matrices(
+                        [design.design_info],
+                        snapshot,
+                        NA_action='raise',
+                        return_type='dataframe',
+                    )
+                else:
+                    item = patsy.dmatrix(
+                        RHS,
+                        snapshot,
+                        eval_env=eval_env,
+                        NA_action='raise',
+                        return_type='dataframe',
+                    )
+                designs.append(item)
+    except patsy.PatsyError:
+        # missing values are dropped cell by cell in statsmodels
+        return None
+
+    # designs must stack, categorical levels can differ between times
+    names = design.columns
+    if not all(item.columns.equals(names) for item in designs):
+        return None
+
+    n_epochs, n_times, n_channels = responses.shape
+    if is_constant:
+        # one design for all times and channels, a single right-hand side
+        exog = design.to_numpy()[np.newaxis]
+        endog = responses.reshape(1, n_epochs, n_times * n_channels)
+        results = ols_engine.fit(exog, endog)
+        for name, values in results.items():
+            if name in ols_engine.DESIGN_RESULTS:
+                # 1 x epochs, the same at every time
+                continue
+            # 1 x ... x (times * channels) to times x ... x channels
+            shape = values.shape[1:-1] + (n_times, n_channels)
+            results[name] = np.moveaxis(values[0].reshape(shape), -2, 0)
+    else:
+        # times x epochs x k designs, all channels of a time solved together
+        exog = np.stack([item.to_numpy() for item in designs])
+        endog = responses.transpose(1, 0, 2)
+        results = ols_engine.fit(exog, endog)
+
+    refit = partial(_lm_cell, epochs=epochs, RHS=RHS, eval_env=eval_env)
+    return OLSFitGrid(
+        results,
+        names,
+        RHS,
+        epochs.time_index,
+        LHS,
+        epochs.epoch_index,
+        refit=refit,
+    )
+
+
+def _lm_cell(time, channel, epochs, RHS, eval_env):
+    """Fit one cell with statsmodels, for OLSFitGrid.cell_results."""
+
+    snapshot = epochs._snapshot(epochs.time_index.get_loc(time))
+    return lm_single(snapshot, channel, RHS, eval_env)
+
+
 def lm_single(data, channel, RHS, eval_env):
+    # patsy builds float64 design matrices, float32 channels are upcast
     formula = channel + ' ~ ' + RHS
     return ols(formula, data, eval_env=eval_env).fit()
 
 
+def _design_info_is_reusable(design_info, columns, epoch_columns):
+    """Check that a design info built on one snapshot is valid for all.
+
+    Factors of columns constant within epochs evaluate the same at every
+    time point. Other numerical factors are evaluated afresh on each
+    snapshot unless they memorize state, like ``center``. Categorical levels
+    may differ between snapshots.
+    """
+
+    for factor, info in design_info.factor_infos.items():
+        if set(ast_names(factor.code)) & columns <= epoch_columns:
+            continue
+        if info.type == 'categorical' or info.state['transforms']:
+            return False
+    return True
+
+
+class _LMSingle:
+    """Fit a statsmodels OLS cell like ``lm_single``, reusing the design.
+
+    The patsy design info is built on the first snapshot and reused for the
+    whole fit when valid for all snapshots, otherwise it is built once per
+    snapshot. The design matrix is built once per snapshot and shared by
+    all channels, the channels are read directly as responses. Results are
+    the same as those of ``ols(channel + ' ~ ' + RHS, data).fit()``.
+    """
+
+    def __init__(self, RHS, eval_env, columns, epoch_columns):
+        self.RHS = RHS
+        self.eval_env = eval_env
+        self.columns = set(columns)
+        self.epoch_columns = set(epoch_columns)
+
+        # reused design info, and per thread the last snapshot with its
+        # design matrix, so that thread pools can share the instance
+        self._design_info = None
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # patsy design infos can not be pickled, workers build their own
+        state = self.__dict__.copy()
+        state['_design_info'] = None
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _design(self, data):
+        """Return the design matrix of a snapshot and its missing rows."""
+
+        local = self._local
+        if getattr(local, 'data', None) is not data:
+            design_info = self._design_info
+            if design_info is None:
+                # an integer eval_env refers to the same frame as in
+                # lm_single: statsmodels adds a frame for its formula
+                # handling, here it is this method
+                design_info = patsy.dmatrix(
+                    self.RHS,
+                    data,
+                    eval_env=self.eval_env,
+                    NA_action=NAAction(on_NA='drop'),
+                    return_type='dataframe',
+                ).design_info
+                if _design_info_is_reusable(
+                    design_info, self.columns, self.epoch_columns
+                ):
+                    self._design_info = design_info
+            na_action = NAAction(on_NA='drop')
+            (local.exog,) = patsy.build_design_matrices(
+                [design_info],
+                data,
+                NA_action=na_action,
+                return_type='dataframe',
+            )
+            local.rhs_missing = na_action.missing_mask
+            local.data = data
+        return local.exog, local.rhs_missing
+
+    def __call__(self, data, channel):
+
+        exog, rhs_missing = self._design(data)
+
+        # patsy builds float64 design matrices, float32 channels are upcast
+        endog = data[[channel]].astype(np.float64)
+        missing = rhs_missing | endog[channel].isna().to_numpy()
+        design_info = exog.design_info
+        if missing.any():
+            endog = endog[~missing]
+            exog = exog[~missing[~rhs_missing]]
+
+        formula = channel + ' ~ ' + self.RHS
+        model = OLS(
+            endog,
+            exog,
+            missing='drop',
+            missing_idx=missing if missing.any() else None,
+            formula=formula,
+            design_info=design_info,
+        )
+        model.formula = formula
+        model.data.frame = data
+        return model.fit()
+
+
+def _fit_windows(
+    fit,
+    windows,
+    results,
+    executor,
+    parallel,
+    n_cores,
+    initializer=None,
+    **kwargs,
+):
+    """Fit time windows one at a time, appending the grids to a store."""
+
+    if results is None:
+        raise FitGridError(
+            'Pass results, the directory of the result store, to fit time '
+            'windows.'
+        )
+    store = ResultStore._create(results)
+
+    with executors.get_executor(
+        executor, parallel, n_cores, initializer
+    ) as pool:
+        for window in windows:
+            if not isinstance(window, Epochs):
+                raise FitGridError(
+                    f'Expected Epochs or time windows of Epochs, got '
+                    f'{type(window)}.'
+                )
+            store.append(fit(window, executor=pool, **kwargs))
+    return store
+
+
 def lm(
     epochs,
     LHS=None,
@@ -144,13 +625,20 @@ def lm(
     n_cores=4,
     quiet=False,
     eval_env=4,
+    engine='statsmodels',
+    executor=None,
+    threads_per_worker=None,
+    keep=None,
+    extract=None,
+    results=None,
 ):
     """Run ordinary least squares linear regression on the epochs.
 
     Parameters
     ----------
-    epochs : Epochs
-        epochs object on which regression is to be run
+    epochs : Epochs or iterable of Epochs
+        epochs object on which regression is to be run, or consecutive time
+        windows of the epochs, for instance from ``fitgrid.windows_from_hdf``
     LHS : list of str, optional, defaults to all channels
         list of channels for the left hand side of the regression formula
     RHS : str
@@ -163,21 +651,108 @@ def lm(
         set to True to disable fitting progress bar
     eval_env : int or patsy.EvalEnvironment, defaults to 4
         environment to use for evaluating patsy formulas, see patsy docs
+    engine : {'statsmodels', 'numpy'}, defaults to 'statsmodels'
+        'statsmodels' fits each time and channel with statsmodels OLS,
+        'numpy' fits all of them at once with NumPy when possible, see Notes
+    executor : {'serial', 'process', 'thread'} or Executor, optional
+        how to run the fits, defaults to 'process' if ``parallel`` is True,
+        'serial' otherwise. 'process' and 'thread' start a pool of
+        ``n_cores`` workers for this call, a ``concurrent.futures.Executor``
+        is used as is and left running, see ``run_model``
+    threads_per_worker : int, optional
+        number of BLAS threads of each worker, see ``run_model``, the NumPy
+        engine runs in this process and uses all BLAS threads by default
+    keep : list of str, optional
+        names of the results to keep, see ``run_model``, the NumPy engine
+        keeps these arrays only, grid methods raise FitGridError naming the
+        results they need that were not kept
+    extract : callable, optional
+        ``extract(result)`` returns a dict of the results to keep for a
+        cell, see ``run_model``, fits with statsmodels
+    results : str or pathlib.Path, optional
+        result store directory, required when ``epochs`` are time windows,
+        see Notes
 
     Returns
     -------
-    grid : LMFitGrid
-        LMFitGrid object containing the results of the regression
+    grid : LMFitGrid or ResultStore
+        LMFitGrid object containing the results of the regression, or the
+        result store of the windows
 
+    Notes
+    -----
+    With ``engine='numpy'`` and a design that is the same at every time
+    point, which is the case when all predictors are constant within
+    epochs, the design matrix is factored once and all times and channels
+    are solved together as one matrix right-hand side. Otherwise the design
+    matrices of all time points are stacked and solved with batched NumPy
+    linear algebra, all channels of a time point together. The result is an
+    ``OLSFitGrid`` holding the statsmodels estimates and summary statistics
+    (``params``, ``bse``, ``tvalues``, ``pvalues``, ``rsquared``,
+    ``rsquared_adj``, ``llf``, ``aic``, ``bic``, ``resid``, ...) as arrays,
+    which agree with the statsmodels results up to floating point rounding.
+    Statsmodels results for a single cell, with methods such as
+    ``get_influence``, are built on request with
+    ``grid.cell_results(time, channel)``. Integer ``eval_env`` then refers
+    to the caller of ``lm``.
+    LHS columns that are not channels, missing values and designs whose
+    columns change between time points fall back to statsmodels.
+
+    Time windows are fit one at a time as they are read, the grid of each
+    window is written to the ``results`` store before the next window is
+    read, so memory use is bounded by the window rather than the recording.
+    A pool started for the fit serves all windows. Fit with ``keep`` to
+    store only the results needed.
     """
 
+    if not isinstance(epochs, Epochs):
+        if engine == 'numpy' and isinstance(eval_env, int):
+            eval_env = patsy.EvalEnvironment.capture(1)
+        return _fit_windows(
+            lm,
+            epochs,
+            results,
+            executor,
+            parallel,
+            n_cores,
+            LHS=LHS,
+            RHS=RHS,
+            quiet=quiet,
+            eval_env=eval_env,
+            engine=engine,
+            threads_per_worker=threads_per_worker,
+            keep=keep,
+            extract=extract,
+        )
+
     if LHS is None:
         LHS = epochs.channels
 
     validate_LHS(epochs, LHS)
     validate_RHS(RHS)
 
-    function = partial(lm_single, RHS=RHS, eval_env=eval_env)
+    if engine not in ('statsmodels', 'numpy'):
+        raise FitGridError(
+            f"engine must be 'statsmodels' or 'numpy', got {engine!r}."
+        )
+
+    if engine == 'numpy' and extract is None:
+        if isinstance(eval_env, int):
+            eval_env = patsy.EvalEnvironment.capture(1)
+        with tools.blas_threads(threads_per_worker):
+            grid = _lm_numpy(epochs, LHS, RHS, eval_env)
+        if grid is not None:
+            if keep is not None:
+                keep = [keep] if isinstance(keep, str) else keep
+                missing = [name for name in keep if name not in grid._results]
+                if missing:
+                    raise FitGridError(f'Can not keep results: {missing}.')
+                grid._results = {name: grid._results[name] for name in keep}
+            return grid
+
+    function = _LMSingle(
+        RHS, eval_env, epochs._columns, epochs._epoch_predictors.columns
+    )
 
     _grid = _run_model(
         epochs,
@@ -186,19 +761,38 @@ def lm(
         parallel=parallel,
         n_cores=n_cores,
         quiet=quiet,
+        executor=executor,
+        threads_per_worker=threads_per_worker,
+        keep=keep,
+        extract=extract,
     )
 
     return LMFitGrid(_grid, epochs.epoch_index, epochs.time)
 
 
+def _lme4_iterations(model_obj):
+    """Return the deviance evaluations of an lme4 fit, None if unknown."""
+
+    # pymer4 versions differ in how they expose the lme4 model
+    try:
+        return int(model_obj.slots['optinfo'].rx2('feval')[0])
+    except (AttributeError, LookupError, TypeError, ValueError):
+        return None
+
+
 def lmer_single(
     data, channel, RHS, family, conf_int, factors, permute, ordered, REML
 ):
     import re
     from pymer4 import Lmer
 
+    # fit in double precision when channels are stored as float32
+    if data[channel].dtype != np.float64:
+        data = data.astype({channel: np.float64})
+
     model = Lmer(channel + ' ~ ' + RHS, data=data, family=family)
 
+    started = perf_counter()
     with redirect_stdout(StringIO()) as captured_stdout:
         model.fit(
             summarize=False,
@@ -208,6 +802,8 @@ def lmer_single(
             ordered=ordered,
             REML=REML,
         )
+    model.fit_time = perf_counter() - started
+    model.n_iterations = _lme4_iterations(model.model_obj)
 
     # lmer prints warnings, capture them
     warning = captured_stdout.getvalue()
@@ -231,6 +827,400 @@ def lmer_single(
     return model
 
 
+# R function fitting lmer to the channels of a snapshot in one call. With
+# refit the model is built on the first channel, or passed in from an
+# earlier snapshot, and refit to the other responses, responses with
+# missing values and models whose rows do not match get a fresh fit. The
+# Satterthwaite DF and P-values of refits are computed by lmerTest from a
+# call on the channel and data of the snapshot. Fresh
+# fits start from the theta of the channel in thetas, when there is one.
+_LMER_CHANNELS = """
+function(data, channels, rhs, REML, refit, model, thetas) {
+    messages <- character(0)
+    catch <- function(expr) withCallingHandlers(
+        expr,
+        warning = function(w) {
+            messages <<- c(messages, conditionMessage(w))
+            invokeRestart('muffleWarning')
+        }
+    )
+    fit_channel <- function(channel) {
+        messages <<- character(0)
+        response <- data[[channel]]
+        started <- proc.time()[['elapsed']]
+        if (refit && !is.null(model) && !anyNA(response)
+            && lme4::nobs(model) == length(response)) {
+            fit <- catch(lme4::refit(model, newresp = response))
+            # lmerTest rebuilds the deviance function by evaluating the call
+            # of the model, which must fit this response, not the one of
+            # the channel the model was built on
+            fit@call <- call(
+                'lmer',
+                formula = stats::as.formula(paste(channel, '~', rhs)),
+                data = quote(data),
+                REML = REML
+            )
+            fit <- catch(lmerTest::as_lmerModLmerTest(fit))
+        } else {
+            formula <- stats::as.formula(paste(channel, '~', rhs))
+            theta <- thetas[[channel]]
+            start <- if (is.null(theta)) NULL else list(theta = theta)
+            fit <- catch(lmerTest::lmer(
+                formula, data = data, REML = REML, start = start
+            ))
+            if (refit && is.null(model)
+                && lme4::nobs(fit) == length(response)) {
+                model <<- fit
+            }
+        }
+        fit_time <- proc.time()[['elapsed']] - started
+        vc <- as.data.frame(lme4::VarCorr(fit))
+        vc <- vc[is.na(vc$var2), ]
+        list(
+            coefs = summary(fit)$coefficients,
+            ci = stats::confint(fit, parm = 'beta_', method = 'Wald'),
+            AIC = stats::AIC(fit),
+            logLike = as.numeric(stats::logLik(fit)),
+            grp = vc$grp,
+            name = ifelse(is.na(vc$var1), '', vc$var1),
+            var = vc$vcov,
+            std = vc$sdcor,
+            fixef = lapply(stats::coef(fit), as.matrix),
+            ranef = lapply(lme4::ranef(fit), as.matrix),
+            residuals = as.numeric(stats::residuals(fit)),
+            fits = as.numeric(stats::fitted(fit)),
+            warnings = c(messages, fit@optinfo$conv$lme4$messages),
+            theta = lme4::getME(fit, 'theta'),
+            fit_time = fit_time,
+            n_iterations = fit@optinfo$feval
+        )
+    }
+    results <- lapply(channels, fit_channel)
+    list(model = model, results = results)
+}
+"""
+
+_COEFS_COLUMNS = ['Estimate', 'SE', 'DF', 'T-stat', 'P-val']
+
+
+def _sig_stars(p_values):
+    # significance codes of pymer4 and R
+    return np.select(
+        [p_values < level for level in (0.001, 0.01, 0.05, 0.1)],
+        ['***', '**', '*', '.'],
+        default='',
+    )
+
+
+def _r_vector(vector):
+    return np.array(list(vector), dtype=np.float64)
+
+
+def _r_frame(matrix, columns=None):
+    """Convert an R matrix with row names to a DataFrame."""
+
+    values = _r_vector(matrix).reshape((matrix.nrow, matrix.ncol), order='F')
+    if columns is None:
+        columns = list(matrix.colnames)
+    return pd.DataFrame(values, index=list(matrix.rownames), columns=columns)
+
+
+def _r_frames(matrices):
+    """Convert a list of R matrices, to one DataFrame if only one."""
+
+    frames = [_r_frame(matrix) for matrix in matrices]
+    return frames[0] if len(frames) == 1 else frames
+
+
+class _LmerChannels:
+    """Fit lmer to all channels of a snapshot in one call to R.
+
+    With ``refit`` the lme4 model is built once per snapshot, on the first
+    channel, and refit to the other channels with ``lme4::refit``, which
+    reuses the model frame and random effects design. When the predictors
+    are constant within epochs the design is the same at every time point
+    and the model is built once for the whole grid. With ``warm_start``
+    the fit of each channel starts from its theta at the previous time
+    point fit by this process.
+    """
+
+    def __init__(self, RHS, REML, refit, warm_start, time_invariant):
+        self.RHS = RHS
+        self.REML = REML
+        self.refit = refit
+        self.warm_start = warm_start
+        self.time_invariant = time_invariant
+
+        # R function, model and thetas of the process, rebuilt by workers
+        self._function = None
+        self._model = None
+        self._thetas = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_function'] = None
+        state['_model'] = None
+        state['_thetas'] = {}
+        return state
+
+    def __call__(self, data, channel):
+        return self.fit_channels(data, [channel])[channel]
+
+    def fit_channels(self, data, channels):
+        from rpy2 import robjects
+        from rpy2.robjects import pandas2ri
+        from rpy2.robjects.conversion import localconverter
+
+        if self._function is None:
+            self._function = robjects.r(_LMER_CHANNELS)
+
+        # fit in double precision when channels are stored as float32
+        data = data.astype({channel: np.float64 for channel in channels})
+        with localconverter(robjects.default_converter + pandas2ri.converter):
+            r_data = robjects.conversion.py2rpy(data)
+
+        model = self._model if self.time_invariant else None
+        fitted = self._function(
+            r_data,
+            robjects.StrVector(channels),
+            self.RHS,
+            self.REML,
+            self.refit,
+            robjects.NULL if model is None else model,
+            robjects.ListVector(
+                {
+                    channel: robjects.FloatVector(self._thetas[channel])
+                    for channel in channels
+                    if channel in self._thetas
+                }
+            ),
+        )
+        if self.time_invariant:
+            self._model = fitted.rx2('model')
+
+        results = {
+            channel: self._results(channel, results)
+            for channel, results in zip(channels, fitted.rx2('results'))
+        }
+        if self.warm_start:
+            self._thetas.update(
+                (channel, result.theta) for channel, result in results.items()
+            )
+        return results
+
+    def _results(self, channel, results):
+        coefs = _r_frame(results.rx2('coefs'), columns=_COEFS_COLUMNS)
+        ci = _r_frame(results.rx2('ci')).to_numpy()
+        coefs.insert(1, '2.5_ci', ci[:, 0])
+        coefs.insert(2, '97.5_ci', ci[:, 1])
+        coefs['Sig'] = _sig_stars(coefs['P-val'])
+
+        ranef_var = pd.DataFrame(
+            {
+                'Name': list(results.rx2('name')),
+                'Var': _r_vector(results.rx2('var')),
+                'Std': _r_vector(results.rx2('std')),
+            },
+            index=list(results.rx2('grp')),
+        )
+
+        warnings = list(results.rx2('warnings'))
+        return CellResults(
+            formula=channel + ' ~ ' + self.RHS,
+            family='gaussian',
+            _REML=self.REML,
+            coefs=coefs,
+            fixef=_r_frames(results.rx2('fixef')),
+            ranef=_r_frames(results.rx2('ranef')),
+            ranef_var=ranef_var,
+            AIC=results.rx2('AIC')[0],
+            logLike=results.rx2('logLike')[0],
+            residuals=_r_vector(results.rx2('residuals')),
+            fits=_r_vector(results.rx2('fits')),
+            warnings=warnings,
+            has_warning=len(warnings) > 0,
+            theta=_r_vector(results.rx2('theta')),
+            fit_time=results.rx2('fit_time')[0],
+            n_iterations=int(results.rx2('n_iterations')[0]),
+        )
+
+
+def _compact_lmer(result, residuals=False):
+    """Return the arrays of an lmer cell kept in a compact grid."""
+
+    coefs = result.coefs.drop(columns='Sig', errors='ignore')
+    ranef_var = result.ranef_var
+    resid = np.asarray(result.residuals, dtype=np.float64).ravel()
+    compact = {
+        'coefs': coefs.to_numpy(dtype=np.float64),
+        'ranef_var': ranef_var[['Var', 'Std']].to_numpy(dtype=np.float64),
+        'AIC': float(result.AIC),
+        'logLike': float(result.logLike),
+        'SSresid': float(np.sum(np.square(resid))),
+        'has_warning': bool(result.has_warning),
+        'warnings': tuple(result.warnings),
+        'fit_time': float(result.fit_time),
+        'n_iterations': (
+            np.nan if result.n_iterations is None else result.n_iterations
+        ),
+        # labels, the same in all cells
+        'param_names': list(coefs.index),
+        'coef_names': list(coefs.columns),
+        'ranef_names': list(zip(ranef_var.index, ranef_var['Name'])),
+    }
+    if residuals:
+        compact['residuals'] = resid
+    return compact
+
+
+_COMPACT_LABELS = ('param_names', 'coef_names', 'ranef_names')
+
+
+def _compact_lmer_grid(_grid, RHS, REML, epoch_index):
+    """Stack the compact cell results of a grid into a compact grid."""
+
+    cells = _grid.to_numpy()
+    first = cells[0, 0]
+    results = {}
+    for name in vars(first):
+        if name in _COMPACT_LABELS:
+            continue
+        if name == 'warnings':
+            values = np.empty(cells.shape, dtype=object)
+            for position, cell in np.ndenumerate(cells):
+                values[position] = cell.warnings
+        else:
+            values = np.stack(
+                [
+                    np.stack([getattr(cell, name) for cell in row], axis=-1)
+                    for row in cells
+                ]
+            )
+        results[name] = values
+
+    return CompactLMERFitGrid(
+        results,
+        first.param_names,
+        first.coef_names,
+        first.ranef_names,
+        RHS,
+        REML,
+        _grid.index,
+        _grid.columns,
+        epoch_index,
+    )
+
+
+def _load_lme4():
+    """Start R and load lme4 in a worker process, before its first fit."""
+
+    from pymer4 import Lmer  # noqa: F401
+    from rpy2.robjects.packages import importr
+
+    importr('lme4')
+    importr('lmerTest')
+
+
+def _worker_ready():
+    return True
+
+
+def lmer_pool(n_cores=4):
+    """Start worker processes with R and lme4 loaded, to serve lmer fits.
+
+    Each worker starts R and loads lme4 once, when the pool is created, or
+    on its first fit on Python 3.6.
+    Pass the pool as ``executor`` to any number of ``fitgrid.lmer`` calls,
+    which then only send the fitting tasks, and shut it down when done.
+
+    Parameters
+    ----------
+    n_cores : int, defaults to 4
+        number of worker processes
+
+    Returns
+    -------
+    pool : concurrent.futures.ProcessPoolExecutor
+        the pool, with all workers ready to fit
+
+    Examples
+    --------
+    ::
+
+        with fitgrid.lmer_pool(8) as pool:
+            grid_a = fitgrid.lmer(epochs, RHS=RHS_a, executor=pool)
+            grid_b = fitgrid.lmer(epochs, RHS=RHS_b, executor=pool)
+    """
+
+    pool = executors.process_pool(n_cores, _load_lme4)
+    # workers start on demand, wait for all of them to load R now rather
+    # than during the first fit
+    for ready in [pool.submit(_worker_ready) for _ in range(n_cores)]:
+        ready.result()
+    return pool
+
+
+def _lmer_function(
+    epochs,
+    RHS,
+    family='gaussian',
+    conf_int='Wald',
+    factors=None,
+    permute=None,
+    ordered=False,
+    REML=True,
+    refit=False,
+    warm_start=False,
+    same_rows=True,
+):
+    """Return the cell function fitting lmer with these options.
+
+    ``same_rows=False`` is for snapshots that are subsets of different
+    rows, the lme4 model of a design constant over time is then not reused
+    across snapshots.
+    """
+
+    if refit and warm_start:
+        raise FitGridError('Pass either refit or warm_start, not both.')
+
+    if refit or warm_start:
+        unsupported = {
+            'family': family != 'gaussian',
+            'conf_int': conf_int != 'Wald',
+            'factors': factors is not None,
+            'permute': bool(permute),
+            'ordered': ordered,
+        }
+        unsupported = [name for name, value in unsupported.items() if value]
+        if unsupported:
+            mode = 'refit' if refit else 'warm_start'
+            raise FitGridError(
+                f'{mode}=True does not support {", ".join(unsupported)}, '
+                f'fit without {mode}.'
+            )
+        names = set(re.findall(r'[A-Za-z_.][\w.]*', RHS))
+        columns = names & set(epochs._columns)
+        time_invariant = columns <= set(epochs._epoch_predictors.columns)
+        return _LmerChannels(
+            RHS,
+            REML,
+            refit=refit,
+            warm_start=warm_start,
+            time_invariant=time_invariant and same_rows,
+        )
+
+    return partial(
+        lmer_single,
+        RHS=RHS,
+        family=family,
+        conf_int=conf_int,
+        factors=factors,
+        permute=permute,
+        ordered=ordered,
+        REML=REML,
+    )
+
+
 def lmer(
     epochs,
     LHS=None,
@@ -244,13 +1234,23 @@ def lmer(
     parallel=False,
     n_cores=4,
     quiet=False,
+    executor=None,
+    threads_per_worker=None,
+    keep=None,
+    extract=None,
+    results=None,
+    refit=False,
+    warm_start=False,
+    compact=False,
+    residuals=False,
 ):
     """Fit lme4 linear mixed model by interfacing with R.
 
     Parameters
     ----------
-    epochs : Epochs
-        epochs object on which lmer is to be run
+    epochs : Epochs or iterable of Epochs
+        epochs object on which lmer is to be run, or consecutive time windows
+        of the epochs, for instance from ``fitgrid.windows_from_hdf``
     LHS : list of str, optional, defaults to all channels
         list of channels for the left hand side of the lmer formula
     RHS : str
@@ -282,28 +1282,141 @@ def lmer(
         number of processes to use for computation
     quiet : bool, defaults to False
         set to True to disable fitting progress bar
+    executor : {'serial', 'process'} or Executor, optional
+        how to run the fits, defaults to 'process' if ``parallel`` is True,
+        'serial' otherwise. 'process' starts a pool of ``n_cores`` worker
+        processes for this call, a ``concurrent.futures.Executor`` is used as
+        is and left running, see ``run_model``. ``fitgrid.lmer_pool`` starts
+        a pool with R loaded that serves many calls. R can not run in
+        several threads, thread pools are not supported
+    threads_per_worker : int, optional
+        number of BLAS threads of each worker, see ``run_model``
+    keep : list of str, optional
+        names of the results to keep, for instance ``['coefs', 'AIC']``,
+        see ``run_model``
+    extract : callable, optional
+        ``extract(result)`` returns a dict of the results to keep for a
+        cell, see ``run_model``
+    results : str or pathlib.Path, optional
+        result store directory, required when ``epochs`` are time windows
+    refit : bool, defaults to False
+        change to True to build one lme4 model per time point and refit it
+        to each channel, see Notes. Gaussian models with Wald confidence
+        intervals and without ``factors``, ``permute`` or ``ordered`` only
+    warm_start : bool, defaults to False
+        change to True to start the fit of each channel from its estimates
+        at the previous time point, see Notes. Same models as ``refit``,
+        pass one or the other
+    compact : bool, defaults to False
+        change to True to keep the results as arrays in a
+        ``CompactLMERFitGrid`` instead of pymer4 ``Lmer`` objects, see Notes
+    residuals : bool, defaults to False
+        with ``compact``, change to True to keep the residuals
 
     Returns
     -------
-    grid : LMERFitGrid
-        LMERFitGrid object containing the results of lmer fitting
+    grid : LMERFitGrid, CompactLMERFitGrid or ResultStore
+        LMERFitGrid object containing the results of lmer fitting, or the
+        result store of the windows
+
+    Notes
+    -----
+    Time windows are fit one at a time as they are read, the grid of each
+    window is written to the ``results`` store before the next window is
+    read, so memory use is bounded by the window rather than the recording.
+    A pool started for the fit serves all windows.
+
+    All channels share the fixed and random effects structure and differ
+    only in the response. With ``refit=True`` the lme4 model is built on
+    the first channel of a time point and refit to the other channels with
+    ``lme4::refit``, which skips parsing the formula and building the model
+    frame and random effects matrices, all channels of a time point in one
+    call to R. When all predictors are constant within epochs the model is
+    built once for the whole grid, or once per chunk of tasks on a pool.
+    Refits start the optimizer from the estimates of the model they refit.
+
+    Variance components change little between adjacent time points. With
+    ``warm_start=True`` the time points of each channel are fit in order
+    and the optimizer starts from the random effects parameters (theta) of
+    the previous time point instead of the lme4 defaults, which takes fewer
+    iterations and converges more often. On a pool the time points are
+    fit in order within each chunk of tasks, the first of a chunk starts
+    from the defaults.
+
+    With ``refit`` or ``warm_start`` the cells are ``CellResults`` holding
+    the pymer4 ``Lmer`` results used by fitgrid. The results agree with
+    separate fits up to the optimizer tolerance. Every cell records its
+    fitting time in seconds and optimizer iterations, the deviance
+    evaluations of lme4, as ``fit_time`` and ``n_iterations``, for instance
+    ``grid.n_iterations.sum()`` counts the iterations of the grid. Without
+    ``refit`` or ``warm_start``, ``n_iterations`` is None if the pymer4
+    version does not expose the lme4 model.
+
+    A grid of pymer4 ``Lmer`` objects holds tables of residuals, fits and
+    random effects of each cell, which add up to gigabytes for long
+    recordings of many channels. With ``compact=True`` workers return only
+    arrays of ``coefs``, ``AIC``, ``logLike``, ``ranef_var``, the sum of
+    squared residuals, warnings, timings and, with ``residuals=True``, the
+    residuals, and the grid stacks them into a ``CompactLMERFitGrid``.
+    ``fitgrid.utils.summary.summarize`` reads compact grids directly.
     """
 
+    if not isinstance(epochs, Epochs):
+        return _fit_windows(
+            lmer,
+            epochs,
+            results,
+            executor,
+            parallel,
+            n_cores,
+            initializer=_load_lme4,
+            LHS=LHS,
+            RHS=RHS,
+            family=family,
+            conf_int=conf_int,
+            factors=factors,
+            permute=permute,
+            ordered=ordered,
+            REML=REML,
+            quiet=quiet,
+            threads_per_worker=threads_per_worker,
+            keep=keep,
+            extract=extract,
+            refit=refit,
+            warm_start=warm_start,
+            compact=compact,
+            residuals=residuals,
+        )
+
     if LHS is None:
         LHS = epochs.channels
 
     validate_LHS(epochs, LHS)
     validate_RHS(RHS)
 
-    function = partial(
-        lmer_single,
-        RHS=RHS,
+    if executor == 'thread' or isinstance(executor, ThreadPoolExecutor):
+        raise FitGridError(
+            'lmer can not run in threads, R is not thread safe.'
+        )
+
+    if compact:
+        if keep is not None or extract is not None:
+            raise FitGridError(
+                'Pass either compact or keep and extract, not both.'
+            )
+        extract = partial(_compact_lmer, residuals=residuals)
+
+    function = _lmer_function(
+        epochs,
+        RHS,
         family=family,
         conf_int=conf_int,
         factors=factors,
         permute=permute,
         ordered=ordered,
         REML=REML,
+        refit=refit,
+        warm_start=warm_start,
     )
     _grid = _run_model(
         epochs,
@@ -312,6 +1425,13 @@ def lmer(
         parallel=parallel,
         n_cores=n_cores,
         quiet=quiet,
+        executor=executor,
+        threads_per_worker=threads_per_worker,
+        keep=keep,
+        extract=extract,
+        initializer=_load_lme4,
     )
 
+    if compact:
+        return _compact_lmer_grid(_grid, RHS, REML, epochs.epoch_index)
     return LMERFitGrid(_grid, epochs.epoch_index, epochs.time)
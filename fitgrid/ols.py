@@ -0,0 +1,165 @@
+import numpy as np
+from scipy import stats
+
+# statsmodels OLS defaults: singular values below RCOND * max are dropped
+# from the pseudo-inverse
+RCOND = 1e-15
+
+# results with a value per parameter and per observation (epoch), the other
+# results have one value per response, except the leverages of the design,
+# one per observation shared by the responses
+PARAM_RESULTS = ('params', 'bse', 'tvalues', 'pvalues')
+EPOCH_RESULTS = ('resid', 'fittedvalues')
+DESIGN_RESULTS = ('hat_diag',)
+
+
+def _pinv_and_rank(exog):
+    """Return stacked pseudo-inverses and ranks as statsmodels computes them.
+
+    Parameters
+    ----------
+    exog : numpy.ndarray
+        batches x observations x regressors stack of design matrices
+
+    Returns
+    -------
+    pinv : numpy.ndarray
+        batches x regressors x observations pseudo-inverses
+    rank : numpy.ndarray
+        rank of each design matrix
+    """
+
+    u, s, vt = np.linalg.svd(exog, full_matrices=False)
+    s_max = s.max(axis=-1, keepdims=True)
+    s_inv = np.where(s > RCOND * s_max, 1 / np.where(s > 0, s, 1), 0)
+    pinv = np.matmul(
+        vt.swapaxes(-1, -2) * s_inv[..., np.newaxis, :], u.swapaxes(-1, -2)
+    )
+
+    tol = s_max * exog.shape[-1] * np.finfo(s.dtype).eps
+    rank = (s > tol).sum(axis=-1)
+    return pinv, rank
+
+
+def _constant_count(exog):
+    """Return 1 for each design with an explicit or implicit constant.
+
+    Follows the statsmodels check: a nonzero column without variation is an
+    explicit constant, otherwise a constant is implicit when adding a column
+    of ones does not increase the rank, for example with full dummy coding.
+    """
+
+    explicit = (
+        (np.ptp(exog, axis=-2) == 0) & (np.max(exog, axis=-2) != 0)
+    ).any(axis=-1)
+    k_constant = explicit.astype(np.intp)
+
+    implicit = np.flatnonzero(~explicit)
+    if len(implicit):
+        designs = exog[implicit]
+        ones = np.ones(designs.shape[:-1] + (1,))
+        augmented = np.concatenate([ones, designs], axis=-1)
+        rank_augmented = np.linalg.matrix_rank(augmented)
+        k_constant[implicit] = rank_augmented == np.linalg.matrix_rank(designs)
+    return k_constant
+
+
+def fit(exog, endog):
+    """Fit ordinary least squares for many responses sharing designs.
+
+    Parameters
+    ----------
+    exog : numpy.ndarray
+        batches x observations x regressors stack of design matrices
+    endog : numpy.ndarray
+        batches x observations x responses stack of responses, the responses
+        in each batch are fit on the design matrix of that batch
+
+    Returns
+    -------
+    results : dict of numpy.ndarray
+        ``params``, ``bse``, ``tvalues`` and ``pvalues`` are batches x
+        regressors x responses, ``resid`` and ``fittedvalues`` are batches
+        x observations x responses, ``hat_diag``, the diagonal of the hat
+        matrix, is batches x observations, the other statistics are batches
+        x responses
+
+    Notes
+    -----
+    The estimates and statistics are computed as in statsmodels OLS with the
+    default pinv method and nonrobust covariance, so they agree with
+    ``statsmodels.formula.api.ols(...).fit()`` up to floating point
+    rounding.
+    """
+
+    exog = np.asarray(exog, dtype=np.float64)
+    endog = np.asarray(endog, dtype=np.float64)
+
+    pinv, rank = _pinv_and_rank(exog)
+    k_constant = _constant_count(exog)
+
+    params = np.matmul(pinv, endog)
+    hat_diag = np.einsum('bnk,bkn->bn', exog, pinv)
+    fittedvalues = np.matmul(exog, params)
+    resid = endog - fittedvalues
+
+    nobs = exog.shape[-2]
+    df_resid = (nobs - rank)[:, np.newaxis]
+    df_model = (rank - k_constant)[:, np.newaxis]
+    k_constant = k_constant[:, np.newaxis]
+
+    ssr = np.einsum('bnm,bnm->bm', resid, resid)
+    centered = endog - endog.mean(axis=-2, keepdims=True)
+    centered_tss = np.einsum('bnm,bnm->bm', centered, centered)
+    uncentered_tss = np.einsum('bnm,bnm->bm', endog, endog)
+    tss = np.where(k_constant == 1, centered_tss, uncentered_tss)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ess = tss - ssr
+        rsquared = 1 - ssr / tss
+        rsquared_adj = 1 - (nobs - k_constant) / df_resid * (1 - rsquared)
+        mse_resid = ssr / df_resid
+        mse_model = ess / df_model
+        fvalue = mse_model / mse_resid
+        f_pvalue = stats.f.sf(fvalue, df_model, df_resid)
+
+        # diagonal of the normalized covariance pinv @ pinv.T
+        cov_diag = np.einsum('bkn,bkn->bk', pinv, pinv)
+        bse = np.sqrt(cov_diag[:, :, np.newaxis] * mse_resid[:, np.newaxis])
+        tvalues = params / bse
+        pvalues = 2 * stats.t.sf(np.abs(tvalues), df_resid[:, np.newaxis])
+
+        llf = -nobs / 2 * (np.log(2 * np.pi) + np.log(ssr / nobs) + 1)
+
+    n_params = df_model + k_constant
+    aic = -2 * llf + 2 * n_params
+    bic = -2 * llf + np.log(nobs) * n_params
+
+    shape = ssr.shape
+    return {
+        'params': params,
+        'bse': bse,
+        'tvalues': tvalues,
+        'pvalues': pvalues,
+        'resid': resid,
+        'fittedvalues': fittedvalues,
+        'hat_diag': hat_diag,
+        'nobs': np.full(shape, float(nobs)),
+        'k_constant': np.broadcast_to(k_constant, shape).copy(),
+        'df_model': np.broadcast_to(df_model, shape).astype(np.float64),
+        'df_resid': np.broadcast_to(df_resid, shape).astype(np.float64),
+        'ssr': ssr,
+        'ess': ess,
+        'centered_tss': centered_tss,
+        'uncentered_tss': uncentered_tss,
+        'mse_model': mse_model,
+        'mse_resid': mse_resid,
+        'rsquared': rsquared,
+        'rsquared_adj': rsquared_adj,
+        'fvalue': fvalue,
+        'f_pvalue': f_pvalue,
+        'llf': llf,
+        'aic': aic,
+        'bic': bic,
+        'scale': mse_resid,
+    }
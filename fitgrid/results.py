@@ -0,0 +1,197 @@
+import json
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .errors import FitGridError
+from .fitgrid import FitGrid, OLSFitGrid, CompactLMERFitGrid
+
+# on-disk result store layout: one pickled grid per time window and the
+# list of windows in metadata.json
+RESULTS_FORMAT = 'fitgrid-results'
+RESULTS_VERSION = 1
+_RESULTS_METADATA = 'metadata.json'
+_WINDOW_FILE = 'window{:05d}.grid'
+
+
+class ResultStore:
+    """Grids fit over consecutive time windows, stored on disk.
+
+    ResultStore is built by ``fitgrid.lm`` and ``fitgrid.lmer`` when they
+    are given time windows, for instance from ``fitgrid.windows_from_hdf``,
+    reopen it with ``fitgrid.load_results``. Each window grid is written as
+    soon as it is fit, a store interrupted during a fit holds the windows
+    done so far.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        store directory
+
+    Notes
+    -----
+    Attribute access broadcasts over the windows as over a grid:
+    ``store.params`` loads the window grids one at a time and concatenates
+    their ``params`` along time, so only the requested results need to fit
+    in memory. ``store[i]`` is the grid of window ``i`` and ``load`` returns
+    the grid of all windows. Fitting with ``keep`` keeps the store small.
+    """
+
+    def __init__(self, path):
+
+        self.path = Path(path)
+        try:
+            with open(self.path / _RESULTS_METADATA) as stream:
+                metadata = json.load(stream)
+        except FileNotFoundError:
+            raise FitGridError(f'{path} is not a fitgrid result store.')
+
+        if metadata.get('format') != RESULTS_FORMAT:
+            raise FitGridError(f'{path} is not a fitgrid result store.')
+        if metadata['version'] > RESULTS_VERSION:
+            raise FitGridError(
+                f'{path} has result store version {metadata["version"]}, '
+                f'this fitgrid reads up to version {RESULTS_VERSION}.'
+            )
+        self._windows = metadata['windows']
+
+    @classmethod
+    def _create(cls, path):
+        """Create an empty store, refusing to overwrite one."""
+
+        path = Path(path)
+        if (path / _RESULTS_METADATA).exists():
+            raise FitGridError(
+                f'{path} already holds results, remove it or choose another '
+                'path.'
+            )
+        path.mkdir(parents=True, exist_ok=True)
+
+        store = cls.__new__(cls)
+        store.path = path
+        store._windows = []
+        store._write_metadata()
+        return store
+
+    def _write_metadata(self):
+        metadata = {
+            'format': RESULTS_FORMAT,
+            'version': RESULTS_VERSION,
+            'windows': self._windows,
+        }
+        # replaced in one step, the store stays readable if interrupted
+        temporary = self.path / (_RESULTS_METADATA + '.tmp')
+        with open(temporary, 'w') as stream:
+            json.dump(metadata, stream, indent=2)
+        os.replace(temporary, self.path / _RESULTS_METADATA)
+
+    def append(self, grid):
+        """Write the grid of the next time window to the store.
+
+        Parameters
+        ----------
+        grid : FitGrid
+            grid of the window
+        """
+
+        name = _WINDOW_FILE.format(len(self._windows))
+        with open(self.path / name, 'wb') as file:
+            pickle.dump(grid, file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._windows.append(name)
+        self._write_metadata()
+
+    def __len__(self):
+        return len(self._windows)
+
+    def __getitem__(self, window):
+        # statsmodels formula results rebuild their design when unpickled,
+        # which needs a calling frame, so grids are loaded in a method
+        with open(self.path / self._windows[window], 'rb') as file:
+            return pickle.load(file)
+
+    def __iter__(self):
+        for window in range(len(self)):
+            yield self[window]
+
+    def __getattr__(self, name):
+        """Concatenate a grid attribute over the windows along time."""
+
+        if name.startswith('_') or not len(self):
+            raise AttributeError(f'No such attribute: {name}.')
+
+        frames = []
+        for grid in self:
+            frame = getattr(grid, name)
+            if not isinstance(frame, (pd.DataFrame, pd.Series)):
+                raise FitGridError(
+                    f'{name} is not a table of results, use the grids of '
+                    f'the windows instead, for instance store[0].{name}.'
+                )
+            frames.append(frame)
+        return pd.concat(frames)
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__} of {len(self)} windows at {self.path}'
+        )
+
+    def load(self):
+        """Return the grid of all windows, which must fit in memory.
+
+        Returns
+        -------
+        grid : FitGrid
+            grid over the time points of all windows
+        """
+
+        grids = list(self)
+        if not grids:
+            raise FitGridError(f'{self.path} holds no results.')
+        first = grids[0]
+
+        if isinstance(first, (OLSFitGrid, CompactLMERFitGrid)):
+            # results constant over the times of a window have a single row
+            results = {
+                name: np.concatenate(
+                    [
+                        np.broadcast_to(
+                            grid._results[name],
+                            (len(grid.time_index),)
+                            + grid._results[name].shape[1:],
+                        )
+                        for grid in grids
+                    ]
+                )
+                for name in first._results
+            }
+            time_index = first.time_index.append(
+                [grid.time_index for grid in grids[1:]]
+            )
+            return first._replace(results, time_index, first.channels)
+
+        if isinstance(first, FitGrid):
+            _grid = pd.concat([grid._grid for grid in grids])
+            return first.__class__(_grid, first.epoch_index, first.time)
+
+        raise FitGridError(f'Can not load results of type {type(first)}.')
+
+
+def load_results(path):
+    """Open an on-disk result store of a fit over time windows.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        store directory, as passed to ``results`` of ``fitgrid.lm`` or
+        ``fitgrid.lmer``
+
+    Returns
+    -------
+    store : ResultStore
+        the grids of the windows
+    """
+
+    return ResultStore(path)
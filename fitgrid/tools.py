@@ -1,4 +1,5 @@
 import numpy as np
+import pandas as pd
 from collections import defaultdict, OrderedDict
 import subprocess
 import re
@@ -7,9 +8,18 @@ import sys
 import os
 import glob
 import warnings
+from functools import lru_cache
 
 MKL = 'mkl'
-BLAS = 'blas'  # matches libopenblas, libcblas
+OPENBLAS = 'blas'  # matches libopenblas, libcblas
+
+# thread control functions of each kind of BLAS, OpenBLAS builds with 64-bit
+# integers, as in NumPy wheels, add a suffix to the names
+_BLAS_SYMBOLS = {
+    MKL: ('MKL_Get_Max_Threads', 'MKL_Set_Num_Threads'),
+    OPENBLAS: ('openblas_get_num_threads', 'openblas_set_num_threads'),
+}
+_BLAS_SUFFIXES = ('', '64_')
 
 
 def get_index_duplicates_table(df, level):
@@ -48,33 +58,133 @@ def deduplicate_list(lst):
     return list(OrderedDict.fromkeys(lst))
 
 
+def columns_view(df, columns):
+    """Return a rows x columns view on df columns or None if not possible.
+
+    Pandas copies when selecting several columns from a DataFrame. When the
+    columns are views on one evenly spaced buffer, as is the case for a
+    DataFrame built from a 2-D array, the buffer is viewed directly instead.
+    """
+
+    arrays = [df[column].to_numpy() for column in columns]
+    first = arrays[0]
+    if first.dtype == object or first.base is None:
+        return None
+
+    address = first.__array_interface__['data'][0]
+    step = (
+        arrays[1].__array_interface__['data'][0] - address
+        if len(arrays) > 1
+        else first.itemsize
+    )
+    for i, array in enumerate(arrays):
+        if not (
+            array.base is first.base
+            and array.dtype == first.dtype
+            and array.strides == first.strides
+            and array.__array_interface__['data'][0] == address + i * step
+        ):
+            return None
+
+    view = np.lib.stride_tricks.as_strided(
+        first,
+        shape=(len(first), len(arrays)),
+        strides=(first.strides[0], step),
+        writeable=False,
+    )
+    return view
+
+
 class BLAS:
-    def __init__(self, cdll, kind):
+    def __init__(self, cdll, kind, path=None):
 
-        if kind not in (MKL, BLAS):
+        if kind not in (MKL, OPENBLAS):
             raise ValueError(
-                f'kind must be {MKL} or {BLAS}, got {kind} instead.'
+                f'kind must be {MKL} or {OPENBLAS}, got {kind} instead.'
             )
 
         self.kind = kind
         self.cdll = cdll
-
-        if kind == MKL:
-            self.get_n_threads = cdll.MKL_Get_Max_Threads
-            self.set_n_threads = cdll.MKL_Set_Num_Threads
+        self.path = path
+
+        get_name, set_name = _BLAS_SYMBOLS[kind]
+        for suffix in _BLAS_SUFFIXES:
+            if hasattr(cdll, get_name + suffix):
+                self.get_n_threads = getattr(cdll, get_name + suffix)
+                self.set_n_threads = getattr(cdll, set_name + suffix)
+                break
         else:
-            self.get_n_threads = cdll.openblas_get_num_threads
-            self.set_n_threads = cdll.openblas_set_num_threads
+            raise ValueError(f'{cdll} has no {kind} thread control.')
 
     def __repr__(self):
         if self.kind == MKL:
             kind = 'MKL'
-        if self.kind == BLAS:
+        if self.kind == OPENBLAS:
             kind = 'OpenBLAS'
         n_threads = self.get_n_threads()
         return f'{kind} @ {n_threads} threads'
 
 
+def _loaded_libraries():
+    """Return the paths of the shared libraries loaded in this process."""
+
+    if sys.platform.startswith('linux'):
+        paths = set()
+        with open('/proc/self/maps') as maps:
+            for line in maps:
+                fields = line.split(maxsplit=5)
+                if len(fields) == 6 and fields[5].startswith('/'):
+                    paths.add(fields[5].rstrip('\n'))
+        return sorted(paths)
+
+    if sys.platform == 'darwin':
+        libc = ctypes.CDLL('/usr/lib/libSystem.B.dylib')
+        libc._dyld_get_image_name.restype = ctypes.c_char_p
+        return [
+            libc._dyld_get_image_name(i).decode()
+            for i in range(libc._dyld_image_count())
+        ]
+
+    return []
+
+
+@lru_cache(maxsize=None)
+def blas_libraries():
+    """Return BLAS objects for the MKL and OpenBLAS libraries in use.
+
+    The libraries are looked up once per process among the shared libraries
+    already loaded, NumPy and SciPy may each load their own.
+
+    Returns
+    -------
+    libraries : tuple of BLAS
+        the loaded MKL and OpenBLAS libraries, empty if there are none or
+        the platform is not supported
+    """
+
+    libraries = []
+    seen = set()  # symbols are also found through dependent libraries
+    for path in _loaded_libraries():
+        name = os.path.basename(path).lower()
+        if not name.startswith('lib') or not (MKL in name or OPENBLAS in name):
+            continue
+        try:
+            cdll = ctypes.CDLL(path)
+        except OSError:
+            continue
+        for kind in (MKL, OPENBLAS):
+            try:
+                blas = BLAS(cdll, kind, path)
+            except ValueError:
+                continue
+            address = ctypes.cast(blas.set_n_threads, ctypes.c_void_p).value
+            if address not in seen:
+                seen.add(address)
+                libraries.append(blas)
+            break
+    return tuple(libraries)
+
+
 def get_blas_osys(numpy_module, osys):
 
     NUMPY_PATH = os.path.join(numpy_module.__path__[0], 'core')
@@ -108,26 +218,39 @@ def get_blas_osys(numpy_module, osys):
 
     output = ldd_result.stdout
 
-    kinds = [MKL, BLAS]
+    kinds = [MKL, OPENBLAS]
     for kind in kinds:
         match = re.search(PATTERN.format(kind), output, flags=re.MULTILINE)
         if match:
             path = match.groupdict()['path']
             cdll = ctypes.CDLL(path)
-            return BLAS(cdll, kind)
+            return BLAS(cdll, kind, path)
 
     # unknown kind
     return None
 
 
+@lru_cache(maxsize=None)
 def get_blas(numpy_module):
-    """Return BLAS object or None if neither MKL nor OpenBLAS is found."""
+    """Return BLAS object or None if neither MKL nor OpenBLAS is found.
+
+    The library is looked up in process among the loaded libraries, see
+    ``blas_libraries``, preferring the one shipped with NumPy, and the
+    ``ldd`` or ``otool`` output for NumPy is searched only if none is
+    found. The result is cached.
+    """
+
+    libraries = blas_libraries()
+    if libraries:
+        numpy_dir = os.path.dirname(numpy_module.__path__[0])
+        for blas in libraries:
+            if os.path.relpath(blas.path, numpy_dir).startswith('numpy'):
+                return blas
+        return libraries[0]
 
     if sys.platform.startswith('linux'):
-        # return get_blas_linux(numpy_module)
         return get_blas_osys(numpy_module, 'linux')
     elif sys.platform == 'darwin':
-        # return get_blas_mac(numpy_module)
         return get_blas_osys(numpy_module, 'darwin')
 
     warnings.warn(
@@ -135,28 +258,90 @@ def get_blas(numpy_module):
     )
 
 
-class single_threaded:
+def cpu_count():
+    """Return the number of CPUs this process can run on."""
+
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class blas_threads:
+    """Set the number of threads of all loaded BLAS libraries in a context.
+
+    Parameters
+    ----------
+    n_threads : int or None
+        number of threads, None leaves the libraries unchanged
+
+    Notes
+    -----
+    The libraries are found with ``blas_libraries``, entering the context
+    only calls their thread control functions and is cheap enough to be
+    done for each task in worker processes.
+    """
+
+    def __init__(self, n_threads):
+        self.n_threads = n_threads
+        self.libraries = blas_libraries() if n_threads is not None else ()
+
+    def __enter__(self):
+        self.old_n_threads = [blas.get_n_threads() for blas in self.libraries]
+        for blas in self.libraries:
+            blas.set_n_threads(self.n_threads)
+        return self
+
+    def __exit__(self, *args):
+        for blas, old_n_threads in zip(self.libraries, self.old_n_threads):
+            blas.set_n_threads(old_n_threads)
+            if blas.get_n_threads() != old_n_threads:
+                message = (
+                    f'Failed to reset {blas.kind} '
+                    f'to {old_n_threads} threads (previous value).'
+                )
+                raise RuntimeError(message)
+
+
+class single_threaded(blas_threads):
     def __init__(self, numpy_module):
+        super().__init__(1)
         self.blas = get_blas(numpy_module)
+        if self.blas is not None and self.blas not in self.libraries:
+            self.libraries += (self.blas,)
 
     def __enter__(self):
-        if self.blas is not None:
-            self.old_n_threads = self.blas.get_n_threads()
-            self.blas.set_n_threads(1)
-        else:
+        if self.blas is None:
             warnings.warn(
                 'No MKL/OpenBLAS found, assuming NumPy is single-threaded.'
             )
+        return super().__enter__()
 
-    def __exit__(self, *args):
-        if self.blas is not None:
-            self.blas.set_n_threads(self.old_n_threads)
-            if self.blas.get_n_threads() != self.old_n_threads:
-                message = (
-                    f'Failed to reset {self.blas.kind} '
-                    f'to {self.old_n_threads} threads (previous value).'
-                )
-                raise RuntimeError(message)
+
+def is_epoch_constant(values, n_epochs, n_times):
+    """Check that time-major long form values do not change within epochs.
+
+    Parameters
+    ----------
+    values : array-like
+        n_times * n_epochs values, all epochs at the first time point, then
+        all epochs at the second time point, and so on
+    n_epochs, n_times : int
+        number of epochs and time points
+
+    Returns
+    -------
+    result : bool
+        True if every epoch has the same value at all time points
+    """
+
+    values = np.asarray(values).reshape(n_times, n_epochs)
+    first = values[:1]
+    same = values == first
+    if not np.all(same):
+        # missing values are equal to each other for our purposes
+        same = same | (pd.isna(values) & pd.isna(first))
+    return bool(np.all(same))
 
 
 def design_matrix_is_constant(df, columns, time):
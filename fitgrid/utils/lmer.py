@@ -1,9 +1,137 @@
-import functools
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
-import fitgrid
+from tqdm import tqdm
+
+from fitgrid import executors, models, tools
+from fitgrid.errors import FitGridError
+from fitgrid.fitgrid import LMERFitGrid, CellResults
+
+# on-disk progress of get_lmer_dfbetas: the fits done so far in
+# dfbetas.json, the coefficients of each fit in a pickle
+_DFBETAS_PROGRESS = 'dfbetas.json'
+_ALL_LEVELS_FILE = 'all_levels.pkl'
+_LEVEL_FILE = 'level{:05d}.pkl'
+
+
+def _estimates(result):
+    # the leave one out fits need the estimates and standard errors only
+    return CellResults(coefs=result.coefs[['Estimate', 'SE']])
+
+
+def _leave_out(snapshot, level, factor):
+    """Return the snapshot without the rows of level, None keeps them all."""
+
+    if level is None:
+        return snapshot
+    return snapshot[snapshot[factor].to_numpy() != level]
+
+
+def _validate_kwargs(kwargs):
+    """Raise FitGridError naming the keywords the lmer fits do not take."""
+
+    parameters = inspect.signature(models._lmer_function).parameters
+    accepted = set(parameters) - {'epochs', 'same_rows'}
+    unknown = sorted(set(kwargs) - accepted)
+    if unknown:
+        raise FitGridError(
+            f'get_lmer_dfbetas got unexpected keyword arguments {unknown}, '
+            f'the lmer fits take {sorted(accepted)}.'
+        )
+
+
+def _fit_arguments(factor, LHS, kwargs):
+    """Return the arguments of the fits, with defaults, as stored in JSON."""
+
+    arguments = inspect.signature(models._lmer_function).bind(
+        None, same_rows=False, **kwargs
+    )
+    arguments.apply_defaults()
+    arguments = dict(arguments.arguments)
+    del arguments['epochs'], arguments['same_rows']
+    arguments = {'factor': factor, 'LHS': list(LHS), **arguments}
+    # as read back from the progress file
+    return json.loads(json.dumps(arguments, default=str))
+
+
+class _Progress:
+    """Fits of get_lmer_dfbetas done so far, in a directory or in memory."""
+
+    def __init__(self, path, arguments, levels):
+
+        self.path = None if path is None else Path(path)
+        self.done = {}
+        self._metadata = {
+            'arguments': arguments,
+            'levels': [str(level) for level in levels],
+            'done': [],
+        }
+        if self.path is None:
+            return
 
+        try:
+            with open(self.path / _DFBETAS_PROGRESS) as stream:
+                metadata = json.load(stream)
+        except FileNotFoundError:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._write_metadata()
+            return
 
-def get_lmer_dfbetas(epochs, factor, **kwargs):
+        for key in ('arguments', 'levels'):
+            if metadata.get(key) != self._metadata[key]:
+                raise FitGridError(
+                    f'{path} holds DFBETAS fits with {key} '
+                    f'{metadata.get(key)}, not {self._metadata[key]}, '
+                    'remove it or choose another path.'
+                )
+        self._metadata['done'] = metadata['done']
+        for name in metadata['done']:
+            self.done[name] = pd.read_pickle(self.path / self._file(name))
+
+    @staticmethod
+    def _file(name):
+        if name == 'all':
+            return _ALL_LEVELS_FILE
+        return _LEVEL_FILE.format(name)
+
+    def _write_metadata(self):
+        # replaced in one step, the progress stays readable if interrupted
+        temporary = self.path / (_DFBETAS_PROGRESS + '.tmp')
+        with open(temporary, 'w') as stream:
+            json.dump(self._metadata, stream, indent=2)
+        os.replace(temporary, self.path / _DFBETAS_PROGRESS)
+
+    def add(self, name, coefs):
+        """Record the coefficients of a fit, 'all' or a level position."""
+
+        self.done[name] = coefs
+        if self.path is None:
+            return
+        coefs.to_pickle(self.path / self._file(name))
+        self._metadata['done'].append(name)
+        self._write_metadata()
+
+
+def get_lmer_dfbetas(
+    epochs,
+    factor,
+    LHS=None,
+    fit=None,
+    results=None,
+    parallel=False,
+    n_cores=4,
+    executor=None,
+    threads_per_worker=None,
+    quiet=False,
+    **kwargs,
+):
     r"""Fit lmers leaving out factor levels one by one, compute DBETAS.
 
     Parameters
@@ -12,6 +140,24 @@ def get_lmer_dfbetas(epochs, factor, **kwargs):
         Epochs object
     factor : str
         column name of the factor of interest
+    LHS : list of str, optional, defaults to all channels
+        channels to fit
+    fit : LMERFitGrid, optional
+        grid fit with all levels by ``fitgrid.lmer`` with the same
+        arguments, reused instead of fitting it again
+    results : str or pathlib.Path, optional
+        directory where the progress and the coefficients of each fit are
+        written as soon as it is done, see Notes
+    parallel : bool, defaults to False
+        change to True to run in parallel
+    n_cores : int, defaults to 4
+        number of processes to use for computation
+    executor : {'serial', 'process'} or Executor, optional
+        how to run the fits, see ``fitgrid.lmer``, one pool runs all of them
+    threads_per_worker : int, optional
+        number of BLAS threads of each worker, see ``fitgrid.run_model``
+    quiet : bool, defaults to False
+        set to True to disable fitting progress bar
     **kwargs
         keyword arguments to pass on to ``fitgrid.lmer``, like ``RHS``
 
@@ -40,40 +186,117 @@ def get_lmer_dfbetas(epochs, factor, **kwargs):
 
     for parameter :math:`i` and level :math:`j` of ``factor``.
 
+    The fits leaving out each level are not built as new Epochs, the level
+    is masked out of each time point. Their (level, time point, channels)
+    tasks all go to the same pool in small chunks, so that the fits of
+    several levels run together and workers are not idle at the end of
+    each one. Only the estimates and standard errors are returned by the
+    workers.
 
+    With ``results``, the coefficients of each fit are written to the
+    directory when it is done, with the list of fits done and the fit
+    arguments. A call interrupted and run again with the same arguments and
+    ``results`` directory loads the fits done and only runs the others, a
+    directory holding fits with other arguments raises FitGridError.
     """
 
-    # get the factor levels
-    table = epochs.table.reset_index().set_index(
-        [epochs.epoch_id, epochs.time]
-    )
-    levels = table[factor].unique()
-
-    # produce epochs tables with each level left out
-    looo_epochs = (
-        fitgrid.epochs_from_dataframe(
-            table[table[factor] != level],
-            time=epochs.time,
-            epoch_id=epochs.epoch_id,
-            channels=epochs.channels,
+    if LHS is None:
+        LHS = epochs.channels
+    models.validate_LHS(epochs, LHS)
+    models.validate_RHS(kwargs.get('RHS'))
+    _validate_kwargs(kwargs)
+
+    if factor not in epochs._columns:
+        raise FitGridError(f'{factor} is not a column of epochs.')
+    if fit is not None and not isinstance(fit, LMERFitGrid):
+        raise FitGridError(f'fit must be an LMERFitGrid, got {type(fit)}.')
+    if executor == 'thread' or isinstance(executor, ThreadPoolExecutor):
+        raise FitGridError(
+            'lmer can not run in threads, R is not thread safe.'
         )
-        for level in levels
-    )
 
-    # fit lmer on these epochs
-    fitter = functools.partial(fitgrid.lmer, **kwargs)
-    grids = map(fitter, looo_epochs)
-    coefs = (grid.coefs for grid in grids)
+    # get the factor levels, without building the epochs table
+    if factor == epochs.time:
+        levels = epochs.time_index.unique()
+    elif factor in epochs._epoch_predictors:
+        levels = epochs._epoch_predictors[factor].unique()
+    else:
+        levels = epochs._time_predictors[factor].unique()
+
+    function = models._lmer_function(epochs, same_rows=False, **kwargs)
+    progress = _Progress(results, _fit_arguments(factor, LHS, kwargs), levels)
+
+    # None fits all levels
+    pending = [
+        (name, level)
+        for name, level in [('all', None)] + list(enumerate(levels))
+        if name not in progress.done
+        and not (name == 'all' and fit is not None)
+    ]
+
+    n_times = len(epochs.time_index)
+    with ExitStack() as stack:
+        pool = stack.enter_context(
+            executors.get_executor(
+                executor, parallel, n_cores, models._load_lme4
+            )
+        )
+        n_workers = executors.n_workers(pool, n_cores)
+        n_threads = threads_per_worker
+        if isinstance(pool, ProcessPoolExecutor):
+            epochs = stack.enter_context(epochs._shared())
+            if n_threads is None:
+                n_threads = max(1, tools.cpu_count() // n_workers)
+
+        blocks = models._block_tasks(n_times, LHS, n_workers)
+        tasks = [
+            (level, position, block)
+            for _, level in pending
+            for position, block in blocks
+        ]
+        chunksize = max(
+            1, len(tasks) // (n_workers * models._CHUNKS_PER_WORKER)
+        )
+        fitted = pool.map(
+            partial(
+                models.process_block,
+                epochs=epochs,
+                function=function,
+                n_threads=n_threads,
+                project=_estimates,
+                subset=partial(_leave_out, factor=factor),
+            ),
+            tasks,
+            chunksize=chunksize,
+        )
+        fitted = iter(tqdm(fitted, total=len(tasks), disable=quiet))
+
+        # tasks are in order of the fits, each fit is recorded when its
+        # last block is done
+        columns = {channel: i for i, channel in enumerate(LHS)}
+        for name, level in pending:
+            cells = np.empty((n_times, len(LHS)), dtype=object)
+            for position, block in blocks:
+                for channel, result in zip(block, next(fitted)):
+                    cells[position, columns[channel]] = result
+            grid = pd.DataFrame(cells, index=epochs.time_index, columns=LHS)
+            grid.index.name = epochs.time
+            coefs = LMERFitGrid(grid, epochs.epoch_index, epochs.time).coefs
+            progress.add(name, coefs)
 
     # get coefficient estimates and se from leave one out fits
-    looo_coefs = pd.concat(coefs, keys=levels, axis=1)
+    looo_coefs = pd.concat(
+        [progress.done[name] for name in range(len(levels))],
+        keys=levels,
+        axis=1,
+    )
     looo_estimates = looo_coefs.loc[pd.IndexSlice[:, :, 'Estimate'], :]
     looo_se = looo_coefs.loc[pd.IndexSlice[:, :, 'SE'], :]
 
     # get coefficient estimates from regular fit (all levels included)
-    all_levels_coefs = fitgrid.lmer(epochs, **kwargs).coefs
+    all_levels_coefs = fit.coefs if fit is not None else progress.done['all']
     all_levels_estimates = all_levels_coefs.loc[
-        pd.IndexSlice[:, :, 'Estimate'], :
+        pd.IndexSlice[:, :, 'Estimate'], LHS
     ]
 
     # drop outer level of index for convenience
@@ -6,6 +6,8 @@ import pandas as pd
 import matplotlib as mpl
 from matplotlib import pyplot as plt
 import fitgrid
+from fitgrid.errors import FitGridError
+from fitgrid.executors import get_executor
 
 # enforce some common structure for summary dataframes
 # scraped out of different fit objects.
@@ -35,7 +37,14 @@ PER_MODEL_KEY_LABELS = ['AIC', 'SSresid', 'has_warning', 'logLike', 'sigma2']
 
 
 def summarize(
-    epochs_fg, modeler, LHS, RHS, parallel=True, n_cores=4, **kwargs
+    epochs_fg,
+    modeler,
+    LHS,
+    RHS,
+    parallel=True,
+    n_cores=4,
+    executor=None,
+    **kwargs,
 ):
     """Fit the data with one or more model formulas and return summary information.
 
@@ -66,6 +75,10 @@ def summarize(
        number of cores to use. See what works, but golden rule if running
        on a shared machine.
 
+    executor : {'serial', 'process', 'thread'} or Executor, optional
+       how to run the fits, see `fitgrid.run_model`. A pool named here is
+       started once and used for all the model formulas.
+
     **kwargs : key=value arguments passed to the modeler, optional
 
 
@@ -140,21 +153,23 @@ def summarize(
     # promote RHS scalar str to singleton list
     RHS = np.atleast_1d(RHS).tolist()
 
-    # loop through model formulas fitting and scraping summaries
+    # loop through model formulas fitting and scraping summaries, on one
+    # pool of workers
     summaries = []
-    for _rhs in RHS:
-        summaries.append(
-            _scraper(
-                _modeler(
-                    epochs_fg,
-                    LHS=LHS,
-                    RHS=_rhs,
-                    parallel=parallel,
-                    n_cores=n_cores,
-                    **kwargs,
+    with get_executor(executor, parallel, n_cores) as pool:
+        for _rhs in RHS:
+            summaries.append(
+                _scraper(
+                    _modeler(
+                        epochs_fg,
+                        LHS=LHS,
+                        RHS=_rhs,
+                        n_cores=n_cores,
+                        executor=pool,
+                        **kwargs,
+                    )
                 )
             )
-        )
 
     summary_df = pd.concat(summaries)
     _check_summary_df(summary_df, epochs_fg)
@@ -226,8 +241,11 @@ def _lm_get_summaries_df(fg_ols, ci_alpha=0.05):
     _index_names = _update_INDEX_NAMES(fg_ols, INDEX_NAMES)
     _time = _index_names[0]
 
-    # grab and tidy the formula RHS
-    rhs = fg_ols.tester.model.formula.split('~')[1].strip()
+    # grab and tidy the formula RHS, array-backed grids keep it
+    if isinstance(fg_ols, fitgrid.fitgrid.OLSFitGrid):
+        rhs = fg_ols.RHS.strip()
+    else:
+        rhs = fg_ols.tester.model.formula.split('~')[1].strip()
     rhs = re.sub(r"\s+", " ", rhs)
 
     # fitgrid returns them in the last column of the index
@@ -346,6 +364,9 @@ def _lmer_get_summaries_df(fg_lmer):
 
     """
 
+    if isinstance(fg_lmer, fitgrid.fitgrid.CompactLMERFitGrid):
+        return _compact_lmer_get_summaries_df(fg_lmer)
+
     def scrape_sigma2(fg_lmer):
         # sigma2 is extracted from fg_lmer.ranef_var ...
         # residuals should be in the last row of ranef_var at each Time
@@ -433,6 +454,59 @@ def _lmer_get_summaries_df(fg_lmer):
     return summaries_df
 
 
+def _compact_lmer_get_summaries_df(fg_lmer):
+    """read the summary of a fitgrid.CompactLMERFitGrid from its arrays
+
+    Same summary as _lmer_get_summaries_df, the per-model values are
+    broadcast to each beta with numpy instead of appending frames.
+
+    Parameters
+    ----------
+    fg_lmer : fitgrid.CompactLMERFitGrid
+
+    """
+
+    _index_names = _update_INDEX_NAMES(fg_lmer, INDEX_NAMES)
+    results = fg_lmer._results
+
+    rhs = re.sub(r"\s+", "", fg_lmer.RHS)
+
+    # residual variance is the last random effect, as lme4 reports it
+    if fg_lmer.ranef_names[-1][0] != 'Residual':
+        raise FitGridError(
+            'the last random effect of the grid must be Residual, '
+            f'got {fg_lmer.ranef_names[-1]}.'
+        )
+    per_model = {
+        'AIC': results['AIC'],
+        'SSresid': results['SSresid'],
+        'has_warning': results['has_warning'],
+        'logLike': results['logLike'],
+        'sigma2': results['ranef_var'][:, -1, 0],
+    }
+
+    # times x betas x keys x channels
+    coefs = results['coefs']
+    n_times, n_betas, _, n_channels = coefs.shape
+    values = np.empty((n_times, n_betas, len(KEY_LABELS), n_channels))
+    for position, key in enumerate(KEY_LABELS):
+        if key in per_model:
+            values[:, :, position] = per_model[key][:, np.newaxis]
+        else:
+            values[:, :, position] = coefs[:, :, fg_lmer.coef_names.index(key)]
+
+    index = pd.MultiIndex.from_product(
+        [fg_lmer.time_index, [rhs], fg_lmer.param_names, KEY_LABELS],
+        names=_index_names,
+    )
+    summaries_df = pd.DataFrame(
+        values.reshape(-1, n_channels), index=index, columns=fg_lmer.channels
+    ).sort_index()
+
+    _check_summary_df(summaries_df, fg_lmer)
+    return summaries_df
+
+
 def _get_AICs(summary_df):
     """collect AICs, AIC_min deltas, and lmer warnings from summary_df
 
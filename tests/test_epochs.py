@@ -1,3 +1,8 @@
+import pickle
+import shutil
+import tempfile
+import tracemalloc
+from pathlib import Path
 import pytest
 import numpy as np
 import pandas as pd
@@ -129,3 +134,574 @@ def test_smoke_epochs_distances():
 
     epochs = fake_data.generate()
     epochs.distances()
+
+
+def test_epochs_data_array():
+
+    epochs_table, channels = fake_data._generate(
+        n_epochs=10,
+        n_samples=20,
+        n_categories=2,
+        n_channels=4,
+        time=defaults.TIME,
+        epoch_id=defaults.EPOCH_ID,
+    )
+
+    # shuffle rows, the array store must not depend on input order
+    shuffled = epochs_table.sample(frac=1, random_state=0)
+    epochs = Epochs(
+        shuffled,
+        time=defaults.TIME,
+        epoch_id=defaults.EPOCH_ID,
+        channels=channels,
+    )
+
+    assert epochs._data.shape == (20, 20, 4)
+    assert epochs._data.flags['C_CONTIGUOUS']
+    expected = epochs_table[channels].to_numpy().reshape(20, 20, 4)
+    assert np.array_equal(epochs._data, expected)
+
+    # snapshots are read-only views on the array store
+    for position, (time, snapshot) in enumerate(epochs._iter_snapshots()):
+        assert time == epochs.time_index[position]
+        assert snapshot.index.equals(epochs.epoch_index)
+        values = snapshot[channels].to_numpy()
+        assert np.array_equal(values, expected[:, position, :])
+        assert (snapshot[defaults.TIME] == time).all()
+
+    snapshot = epochs._snapshot(3)
+    assert np.shares_memory(snapshot['channel0'].to_numpy(), epochs._data)
+    with pytest.raises(ValueError):
+        snapshot['channel0'].to_numpy()[0] = 0.0
+
+    # long form table is rebuilt from the store
+    table = epochs.table
+    assert table.index.names == [defaults.EPOCH_ID]
+    assert list(table.columns) == [defaults.TIME] + list(epochs_table.columns)
+    pd.testing.assert_frame_equal(
+        table.reset_index().set_index([defaults.EPOCH_ID, defaults.TIME]),
+        epochs_table,
+    )
+
+
+def test_epochs_distances_values():
+
+    epochs = fake_data.generate(n_epochs=5, n_samples=10, n_channels=3)
+
+    values = (
+        epochs.table.reset_index()
+        .set_index([defaults.EPOCH_ID, defaults.TIME])[epochs.channels]
+        .to_numpy()
+        .reshape(10, 10, 3)
+    )
+    diff = values - values.mean(axis=0)
+    expected = np.sqrt(np.square(diff).sum(axis=(1, 2)))
+
+    distances = epochs.distances()
+    assert distances.index.equals(epochs.epoch_index)
+    assert np.allclose(distances, expected / expected.max())
+
+    # results do not depend on the block size
+    assert np.allclose(epochs.distances(block_size=3), distances)
+
+
+def test_epochs_mahalanobis_distances():
+
+    epochs = fake_data.generate(n_epochs=5, n_samples=10, n_channels=3)
+
+    values = epochs._data
+    diff = values - values.mean(axis=0)
+    deviations = diff.reshape(-1, 3)
+    weights = np.linalg.inv(np.cov(deviations, rowvar=False, ddof=1))
+    expected = np.sqrt(np.array([np.trace(d @ weights @ d.T) for d in diff]))
+
+    for block_size in (None, 1, 4):
+        distances = epochs.distances(
+            metric='mahalanobis', block_size=block_size
+        )
+        assert distances.index.equals(epochs.epoch_index)
+        assert np.allclose(distances, expected / expected.max())
+
+    with pytest.raises(FitGridError):
+        epochs.distances(metric='cosine')
+
+
+def test_epochs_describe(monkeypatch):
+
+    epochs = fake_data.generate(n_epochs=7, n_samples=10, n_channels=3)
+    epochs._data[0, 2, 1] = np.nan
+    table = epochs.table
+
+    # small blocks exercise merging of block statistics
+    monkeypatch.setattr(fitgrid.epochs, '_BLOCK_BYTES', 8 * 30 * 3)
+    summary = epochs.describe()
+    grouped = epochs.describe(by='categorical')
+
+    snapshots = table.groupby(defaults.TIME)[epochs.channels]
+    for statistic in ('count', 'mean', 'std', 'sem'):
+        expected = snapshots.agg(statistic)
+        expected.columns.name = None
+        pd.testing.assert_frame_equal(
+            summary[statistic], expected, check_dtype=False
+        )
+
+    snapshots = table.groupby(['categorical', defaults.TIME])[epochs.channels]
+    pd.testing.assert_frame_equal(
+        grouped['mean'], snapshots.mean(), check_names=False
+    )
+    pd.testing.assert_frame_equal(
+        grouped['std'], snapshots.std(), check_names=False
+    )
+
+    # cached and reused
+    assert epochs._moments() is epochs._moments()
+    assert epochs.describe().equals(summary)
+
+    with pytest.raises(FitGridError):
+        epochs.describe(by='continuous')
+
+
+def _legacy_snapshot_check(epochs_table, time, epoch_id):
+    """Pairwise snapshot comparison as done before vectorized checking."""
+
+    table = epochs_table.reset_index().set_index(epoch_id).sort_index()
+    prev_group = None
+    for idx, cur_group in table.groupby(time):
+        if prev_group is not None:
+            if not prev_group.index.equals(cur_group.index):
+                return (
+                    f'Snapshot {idx} differs from '
+                    f'previous snapshot in {epoch_id} index:\n'
+                    f'Current snapshot\'s indices:\n'
+                    f'{cur_group.index}\n'
+                    f'Previous snapshot\'s indices:\n'
+                    f'{prev_group.index}'
+                )
+        prev_group = cur_group
+
+    if not prev_group.index.is_unique:
+        dupes = fitgrid.tools.get_index_duplicates_table(table, epoch_id)
+        return f'Duplicate values in {epoch_id} index not allowed:\n{dupes}'
+
+
+@pytest.mark.parametrize(
+    'corrupt',
+    [
+        lambda df: df.drop(df.index[42]),
+        lambda df: df.drop(df.index[-1]),
+        lambda df: df.drop(df.index[:100]).iloc[:-3],
+        lambda df: pd.concat([df, df.iloc[:100]]),
+        lambda df: pd.concat([df, df.iloc[[7]]]),
+    ],
+)
+def test_snapshot_check_matches_legacy_messages(corrupt):
+
+    epochs_table, channels = fake_data._generate(
+        n_epochs=5,
+        n_samples=100,
+        n_categories=2,
+        n_channels=2,
+        time=defaults.TIME,
+        epoch_id=defaults.EPOCH_ID,
+    )
+    bad_table = corrupt(epochs_table)
+    expected = _legacy_snapshot_check(
+        bad_table, defaults.TIME, defaults.EPOCH_ID
+    )
+    assert expected is not None
+
+    with pytest.raises(FitGridError) as error:
+        Epochs(
+            bad_table,
+            time=defaults.TIME,
+            epoch_id=defaults.EPOCH_ID,
+            channels=channels,
+        )
+    assert str(error.value) == expected
+
+
+def _peak_memory(func):
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def test_epochs_no_copy_peak_memory():
+
+    n_epochs, n_samples, n_channels = 200, 100, 32
+    index = pd.MultiIndex.from_product(
+        [range(n_epochs), range(n_samples)],
+        names=[defaults.EPOCH_ID, defaults.TIME],
+    )
+    channels = [f'channel{i}' for i in range(n_channels)]
+    values = np.random.normal(size=(n_epochs * n_samples, n_channels))
+    epochs_table = pd.DataFrame(values, index=index, columns=channels)
+    epochs_table['categorical'] = np.repeat(np.arange(n_epochs) % 2, n_samples)
+
+    def build(copy):
+        return Epochs(
+            epochs_table,
+            time=defaults.TIME,
+            epoch_id=defaults.EPOCH_ID,
+            channels=channels,
+            copy=copy,
+        )
+
+    copied, copied_peak = _peak_memory(lambda: build(True))
+    shared, shared_peak = _peak_memory(lambda: build(False))
+
+    # no-copy mode views the input and saves the channel data size
+    assert not np.shares_memory(copied._data, values)
+    assert np.shares_memory(shared._data, values)
+    assert copied_peak - shared_peak > 0.9 * values.nbytes
+    assert np.array_equal(copied._data, shared._data)
+    pd.testing.assert_frame_equal(copied.table, shared.table)
+
+    # the view is read-only, the input table is left alone
+    with pytest.raises(ValueError):
+        shared._data[0, 0, 0] = 0.0
+
+    # unsorted input cannot be viewed and is copied
+    unsorted = epochs_table.iloc[::-1]
+    epochs = Epochs(
+        unsorted,
+        time=defaults.TIME,
+        epoch_id=defaults.EPOCH_ID,
+        channels=channels,
+        copy=False,
+    )
+    assert not np.shares_memory(epochs._data, values)
+    assert np.array_equal(epochs._data, copied._data)
+
+
+def test_epoch_constant_predictors_stored_per_epoch():
+
+    epochs_table, channels = fake_data._generate(
+        n_epochs=10,
+        n_samples=50,
+        n_categories=2,
+        n_channels=4,
+        time=defaults.TIME,
+        epoch_id=defaults.EPOCH_ID,
+    )
+    epochs_table['subject'] = np.repeat(np.arange(20) // 4, 50)
+    epochs_table['rt'] = np.repeat(np.linspace(0, 1, 20), 50)
+    epochs_table.loc[epochs_table.index[:50], 'rt'] = np.nan
+
+    epochs = Epochs(
+        epochs_table,
+        time=defaults.TIME,
+        epoch_id=defaults.EPOCH_ID,
+        channels=channels,
+    )
+
+    # continuous varies sample to sample, the others are per epoch
+    assert list(epochs._time_predictors.columns) == ['continuous']
+    assert list(epochs._epoch_predictors.columns) == [
+        'categorical',
+        'subject',
+        'rt',
+    ]
+    assert len(epochs._epoch_predictors) == 20
+    assert epochs._epoch_predictors.index.equals(epochs.epoch_index)
+
+    # snapshots and table are unchanged by the compact storage
+    pd.testing.assert_frame_equal(
+        epochs.table.reset_index().set_index(
+            [defaults.EPOCH_ID, defaults.TIME]
+        ),
+        epochs_table,
+    )
+    table = epochs_table.reset_index().set_index(defaults.EPOCH_ID)
+    for time, snapshot in epochs._iter_snapshots():
+        expected = table[table[defaults.TIME] == time]
+        pd.testing.assert_frame_equal(snapshot[expected.columns], expected)
+
+
+def test_epochs_float32_storage():
+
+    epochs_table, channels = fake_data._generate(
+        n_epochs=10,
+        n_samples=20,
+        n_categories=2,
+        n_channels=4,
+        time=defaults.TIME,
+        epoch_id=defaults.EPOCH_ID,
+    )
+    epochs64 = Epochs(
+        epochs_table,
+        time=defaults.TIME,
+        epoch_id=defaults.EPOCH_ID,
+        channels=channels,
+    )
+    epochs32 = Epochs(
+        epochs_table,
+        time=defaults.TIME,
+        epoch_id=defaults.EPOCH_ID,
+        channels=channels,
+        dtype=np.float32,
+    )
+
+    assert epochs32._data.dtype == np.float32
+    assert epochs32._data.nbytes * 2 == epochs64._data.nbytes
+    assert (epochs32._snapshot(0)[channels].dtypes == np.float32).all()
+    assert np.allclose(epochs32._data, epochs64._data, rtol=1e-6)
+    assert np.allclose(
+        epochs32.distances(), epochs64.distances(), rtol=1e-5, atol=1e-6
+    )
+
+    with pytest.raises(FitGridError):
+        Epochs(
+            epochs_table,
+            time=defaults.TIME,
+            epoch_id=defaults.EPOCH_ID,
+            channels=channels,
+            dtype=np.int32,
+        )
+
+
+def test_epochs_sel():
+
+    epochs = fake_data.generate(n_epochs=10, n_samples=50, n_channels=6)
+    table = epochs.table
+
+    # time windows and evenly spaced channels are views
+    window = epochs.sel(time=slice(10, 19), channels=['channel1', 'channel3'])
+    assert np.shares_memory(window._data, epochs._data)
+    assert window._data.shape == (20, 10, 2)
+    assert list(window.time_index) == list(range(10, 20))
+    assert window.channels == ['channel1', 'channel3']
+    expected = table[table[defaults.TIME].between(10, 19)].drop(
+        columns=['channel0', 'channel2', 'channel4', 'channel5']
+    )
+    pd.testing.assert_frame_equal(window.table, expected)
+
+    # epoch masks and irregular selections copy only the selection
+    mask = epochs._epoch_predictors['categorical'] == 'cat1'
+    subset = epochs.sel(epochs=mask, channels=['channel5', 'channel0'])
+    assert list(subset.epoch_index) == list(epochs.epoch_index[mask])
+    assert subset.channels == ['channel5', 'channel0']
+    pd.testing.assert_frame_equal(
+        subset.table,
+        table[table['categorical'] == 'cat1'].drop(
+            columns=['channel1', 'channel2', 'channel3', 'channel4']
+        )[list(subset._columns)],
+    )
+
+    # selections of selections, and fitting on them
+    nested = window.sel(time=[12, 15, 16], epochs=[3, 4, 5])
+    assert list(nested.time_index) == [12, 15, 16]
+    assert list(nested.epoch_index) == [3, 4, 5]
+    assert np.array_equal(
+        nested._data, epochs._data[3:6][:, [12, 15, 16]][:, :, [1, 3]]
+    )
+    grid = fitgrid.lm(window, RHS='continuous + categorical')
+    assert (
+        grid.params.index.get_level_values(0)
+        .unique()
+        .equals(window.time_index)
+    )
+
+    # single labels select like lists of one
+    single = epochs.sel(time=12, epochs=np.int64(3))
+    assert list(single.time_index) == [12]
+    assert list(single.epoch_index) == [3]
+    pd.testing.assert_frame_equal(
+        single.table, epochs.sel(time=[12], epochs=[3]).table
+    )
+
+
+@pytest.mark.parametrize(
+    'kwargs',
+    [
+        {'channels': ['channel0', 'nope']},
+        {'time': [1000]},
+        {'time': 1000},
+        {'time': slice(1000, 2000)},
+        {'epochs': [1, 1]},
+        {'epochs': np.ones(3, dtype=bool)},
+    ],
+)
+def test_epochs_sel_bad_selectors(kwargs):
+
+    epochs = fake_data.generate(n_epochs=5, n_samples=10, n_channels=2)
+    with pytest.raises(FitGridError):
+        epochs.sel(**kwargs)
+
+
+def _subject_table(subject, n_epochs=5):
+
+    epochs_table, channels = fake_data._generate(
+        n_epochs=n_epochs,
+        n_samples=20,
+        n_categories=2,
+        n_channels=3,
+        time=defaults.TIME,
+        epoch_id=defaults.EPOCH_ID,
+        seed=subject,
+    )
+    epochs_table['subject'] = subject
+    return epochs_table, channels
+
+
+def test_concat_epochs():
+
+    tables, parts = [], []
+    for subject in range(3):
+        epochs_table, channels = _subject_table(subject, n_epochs=subject + 2)
+        if subject == 1:
+            # constant within epochs here, varies in the other subjects
+            epochs_table['continuous'] = 0.5
+        tables.append(epochs_table)
+        parts.append(
+            Epochs(
+                epochs_table,
+                time=defaults.TIME,
+                epoch_id=defaults.EPOCH_ID,
+                channels=channels,
+            )
+        )
+    assert 'continuous' in parts[1]._epoch_predictors
+
+    # each subject numbers epochs from 0, so epoch ids are renumbered
+    epochs = fitgrid.concat_epochs(parts)
+    combined = pd.concat(tables).reset_index()
+    combined[defaults.EPOCH_ID] = np.repeat(np.arange(len(combined) // 20), 20)
+    combined = combined.set_index([defaults.EPOCH_ID, defaults.TIME])
+    expected = Epochs(
+        combined,
+        time=defaults.TIME,
+        epoch_id=defaults.EPOCH_ID,
+        channels=channels,
+    )
+
+    assert np.array_equal(epochs._data, expected._data)
+    assert epochs.epoch_index.equals(expected.epoch_index)
+    assert epochs.time_index.equals(expected.time_index)
+    pd.testing.assert_frame_equal(
+        epochs._epoch_predictors, expected._epoch_predictors
+    )
+    pd.testing.assert_frame_equal(
+        epochs._time_predictors, expected._time_predictors
+    )
+    pd.testing.assert_frame_equal(epochs.table, expected.table)
+    for position in range(len(epochs.time_index)):
+        pd.testing.assert_frame_equal(
+            epochs._snapshot(position), expected._snapshot(position)
+        )
+
+    # unique epoch ids are kept
+    shifted = parts[1].sel()
+    shifted.epoch_index = shifted.epoch_index + 100
+    shifted._epoch_predictors.index = shifted.epoch_index
+    kept = fitgrid.concat_epochs([parts[0], shifted], dtype=np.float32)
+    assert list(kept.epoch_index) == list(range(4)) + list(range(100, 106))
+    assert kept._data.dtype == np.float32
+
+
+def test_concat_epochs_incompatible():
+
+    table0, channels = _subject_table(0)
+    table1, _ = _subject_table(1)
+    epochs0, epochs1 = (
+        Epochs(
+            table,
+            time=defaults.TIME,
+            epoch_id=defaults.EPOCH_ID,
+            channels=channels,
+        )
+        for table in (table0, table1)
+    )
+
+    with pytest.raises(FitGridError, match='repeated'):
+        fitgrid.concat_epochs([epochs0, epochs1], renumber=False)
+    with pytest.raises(FitGridError, match='channels'):
+        fitgrid.concat_epochs([epochs0, epochs1.sel(channels=channels[:2])])
+    with pytest.raises(FitGridError, match='time index'):
+        fitgrid.concat_epochs([epochs0, epochs1.sel(time=slice(0, 10))])
+    with pytest.raises(FitGridError):
+        fitgrid.concat_epochs([])
+
+
+def test_epochs_shared_for_workers(tmp_path):
+
+    epochs = fitgrid.generate(n_samples=10, n_channels=4)
+
+    with epochs._shared() as shared:
+        assert isinstance(shared._data, np.memmap)
+        assert np.array_equal(shared._data, epochs._data)
+        # pickles the location of the channel data, not the data
+        pickled = pickle.dumps(shared)
+        assert (
+            len(pickled) < len(pickle.dumps(epochs)) - epochs._data.nbytes // 2
+        )
+        unpickled = pickle.loads(pickled)
+        assert isinstance(unpickled._data, np.memmap)
+        pd.testing.assert_frame_equal(
+            unpickled._snapshot(3), epochs._snapshot(3)
+        )
+        path = Path(shared._store)
+        assert path.exists()
+        del unpickled
+
+    assert not path.exists()
+    assert epochs._store is None
+
+    # store-backed epochs share the stored channel data
+    epochs.to_store(tmp_path / 'store')
+    stored = fitgrid.epochs_from_store(tmp_path / 'store')
+    with stored._shared() as shared:
+        assert shared._store == stored._store
+        assert Path(shared._shared_path) != Path(stored._store)
+        unpickled = pickle.loads(pickle.dumps(shared))
+        assert isinstance(unpickled._data, np.memmap)
+        pd.testing.assert_frame_equal(
+            unpickled._snapshot(3), stored._snapshot(3)
+        )
+
+
+def test_epochs_shared_sends_location_only():
+
+    # the predictors are loaded by workers from the shared directory, not
+    # sent with each chunk of tasks
+    epochs = fitgrid.generate(n_samples=200, n_channels=4)
+    epochs._time_predictors['noise'] = np.arange(
+        len(epochs._time_predictors), dtype=float
+    )
+    epochs._columns = epochs._columns + ['noise']
+
+    with epochs._shared() as shared:
+        pickled = pickle.dumps(shared)
+        assert len(pickled) < 1000
+        unpickled = pickle.loads(pickled)
+        pd.testing.assert_frame_equal(
+            unpickled._snapshot(7), epochs._snapshot(7)
+        )
+
+
+def test_epochs_shared_falls_back_to_temporary_directory(monkeypatch):
+
+    epochs = fitgrid.generate(n_samples=10, n_channels=4)
+
+    # too small a /dev/shm, as in docker containers
+    usage = shutil.disk_usage(tempfile.gettempdir())
+    monkeypatch.setattr(
+        fitgrid.epochs.shutil,
+        'disk_usage',
+        lambda path: usage._replace(free=epochs._data.nbytes),
+    )
+    with epochs._shared() as shared:
+        path = Path(shared._store)
+        assert path.parent == Path(tempfile.gettempdir())
+        assert np.array_equal(shared._data, epochs._data)
+
+    # or none at all
+    monkeypatch.undo()
+    monkeypatch.setattr(fitgrid.epochs, '_SHARED_DIR', '/no/such/dir')
+    with epochs._shared() as shared:
+        path = Path(shared._store)
+        assert path.parent == Path(tempfile.gettempdir())
@@ -0,0 +1,96 @@
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from .context import fitgrid
+from fitgrid import executors
+from fitgrid.errors import FitGridError
+
+
+def _square(x):
+    return x * x
+
+
+def test_serial_executor():
+
+    executor = executors.SerialExecutor()
+    assert executor.submit(_square, 3).result() == 9
+    assert list(executor.map(_square, range(4), chunksize=2)) == [0, 1, 4, 9]
+
+    future = executor.submit(_square, None)
+    with pytest.raises(TypeError):
+        future.result()
+
+
+@pytest.mark.parametrize(
+    'executor, parallel, expected',
+    [
+        (None, False, executors.SerialExecutor),
+        (None, True, ProcessPoolExecutor),
+        ('serial', True, executors.SerialExecutor),
+        ('process', False, ProcessPoolExecutor),
+        ('thread', False, ThreadPoolExecutor),
+    ],
+)
+def test_get_executor_by_name(executor, parallel, expected):
+
+    with executors.get_executor(executor, parallel, n_cores=2) as pool:
+        assert isinstance(pool, expected)
+        assert executors.n_workers(pool) == (
+            1 if expected is executors.SerialExecutor else 2
+        )
+        assert list(pool.map(_square, range(3))) == [0, 1, 4]
+
+
+def test_get_executor_leaves_user_executor_running():
+
+    with ThreadPoolExecutor(2) as user_executor:
+        with executors.get_executor(user_executor) as pool:
+            assert pool is user_executor
+        # still accepts work after the fit
+        assert user_executor.submit(_square, 2).result() == 4
+
+
+def test_get_executor_bad_executor():
+
+    with pytest.raises(FitGridError, match='executor must be one of'):
+        with executors.get_executor('dask'):
+            pass
+
+
+_initialized = False
+
+
+def _initialize():
+    global _initialized
+    _initialized = True
+
+
+def _is_initialized(_):
+    return _initialized
+
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 7), reason='pools take an initializer from 3.7'
+)
+def test_get_executor_initializer():
+
+    with executors.get_executor(
+        'process', n_cores=2, initializer=_initialize
+    ) as pool:
+        assert all(pool.map(_is_initialized, range(4)))
+    assert not _initialized
+
+
+def test_process_pool_without_initializer(monkeypatch):
+
+    # Python 3.6 pools have no initializer keyword
+    def pool_without_initializer(n_workers):
+        return ProcessPoolExecutor(n_workers)
+
+    monkeypatch.setattr(
+        executors, 'ProcessPoolExecutor', pool_without_initializer
+    )
+    with executors.get_executor('process', n_cores=2) as pool:
+        assert list(pool.map(_square, range(3))) == [0, 1, 4]
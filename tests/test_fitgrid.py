@@ -3,9 +3,17 @@ import numpy as np
 import pandas as pd
 import uuid
 import os
+import pickle
 from .context import fitgrid
 from fitgrid.errors import FitGridError
-from fitgrid.fitgrid import FitGrid, LMFitGrid, LMERFitGrid
+from fitgrid.fitgrid import (
+    FitGrid,
+    LMFitGrid,
+    LMERFitGrid,
+    OLSFitGrid,
+    CompactLMERFitGrid,
+    CellResults,
+)
 from fitgrid import tools, defaults, DATA_DIR
 
 
@@ -265,6 +273,56 @@ def test__save_load_grid_lmer():
     os.remove(TEST_FILENAME)
 
 
+def test__save_load_grid_lmer_refit_and_kept(tmp_path):
+
+    epochs = fitgrid.generate(n_samples=2, n_channels=2)
+    RHS = 'continuous + (continuous | categorical)'
+    for name, kwargs in [
+        ('refit', {'refit': True}),
+        ('kept', {'keep': 'coefs'}),
+    ]:
+        grid = fitgrid.lmer(epochs, RHS=RHS, quiet=True, **kwargs)
+        grid.save(tmp_path / name)
+        loaded_grid = fitgrid.load_grid(tmp_path / name)
+        assert type(loaded_grid) is LMERFitGrid
+        assert grid.coefs.equals(loaded_grid.coefs)
+
+
+def test__save_load_grid_kept_and_lmer_results(tmp_path):
+
+    # grids of kept results keep their class
+    epochs = fitgrid.generate(n_samples=2, n_channels=2)
+    grid = fitgrid.lm(epochs, RHS='continuous', keep=['params'], quiet=True)
+    grid.save(tmp_path / 'kept')
+    loaded_grid = fitgrid.load_grid(tmp_path / 'kept')
+    assert type(loaded_grid) is LMFitGrid
+    pd.testing.assert_frame_equal(loaded_grid.params, grid.params)
+
+    # so do lmer grids of CellResults, as fit with refit or warm_start
+    rng = np.random.default_rng(0)
+    cells = pd.DataFrame(
+        [
+            [
+                _lmer_results(rng, channel, len(epochs.epoch_index))
+                for channel in epochs.channels
+            ]
+            for time in epochs.time_index
+        ],
+        index=epochs.time_index,
+        columns=epochs.channels,
+    )
+    grid = LMERFitGrid(cells, epochs.epoch_index, epochs.time)
+    grid.save(tmp_path / 'lmer')
+    loaded_grid = fitgrid.load_grid(tmp_path / 'lmer')
+    assert type(loaded_grid) is LMERFitGrid
+    pd.testing.assert_frame_equal(loaded_grid.coefs, grid.coefs)
+
+    # lmer grids saved without their class are told from the cells
+    with open(tmp_path / 'legacy', 'wb') as file:
+        pickle.dump((cells, epochs.epoch_index, epochs.time), file)
+    assert type(fitgrid.load_grid(tmp_path / 'legacy')) is LMERFitGrid
+
+
 def test__correct_repr():
 
     epochs = fitgrid.generate(n_samples=2, n_channels=1)
@@ -301,3 +359,189 @@ def test_compare_different_fixed_effects_with_REML():
     grid2 = fitgrid.lmer(epochs, RHS='(1|categorical)', REML=True)
     with pytest.raises(FitGridError) as error:
         grid1 | grid2
+
+
+def test_ols_fit_grid():
+
+    epochs = fitgrid.generate(n_samples=20, n_channels=3)
+    RHS = 'categorical + continuous'
+    grid = fitgrid.lm(epochs, RHS=RHS, engine='numpy')
+    statsmodels_grid = fitgrid.lm(epochs, RHS=RHS, quiet=True)
+
+    assert isinstance(grid, OLSFitGrid) and isinstance(grid, LMFitGrid)
+    assert 'OLSFitGrid' in repr(grid)
+    for attr in dir(grid):
+        assert hasattr(grid, attr)
+    with pytest.raises(AttributeError):
+        grid.get_influence
+
+    # slicing as FitGrid
+    subgrid = grid[5:10, ['channel2', 'channel0']]
+    assert subgrid.channels == ['channel2', 'channel0']
+    assert list(subgrid.time_index) == list(range(5, 11))
+    pd.testing.assert_frame_equal(
+        subgrid.params,
+        grid.params.loc[5:10, ['channel2', 'channel0']],
+    )
+    pd.testing.assert_frame_equal(
+        subgrid.rsquared, grid.rsquared.loc[5:10, ['channel2', 'channel0']]
+    )
+    with pytest.raises(FitGridError):
+        grid[5]
+
+    # statsmodels results on request
+    cell = subgrid.cell_results(7, 'channel2')
+    expected = statsmodels_grid._grid.loc[7, 'channel2']
+    assert np.allclose(cell.params, expected.params)
+    assert np.allclose(
+        cell.get_influence().cooks_distance[0],
+        expected.get_influence().cooks_distance[0],
+    )
+    with pytest.raises(FitGridError):
+        grid.cell_results(100, 'channel0')
+
+    # array storage, leverages included, pickles smaller than per-cell
+    # statsmodels results
+    assert len(pickle.dumps(grid)) * 4 < len(pickle.dumps(statsmodels_grid))
+
+    TEST_FILENAME = DATA_DIR / str(uuid.uuid4())
+    grid.save(TEST_FILENAME)
+    loaded_grid = fitgrid.load_grid(TEST_FILENAME)
+    os.remove(TEST_FILENAME)
+
+    assert isinstance(loaded_grid, OLSFitGrid)
+    pd.testing.assert_frame_equal(loaded_grid.resid, grid.resid)
+    with pytest.raises(FitGridError):
+        loaded_grid.cell_results(7, 'channel2')
+
+    grid.plot_betas()
+    grid.plot_adj_rsquared()
+
+
+def test_ols_fit_grid_influential_epochs():
+
+    epochs = fitgrid.generate(n_samples=5, n_channels=3)
+    RHS = 'categorical + continuous'
+    grid = fitgrid.lm(epochs, RHS=RHS, engine='numpy')
+    statsmodels_grid = fitgrid.lm(epochs, RHS=RHS, quiet=True)
+
+    expected = statsmodels_grid.influential_epochs(top=5)
+    actual = grid.influential_epochs(top=5)
+    assert actual.index.equals(expected.index)
+    assert np.allclose(actual, expected)
+
+    # the leverages are dropped unless kept
+    kept = fitgrid.lm(epochs, RHS=RHS, engine='numpy', keep=['resid'])
+    with pytest.raises(FitGridError, match='hat_diag'):
+        kept.influential_epochs()
+
+
+def _lmer_results(rng, channel, n_epochs):
+    """Synthetic cell results with the pymer4 Lmer attributes."""
+
+    coefs = pd.DataFrame(
+        rng.normal(size=(2, 6)),
+        index=['(Intercept)', 'continuous'],
+        columns=['Estimate', '2.5_ci', '97.5_ci', 'SE', 'DF', 'T-stat'],
+    )
+    coefs['P-val'] = rng.uniform(size=2)
+    coefs['Sig'] = ''
+    ranef_var = pd.DataFrame(
+        {'Name': ['(Intercept)', ''], 'Var': rng.uniform(size=2)},
+        index=['categorical', 'Residual'],
+    )
+    ranef_var['Std'] = np.sqrt(ranef_var['Var'])
+    warnings = ['boundary (singular) fit'] if rng.uniform() < 0.5 else []
+    return CellResults(
+        formula=f'{channel} ~ continuous + (1 | categorical)',
+        _REML=True,
+        coefs=coefs,
+        ranef_var=ranef_var,
+        AIC=rng.normal(),
+        logLike=rng.normal(),
+        residuals=rng.normal(size=n_epochs),
+        warnings=warnings,
+        has_warning=bool(warnings),
+        fit_time=rng.uniform(),
+        n_iterations=int(rng.integers(10, 100)),
+    )
+
+
+def test_compact_lmer_fit_grid():
+
+    from fitgrid.models import _compact_lmer, _compact_lmer_grid
+    from fitgrid.utils.summary import _lmer_get_summaries_df
+
+    rng = np.random.default_rng(0)
+    epochs = fitgrid.generate(n_samples=4, n_channels=3)
+    cells = pd.DataFrame(
+        [
+            [
+                _lmer_results(rng, channel, len(epochs.epoch_index))
+                for channel in epochs.channels
+            ]
+            for time in epochs.time_index
+        ],
+        index=epochs.time_index,
+        columns=epochs.channels,
+    )
+    full = LMERFitGrid(cells, epochs.epoch_index, epochs.time)
+    kept = cells.applymap(
+        lambda cell: CellResults(**_compact_lmer(cell, residuals=True))
+    )
+    RHS = 'continuous + (1 | categorical)'
+    grid = _compact_lmer_grid(kept, RHS, True, epochs.epoch_index)
+
+    assert isinstance(grid, CompactLMERFitGrid)
+    assert 'CompactLMERFitGrid' in repr(grid)
+    for attr in dir(grid):
+        assert hasattr(grid, attr)
+
+    pd.testing.assert_frame_equal(
+        grid.coefs, full.coefs.drop('Sig', level=2).astype(float)
+    )
+    for name in ['AIC', 'logLike', 'has_warning', 'n_iterations']:
+        pd.testing.assert_frame_equal(getattr(grid, name), getattr(full, name))
+    assert grid.warnings.equals(
+        cells.applymap(lambda cell: tuple(cell.warnings))
+    )
+    assert grid.ranef_var.loc[(1, 'Residual', '', 'Var'), 'channel2'] == (
+        cells.loc[1, 'channel2'].ranef_var.loc['Residual', 'Var']
+    )
+    assert np.allclose(grid.residuals.loc[2].to_numpy(), full.residuals.loc[2])
+    assert grid.tester.coefs.equals(cells.iloc[0, 0].coefs.drop(columns='Sig'))
+
+    # summaries are read from the arrays, as from the pymer4 results
+    pd.testing.assert_frame_equal(
+        _lmer_get_summaries_df(grid), _lmer_get_summaries_df(full)
+    )
+
+    # slicing, saving, comparing as LMERFitGrid
+    subgrid = grid[1:2, ['channel2', 'channel0']]
+    pd.testing.assert_frame_equal(
+        subgrid.AIC, grid.AIC.loc[1:2, ['channel2', 'channel0']]
+    )
+    TEST_FILENAME = DATA_DIR / str(uuid.uuid4())
+    grid.save(TEST_FILENAME)
+    loaded_grid = fitgrid.load_grid(TEST_FILENAME)
+    os.remove(TEST_FILENAME)
+    pd.testing.assert_frame_equal(loaded_grid.coefs, grid.coefs)
+    assert len(pickle.dumps(grid)) * 2 < len(pickle.dumps(full))
+
+    without_residuals = _compact_lmer_grid(
+        cells.applymap(lambda cell: CellResults(**_compact_lmer(cell))),
+        RHS,
+        True,
+        epochs.epoch_index,
+    )
+    with pytest.raises(AttributeError, match='residuals=True'):
+        without_residuals.residuals
+    pd.testing.assert_frame_equal(
+        _lmer_get_summaries_df(without_residuals),
+        _lmer_get_summaries_df(grid),
+    )
+
+    # the residual variance is read from the last random effect
+    without_residuals.ranef_names.reverse()
+    with pytest.raises(FitGridError, match='Residual'):
+        _lmer_get_summaries_df(without_residuals)
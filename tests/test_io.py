@@ -1,8 +1,12 @@
+import pickle
 import pytest
 import os
+import numpy as np
+import pandas as pd
 from pathlib import Path
 from .context import fitgrid
 from fitgrid import defaults, DATA_DIR
+from fitgrid.errors import FitGridError
 
 
 def test__epochs_from_hdf():
@@ -50,3 +54,194 @@ def test__epochs_from_feather():
 
 
 # fitgrid.load_grid is tested in test_fitgrid.py
+
+
+def test_epochs_store_round_trip(tmp_path):
+
+    epochs = fitgrid.generate(n_samples=10, n_channels=4)
+    epochs.to_store(tmp_path / 'store')
+
+    stored = fitgrid.epochs_from_store(tmp_path / 'store')
+    assert isinstance(stored._data, np.memmap)
+    assert not stored._data.flags.writeable
+    assert stored.channels == epochs.channels
+    assert stored.epoch_index.equals(epochs.epoch_index)
+    assert stored.time_index.equals(epochs.time_index)
+    pd.testing.assert_frame_equal(stored.table, epochs.table)
+
+    # pickles refer to the store instead of carrying the channel data
+    assert len(pickle.dumps(stored)) < stored._data.nbytes
+    unpickled = pickle.loads(pickle.dumps(stored))
+    assert isinstance(unpickled._data, np.memmap)
+    assert np.array_equal(unpickled._data, epochs._data)
+
+    in_memory = fitgrid.epochs_from_store(tmp_path / 'store', mmap_mode=None)
+    assert not isinstance(in_memory._data, np.memmap)
+    pd.testing.assert_frame_equal(in_memory.table, epochs.table)
+
+
+def test_epochs_store_lm_parallel(tmp_path):
+
+    epochs = fitgrid.generate(n_samples=6, n_channels=3)
+    epochs.to_store(tmp_path / 'store')
+    stored = fitgrid.epochs_from_store(tmp_path / 'store')
+
+    RHS = 'continuous + categorical'
+    expected = fitgrid.lm(epochs, RHS=RHS).params
+    actual = fitgrid.lm(stored, RHS=RHS, parallel=True, n_cores=2).params
+    assert actual.equals(expected)
+
+
+def test_epochs_from_store_bad_path(tmp_path):
+
+    with pytest.raises(FitGridError):
+        fitgrid.epochs_from_store(tmp_path)
+
+
+def test_epochs_store_sel_pickles_view(tmp_path):
+
+    epochs = fitgrid.generate(n_samples=10, n_channels=4)
+    epochs.to_store(tmp_path / 'store')
+    stored = fitgrid.epochs_from_store(tmp_path / 'store')
+
+    window = stored.sel(time=slice(2, 6), channels=['channel1', 'channel3'])
+    assert window._store is not None
+    unpickled = pickle.loads(pickle.dumps(window))
+    assert np.array_equal(unpickled._data, window._data)
+    pd.testing.assert_frame_equal(unpickled.table, window.table)
+
+    # copied selections are no longer backed by the store
+    subset = stored.sel(epochs=[0, 3, 4])
+    assert subset._store is None
+    assert np.array_equal(subset._data, epochs._data[[0, 3, 4]])
+
+
+def _windows_table(n_samples=10, n_channels=3):
+    epochs = fitgrid.generate(n_samples=n_samples, n_channels=n_channels)
+    return epochs, epochs.table.reset_index()
+
+
+def _assert_windows(windows, epochs, sizes):
+    windows = list(windows)
+    assert [len(window.time_index) for window in windows] == sizes
+    data = np.concatenate([window._data for window in windows], axis=1)
+    assert np.array_equal(data, epochs._data)
+    for window in windows:
+        assert window.channels == epochs.channels
+        assert window.epoch_index.equals(epochs.epoch_index)
+
+
+def test_windows_from_hdf(tmp_path):
+
+    epochs, table = _windows_table()
+    filename = tmp_path / 'epochs.h5'
+    table.to_hdf(filename, 'epochs', format='table', data_columns=['time'])
+
+    windows = fitgrid.windows_from_hdf(
+        filename, 'epochs', 'time', 'epoch_id', epochs.channels, window=4
+    )
+    _assert_windows(windows, epochs, [4, 4, 2])
+
+    # time as an index level is queryable too
+    indexed = tmp_path / 'indexed.h5'
+    table.set_index(['epoch_id', 'time']).to_hdf(
+        indexed, 'epochs', format='table'
+    )
+    windows = fitgrid.windows_from_hdf(
+        indexed, None, 'time', 'epoch_id', epochs.channels, window=5
+    )
+    _assert_windows(windows, epochs, [5, 5])
+
+
+def test_windows_from_hdf_fixed_format(tmp_path):
+
+    epochs, table = _windows_table()
+    filename = tmp_path / 'epochs.h5'
+    table.to_hdf(filename, 'epochs', format='fixed')
+
+    with pytest.raises(FitGridError, match='table format'):
+        fitgrid.windows_from_hdf(
+            filename, 'epochs', 'time', 'epoch_id', epochs.channels, 4
+        )
+
+
+def test_windows_from_feather(tmp_path):
+
+    epochs, table = _windows_table()
+    for version in (1, 2):
+        filename = tmp_path / f'epochs{version}.feather'
+        table.to_feather(filename, version=version)
+        windows = fitgrid.windows_from_feather(
+            filename, 'time', 'epoch_id', epochs.channels, window=3
+        )
+        _assert_windows(windows, epochs, [3, 3, 3, 1])
+
+
+def test_windows_from_store(tmp_path):
+
+    epochs, _ = _windows_table()
+    epochs.to_store(tmp_path / 'store')
+    windows = fitgrid.windows_from_store(tmp_path / 'store', window=6)
+    _assert_windows(windows, epochs, [6, 4])
+
+    with pytest.raises(FitGridError, match='window'):
+        fitgrid.windows_from_store(tmp_path / 'store', window=0)
+
+
+def test_lm_windows_result_store(tmp_path):
+
+    epochs, _ = _windows_table()
+    epochs.to_store(tmp_path / 'store')
+    RHS = 'continuous + categorical'
+    expected = fitgrid.lm(epochs, RHS=RHS)
+
+    windows = fitgrid.windows_from_store(tmp_path / 'store', window=4)
+    store = fitgrid.lm(
+        windows,
+        RHS=RHS,
+        keep=['params', 'rsquared'],
+        results=tmp_path / 'results',
+        quiet=True,
+    )
+    assert isinstance(store, fitgrid.ResultStore)
+    assert len(store) == 3
+    pd.testing.assert_frame_equal(store.params, expected.params)
+
+    reopened = fitgrid.load_results(tmp_path / 'results')
+    assert len(reopened) == 3
+    pd.testing.assert_frame_equal(reopened.rsquared, expected.rsquared)
+    pd.testing.assert_frame_equal(reopened.load().params, expected.params)
+
+    # stores are not overwritten
+    windows = fitgrid.windows_from_store(tmp_path / 'store', window=4)
+    with pytest.raises(FitGridError, match='already holds results'):
+        fitgrid.lm(windows, RHS=RHS, results=tmp_path / 'results')
+
+
+def test_lm_numpy_windows(tmp_path):
+
+    epochs, _ = _windows_table()
+    epochs.to_store(tmp_path / 'store')
+    RHS = 'continuous + categorical'
+    expected = fitgrid.lm(epochs, RHS=RHS, engine='numpy')
+
+    windows = fitgrid.windows_from_store(tmp_path / 'store', window=3)
+    store = fitgrid.lm(
+        windows, RHS=RHS, engine='numpy', results=tmp_path / 'results'
+    )
+    grid = store.load()
+    assert isinstance(grid, fitgrid.fitgrid.OLSFitGrid)
+    pd.testing.assert_frame_equal(grid.params, expected.params)
+    pd.testing.assert_frame_equal(store.bse, expected.bse)
+
+
+def test_lm_windows_errors(tmp_path):
+
+    epochs, _ = _windows_table()
+    epochs.to_store(tmp_path / 'store')
+    windows = fitgrid.windows_from_store(tmp_path / 'store', window=4)
+    with pytest.raises(FitGridError, match='results'):
+        fitgrid.lm(windows, RHS='continuous')
+
+    with pytest.raises(FitGridError, match='not a fitgrid result store'):
+        fitgrid.load_results(tmp_path)
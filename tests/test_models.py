@@ -1,9 +1,14 @@
+import pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import pytest
+import numpy as np
 import pandas as pd
 from statsmodels.formula.api import ols
 from .context import fitgrid
+from fitgrid import tools
 from fitgrid.errors import FitGridError
-from fitgrid.fitgrid import LMFitGrid, LMERFitGrid
+from fitgrid.fitgrid import LMFitGrid, LMERFitGrid, OLSFitGrid
 
 _TIME = fitgrid.defaults.TIME
 
@@ -185,3 +190,464 @@ def test_lm_patsy_formula_variable():
     levels = ['cat0', 'cat1']
 
     fitgrid.lm(epochs, RHS='1 + C(categorical, levels=levels)')
+
+
+def test_lm_float32_channels_match_float64():
+
+    table = fitgrid.generate(
+        n_samples=5, n_channels=3, return_type='dataframe'
+    ).set_index([fitgrid.defaults.EPOCH_ID, _TIME])
+    channels = ['channel0', 'channel1', 'channel2']
+    RHS = 'continuous + categorical'
+
+    grids = [
+        fitgrid.lm(
+            fitgrid.epochs_from_dataframe(
+                table,
+                time=_TIME,
+                epoch_id=fitgrid.defaults.EPOCH_ID,
+                channels=channels,
+                dtype=dtype,
+            ),
+            RHS=RHS,
+        )
+        for dtype in (np.float64, np.float32)
+    ]
+
+    for attr in ['params', 'bse', 'rsquared', 'llf']:
+        float64, float32 = (getattr(grid, attr) for grid in grids)
+        assert (float32.dtypes == np.float64).all()
+        assert np.allclose(float32, float64, rtol=1e-5, atol=1e-5)
+
+
+LM_ATTRIBUTES = [
+    'params',
+    'bse',
+    'tvalues',
+    'pvalues',
+    'rsquared',
+    'rsquared_adj',
+    'llf',
+    'aic',
+    'bic',
+    'fvalue',
+    'f_pvalue',
+    'df_model',
+    'df_resid',
+    'resid',
+    'fittedvalues',
+]
+
+
+def _epochs_with_rt(n_epochs=10, n_samples=8):
+
+    table = fitgrid.generate(
+        n_epochs=n_epochs,
+        n_samples=n_samples,
+        n_channels=3,
+        seed=0,
+        return_type='dataframe',
+    )
+    epoch_ids = table[fitgrid.defaults.EPOCH_ID]
+    table['rt'] = np.log1p(epoch_ids) + epoch_ids % 3
+    return fitgrid.epochs_from_dataframe(
+        table.set_index([fitgrid.defaults.EPOCH_ID, _TIME]),
+        time=_TIME,
+        epoch_id=fitgrid.defaults.EPOCH_ID,
+        channels=['channel0', 'channel1', 'channel2'],
+    )
+
+
+@pytest.mark.parametrize(
+    'RHS',
+    [
+        'categorical + rt',
+        '0 + categorical',
+        '0 + rt',
+        'np.log(rt + 1)',
+        # time-varying designs
+        'continuous + categorical',
+        'center(continuous) * rt',
+    ],
+)
+def test_lm_numpy_matches_statsmodels(RHS):
+
+    epochs = _epochs_with_rt()
+    expected = fitgrid.lm(epochs, RHS=RHS, quiet=True)
+    grid = fitgrid.lm(epochs, RHS=RHS, engine='numpy')
+
+    assert isinstance(grid, OLSFitGrid)
+    for attr in LM_ATTRIBUTES:
+        pd.testing.assert_frame_equal(
+            getattr(grid, attr),
+            getattr(expected, attr).astype(float),
+            rtol=1e-9,
+            atol=1e-12,
+        )
+    pd.testing.assert_frame_equal(
+        grid.conf_int(alpha=0.1), expected.conf_int(alpha=0.1), rtol=1e-9
+    )
+
+
+def test_lm_numpy_falls_back_to_statsmodels():
+
+    epochs = _epochs_with_rt()
+    epochs._data[0, 0, 0] = np.nan
+
+    # statsmodels drops missing values cell by cell
+    grid = fitgrid.lm(epochs, RHS='continuous', engine='numpy', quiet=True)
+    assert not isinstance(grid, OLSFitGrid)
+    assert grid.nobs.iloc[0, 0] == len(epochs.epoch_index) - 1
+
+    with pytest.raises(FitGridError):
+        fitgrid.lm(epochs, RHS='rt', engine='scipy')
+
+
+@pytest.mark.parametrize('parallel', [False, True])
+@pytest.mark.parametrize(
+    'RHS',
+    [
+        'categorical + rt',
+        'center(continuous) + categorical',
+        'C(continuous > 0) + rt',
+    ],
+)
+def test_lm_design_reuse_matches_formula_fits(RHS, parallel):
+
+    epochs = _epochs_with_rt()
+    epochs._data[1, 2, 0] = np.nan
+    epochs._epoch_predictors.loc[3, 'rt'] = np.nan
+
+    grid = fitgrid.lm(
+        epochs, RHS=RHS, parallel=parallel, n_cores=2, quiet=True
+    )
+
+    for time, snapshot in epochs._iter_snapshots():
+        for channel in epochs.channels:
+            cell = grid._grid.loc[time, channel]
+            fit = ols(channel + ' ~ ' + RHS, snapshot).fit()
+            assert fit.params.equals(cell.params)
+            assert fit.bse.equals(cell.bse)
+            assert fit.resid.equals(cell.resid)
+            assert fit.model.formula == cell.model.formula
+
+
+def test_lm_executors_match_serial():
+
+    epochs = fitgrid.generate(n_samples=5, n_channels=3)
+    RHS = 'continuous + categorical'
+
+    expected = fitgrid.lm(epochs, RHS=RHS, quiet=True)
+
+    for executor in ['thread', 'process']:
+        grid = fitgrid.lm(
+            epochs, RHS=RHS, executor=executor, n_cores=2, quiet=True
+        )
+        pd.testing.assert_frame_equal(grid.params, expected.params)
+
+    # one warm pool for several fits
+    for executor_class in [ProcessPoolExecutor, ThreadPoolExecutor]:
+        with executor_class(2) as executor:
+            for rhs in [RHS, 'continuous']:
+                grid = fitgrid.lm(
+                    epochs, RHS=rhs, executor=executor, quiet=True
+                )
+                serial = fitgrid.lm(epochs, RHS=rhs, quiet=True)
+                pd.testing.assert_frame_equal(grid.params, serial.params)
+
+            grid = fitgrid.run_model(
+                epochs,
+                lambda data, channel: data[channel].mean(),
+                executor='serial',
+                quiet=True,
+            )
+            assert grid._grid.shape == (5, 3)
+
+
+def test_lm_bad_executor():
+
+    epochs = fitgrid.generate(n_samples=2, n_channels=2)
+    with pytest.raises(FitGridError, match='executor must be one of'):
+        fitgrid.lm(epochs, RHS='continuous', executor='dask')
+
+
+def test_lmer_rejects_threads():
+
+    epochs = fitgrid.generate(n_samples=2, n_channels=2)
+    with pytest.raises(FitGridError, match='thread'):
+        fitgrid.lmer(epochs, RHS='(1 | categorical)', executor='thread')
+
+
+@pytest.mark.parametrize(
+    'RHS', ['continuous + (continuous | categorical)', '(1 | categorical)']
+)
+def test_lmer_refit_matches_lmer(RHS):
+
+    epochs = fitgrid.generate(n_samples=3, n_channels=3)
+    expected = fitgrid.lmer(epochs, RHS=RHS, quiet=True)
+    grid = fitgrid.lmer(epochs, RHS=RHS, refit=True, quiet=True)
+
+    assert isinstance(grid.tester, fitgrid.fitgrid.CellResults)
+    assert grid.coefs.columns.equals(expected.coefs.columns)
+    # the significance statistics of refits are those of their own response
+    for key in ['Estimate', 'SE', 'DF', 'P-val']:
+        np.testing.assert_allclose(
+            grid.coefs.xs(key, level=2).astype(float),
+            expected.coefs.xs(key, level=2).astype(float),
+            rtol=1e-3,
+            err_msg=key,
+        )
+    np.testing.assert_allclose(grid.AIC, expected.AIC, rtol=1e-6)
+
+
+def test_lmer_warm_start_matches_lmer():
+
+    epochs = fitgrid.generate(n_samples=4, n_channels=2)
+    RHS = 'continuous + (continuous | categorical)'
+    expected = fitgrid.lmer(epochs, RHS=RHS, quiet=True)
+    grid = fitgrid.lmer(epochs, RHS=RHS, warm_start=True, quiet=True)
+
+    np.testing.assert_allclose(
+        grid.coefs.xs('Estimate', level=2),
+        expected.coefs.xs('Estimate', level=2),
+        rtol=1e-3,
+    )
+    for timings in [grid, expected]:
+        assert (timings.fit_time >= 0).all().all()
+        assert (timings.n_iterations > 0).all().all()
+
+
+def test_lmer_refit_and_warm_start():
+
+    epochs = fitgrid.generate(n_samples=2, n_channels=2)
+    with pytest.raises(FitGridError, match='either refit or warm_start'):
+        fitgrid.lmer(
+            epochs, RHS='(1 | categorical)', refit=True, warm_start=True
+        )
+    with pytest.raises(FitGridError, match='warm_start=True'):
+        fitgrid.lmer(
+            epochs, RHS='(1 | categorical)', ordered=True, warm_start=True
+        )
+
+
+def test_lmer_refit_unsupported():
+
+    epochs = fitgrid.generate(n_samples=2, n_channels=2)
+    with pytest.raises(FitGridError, match='family, permute'):
+        fitgrid.lmer(
+            epochs,
+            RHS='(1 | categorical)',
+            family='binomial',
+            permute=100,
+            refit=True,
+        )
+
+
+def test_lmer_compact_matches_lmer():
+
+    epochs = fitgrid.generate(n_samples=3, n_channels=2)
+    RHS = 'continuous + (1 | categorical)'
+    expected = fitgrid.lmer(epochs, RHS=RHS, quiet=True)
+    grid = fitgrid.lmer(
+        epochs, RHS=RHS, compact=True, residuals=True, quiet=True
+    )
+
+    assert isinstance(grid, fitgrid.fitgrid.CompactLMERFitGrid)
+    pd.testing.assert_frame_equal(
+        grid.coefs, expected.coefs.drop('Sig', level=2).astype(float)
+    )
+    pd.testing.assert_frame_equal(grid.AIC, expected.AIC)
+    assert len(pickle.dumps(grid)) < len(pickle.dumps(expected))
+
+
+def test_lmer_compact_and_keep():
+
+    epochs = fitgrid.generate(n_samples=2, n_channels=2)
+    with pytest.raises(FitGridError, match='compact'):
+        fitgrid.lmer(
+            epochs, RHS='(1 | categorical)', compact=True, keep=['AIC']
+        )
+
+
+def test_lmer_pool_serves_many_fits():
+
+    epochs = fitgrid.generate(n_samples=3, n_channels=2)
+    RHS = 'continuous + (continuous | categorical)'
+    expected = fitgrid.lmer(epochs, RHS=RHS, quiet=True)
+
+    with fitgrid.lmer_pool(2) as pool:
+        for _ in range(2):
+            grid = fitgrid.lmer(epochs, RHS=RHS, executor=pool, quiet=True)
+            assert grid.AIC.equals(expected.AIC)
+
+
+def test_block_tasks():
+
+    channels = [f'channel{i}' for i in range(5)]
+
+    # enough time points, one task per time point
+    tasks = fitgrid.models._block_tasks(100, channels, n_workers=4)
+    assert tasks == [(position, channels) for position in range(100)]
+
+    # few time points, channels are split in blocks
+    tasks = fitgrid.models._block_tasks(2, channels, n_workers=4)
+    assert len(tasks) == 2 * len(channels)
+    for position in range(2):
+        blocks = [block for pos, block in tasks if pos == position]
+        assert sum(blocks, []) == channels
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_run_model_channel_blocks(executor):
+
+    epochs = fitgrid.generate(n_samples=2, n_channels=6)
+    RHS = 'continuous + categorical'
+
+    expected = fitgrid.lm(epochs, RHS=RHS, quiet=True)
+    grid = fitgrid.lm(
+        epochs, RHS=RHS, executor=executor, n_cores=4, quiet=True
+    )
+    pd.testing.assert_frame_equal(grid.params, expected.params)
+    assert grid._grid.index.equals(expected._grid.index)
+    assert list(grid._grid.columns) == epochs.channels
+
+
+class _ChannelMeans:
+    """Cell function fitting the channels of a snapshot together."""
+
+    def __call__(self, data, channel):
+        return data[channel].mean()
+
+    def fit_channels(self, data, channels):
+        means = data[channels].mean()
+        # one entry per call, to check it fit the channels together
+        return {
+            channel: (means[channel], tuple(channels)) for channel in channels
+        }
+
+
+@pytest.mark.parametrize('executor', ['serial', 'process'])
+def test_run_model_fit_channels(executor):
+
+    epochs = fitgrid.generate(n_samples=2, n_channels=6)
+    channels = ['channel0', 'channel2', 'channel5']
+
+    grid = fitgrid.run_model(
+        epochs,
+        _ChannelMeans(),
+        channels=channels,
+        executor=executor,
+        n_cores=2,
+        quiet=True,
+    )
+    expected = epochs.table.groupby(epochs.time)[channels].mean()
+    means = grid._grid.applymap(lambda cell: cell[0])
+    pd.testing.assert_frame_equal(
+        means, expected, check_names=False, check_dtype=False
+    )
+
+    # whole snapshots serially, blocks of channels on pools
+    blocks = set(grid._grid.applymap(lambda cell: cell[1]).to_numpy().ravel())
+    if executor == 'serial':
+        assert blocks == {tuple(channels)}
+    else:
+        assert set(sum(blocks, ())) == set(channels)
+
+
+def _blas_threads(data, channel):
+    return [blas.get_n_threads() for blas in tools.blas_libraries()]
+
+
+def test_run_model_threads_per_worker():
+
+    if not tools.blas_libraries():
+        pytest.skip('no MKL/OpenBLAS loaded')
+
+    epochs = fitgrid.generate(n_samples=2, n_channels=2)
+
+    for executor in ['serial', 'thread', 'process']:
+        grid = fitgrid.run_model(
+            epochs,
+            _blas_threads,
+            executor=executor,
+            n_cores=2,
+            threads_per_worker=3,
+            quiet=True,
+        )
+        for cell in grid._grid.to_numpy().ravel():
+            assert cell == [3] * len(tools.blas_libraries())
+
+    with pytest.raises(FitGridError, match='threads_per_worker'):
+        fitgrid.lm(epochs, RHS='continuous', threads_per_worker=0)
+
+
+def _conf_int(result):
+    return {'conf_int': result.conf_int(), 'aic': result.aic}
+
+
+@pytest.mark.parametrize('executor', ['serial', 'process'])
+def test_lm_keep_and_extract(executor):
+
+    epochs = fitgrid.generate(n_samples=4, n_channels=3)
+    RHS = 'continuous + categorical'
+    full = fitgrid.lm(epochs, RHS=RHS, quiet=True)
+
+    keep = ['params', 'bse', 'pvalues', 'aic']
+    grid = fitgrid.lm(
+        epochs, RHS=RHS, keep=keep, executor=executor, n_cores=2, quiet=True
+    )
+    assert isinstance(grid, LMFitGrid)
+    assert isinstance(grid.tester, fitgrid.fitgrid.CellResults)
+    for name in keep:
+        pd.testing.assert_frame_equal(getattr(grid, name), getattr(full, name))
+    with pytest.raises(AttributeError):
+        grid.resid
+    assert len(pickle.dumps(grid._grid)) < len(pickle.dumps(full._grid)) / 3
+
+    grid = fitgrid.lm(
+        epochs, RHS=RHS, extract=_conf_int, executor=executor, quiet=True
+    )
+    pd.testing.assert_frame_equal(grid.conf_int, full.conf_int())
+    pd.testing.assert_frame_equal(grid.aic, full.aic)
+
+
+def test_lm_numpy_keep():
+
+    epochs = fitgrid.generate(n_samples=4, n_channels=3)
+    RHS = 'continuous + categorical'
+    full = fitgrid.lm(epochs, RHS=RHS, engine='numpy')
+
+    grid = fitgrid.lm(epochs, RHS=RHS, engine='numpy', keep=['params', 'aic'])
+    assert isinstance(grid, OLSFitGrid)
+    pd.testing.assert_frame_equal(grid.params, full.params)
+    pd.testing.assert_frame_equal(grid.aic, full.aic)
+    with pytest.raises(AttributeError, match='not kept'):
+        grid.resid
+    with pytest.raises(FitGridError, match=r"\['bse', 'df_resid'\]"):
+        grid.conf_int()
+    with pytest.raises(FitGridError, match='influential_epochs'):
+        grid.influential_epochs()
+
+    with pytest.raises(FitGridError, match='Can not keep'):
+        fitgrid.lm(epochs, RHS=RHS, engine='numpy', keep=['nonsense'])
+
+
+def test_run_model_keep_errors():
+
+    epochs = fitgrid.generate(n_samples=2, n_channels=2)
+
+    with pytest.raises(FitGridError, match='Can not keep'):
+        fitgrid.lm(epochs, RHS='continuous', keep='nonsense', quiet=True)
+
+    with pytest.raises(FitGridError, match='dict'):
+        fitgrid.lm(
+            epochs, RHS='continuous', extract=lambda result: 1, quiet=True
+        )
+
+    with pytest.raises(FitGridError, match='either keep or extract'):
+        fitgrid.lm(
+            epochs,
+            RHS='continuous',
+            keep='aic',
+            extract=_conf_int,
+        )
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import re
 import os
@@ -211,3 +212,44 @@ def test_design_matrix_is_constant():
 def test_has_version():
 
     assert hasattr(fitgrid, '__version__')
+
+
+def test_is_epoch_constant():
+
+    values = np.array(['a', 'b', 'c'] * 4)
+    assert tools.is_epoch_constant(values, 3, 4)
+    assert not tools.is_epoch_constant(values, 4, 3)
+
+    values = np.tile([1.0, np.nan], 3)
+    assert tools.is_epoch_constant(values, 2, 3)
+    values[-1] = 0.0
+    assert not tools.is_epoch_constant(values, 2, 3)
+
+
+def test_blas_libraries_cached():
+
+    import numpy
+
+    libraries = tools.blas_libraries()
+    assert libraries is tools.blas_libraries()
+    if not libraries:
+        pytest.skip('no MKL/OpenBLAS loaded')
+
+    assert tools.get_blas(numpy) in libraries
+    assert tools.get_blas(numpy) is tools.get_blas(numpy)
+
+
+def test_blas_threads():
+
+    libraries = tools.blas_libraries()
+    if not libraries:
+        pytest.skip('no MKL/OpenBLAS loaded')
+
+    before = [blas.get_n_threads() for blas in libraries]
+
+    with tools.blas_threads(2):
+        assert all(blas.get_n_threads() == 2 for blas in libraries)
+        with tools.blas_threads(None):
+            assert all(blas.get_n_threads() == 2 for blas in libraries)
+
+    assert [blas.get_n_threads() for blas in libraries] == before
@@ -1,9 +1,12 @@
+import json
 from pathlib import Path
 import warnings
 import numpy as np
 import pandas as pd
+import pytest
 from .context import fitgrid, FIT_ATOL, FIT_RTOL
 from fitgrid import DATA_DIR
+from fitgrid.errors import FitGridError
 
 _TIME = fitgrid.defaults.TIME
 _EPOCH_ID = fitgrid.defaults.EPOCH_ID
@@ -51,3 +54,90 @@ def test_get_lmer_dfbetas():
             f'{for_display}\n'
             f'------------------------------------------------------------\n'
         )
+
+
+def test_get_lmer_dfbetas_parallel_and_resume(tmp_path):
+
+    epochs = fitgrid.generate(n_samples=2, n_channels=2, seed=0)
+    RHS = 'continuous + (continuous | categorical)'
+
+    expected = fitgrid.utils.lmer.get_lmer_dfbetas(
+        epochs, 'categorical', RHS=RHS, quiet=True
+    )
+
+    # one pool for all levels, progress written to the results directory
+    results = tmp_path / 'dfbetas'
+    dfbetas = fitgrid.utils.lmer.get_lmer_dfbetas(
+        epochs,
+        'categorical',
+        RHS=RHS,
+        results=results,
+        parallel=True,
+        n_cores=2,
+        quiet=True,
+    )
+    assert dfbetas.equals(expected)
+    assert (results / 'dfbetas.json').exists()
+
+    # an interrupted run resumes, the missing level is fit again
+    (results / 'level00000.pkl').unlink()
+    progress = json.loads((results / 'dfbetas.json').read_text())
+    progress['done'].remove(0)
+    (results / 'dfbetas.json').write_text(json.dumps(progress))
+    resumed = fitgrid.utils.lmer.get_lmer_dfbetas(
+        epochs, 'categorical', RHS=RHS, results=results, quiet=True
+    )
+    assert resumed.equals(expected)
+
+    # the full data fit is reused
+    fit = fitgrid.lmer(epochs, RHS=RHS, quiet=True)
+    reused = fitgrid.utils.lmer.get_lmer_dfbetas(
+        epochs, 'categorical', RHS=RHS, fit=fit, quiet=True
+    )
+    assert reused.equals(expected)
+
+
+def test_get_lmer_dfbetas_results_mismatch(tmp_path):
+
+    epochs = fitgrid.generate(n_samples=2, n_channels=2, seed=0)
+    RHS = 'continuous + (continuous | categorical)'
+    levels = epochs._epoch_predictors['categorical'].unique()
+
+    # progress of fits with REML=False
+    arguments = fitgrid.utils.lmer._fit_arguments(
+        'categorical', epochs.channels, {'RHS': RHS, 'REML': False}
+    )
+    fitgrid.utils.lmer._Progress(tmp_path, arguments, levels)
+    assert (tmp_path / 'dfbetas.json').exists()
+
+    for kwargs in [{}, {'LHS': ['channel0'], 'REML': False}]:
+        with pytest.raises(FitGridError, match='holds DFBETAS fits'):
+            fitgrid.utils.lmer.get_lmer_dfbetas(
+                epochs, 'categorical', RHS=RHS, results=tmp_path, **kwargs
+            )
+
+    (tmp_path / 'dfbetas.json').write_text(
+        json.dumps({'factor': 'categorical', 'RHS': RHS, 'levels': []})
+    )
+    with pytest.raises(FitGridError, match='holds DFBETAS fits'):
+        fitgrid.utils.lmer.get_lmer_dfbetas(
+            epochs, 'categorical', RHS=RHS, results=tmp_path
+        )
+
+    with pytest.raises(FitGridError, match='not a column'):
+        fitgrid.utils.lmer.get_lmer_dfbetas(
+            epochs, 'subject', RHS='continuous + (1 | categorical)'
+        )
+
+
+def test_get_lmer_dfbetas_unexpected_kwargs():
+
+    epochs = fitgrid.generate(n_samples=2, n_channels=2, seed=0)
+    with pytest.raises(FitGridError, match=r"\['compact', 'reml'\]"):
+        fitgrid.utils.lmer.get_lmer_dfbetas(
+            epochs,
+            'categorical',
+            RHS='(1 | categorical)',
+            reml=False,
+            compact=True,
+        )
@@ -135,6 +135,25 @@ def test__lmer_get_summaries_df(epoch_id, time):
     fitgrid.utils.summary._check_summary_df(summaries_df, fgrid_lmer)
 
 
+def test_summarize_lm_numpy_engine():
+
+    # array-backed OLSFitGrid summaries match the statsmodels grid
+    epochs = _get_epochs_fg(seed=0)
+    RHS = ["1 + continuous + categorical", "1 + continuous"]
+    expected = fitgrid.utils.summary.summarize(
+        epochs, "lm", LHS=epochs.channels, RHS=RHS, parallel=False
+    )
+    actual = fitgrid.utils.summary.summarize(
+        epochs,
+        "lm",
+        LHS=epochs.channels,
+        RHS=RHS,
+        parallel=False,
+        engine="numpy",
+    )
+    pd.testing.assert_frame_equal(actual, expected)
+
+
 # summary.summarize args
 bad_epochs_mark = pytest.mark.xfail(reason=TypeError, strict=True)
 